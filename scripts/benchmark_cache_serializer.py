@@ -0,0 +1,103 @@
+"""
+Compare our cache serializer against the plain pickle path dogpile.cache used to use, on recorded payloads. Payloads
+can come from a directory of JSON files (ie. saved API responses) or be sampled from a live Redis cache.
+
+    python -m scripts.benchmark_cache_serializer --dir /path/to/recorded/json
+    python -m scripts.benchmark_cache_serializer --redis-url redis://localhost/1 --pattern "server.views.topics*"
+"""
+import argparse
+import json
+import os
+import pickle
+import time
+
+import redis
+from dogpile.cache.api import CachedValue
+
+from server.cache.backends import CHUNK_KEY_PREFIX, CHUNK_MANIFEST_PREFIX
+from server.cache.dependencies import DEPENDENCY_KEY_PREFIX
+from server.cache.serializers import CacheSerializer
+
+CONFIGURATIONS = [
+    ('msgpack+zstd', dict(codec='msgpack', compression='zstd')),
+    ('msgpack+zlib', dict(codec='msgpack', compression='zlib')),
+    ('msgpack', dict(codec='msgpack', compression='none')),
+    ('pickle+zstd', dict(codec='pickle', compression='zstd')),
+]
+
+
+def _payloads_from_dir(dir_path):
+    payloads = []
+    for filename in sorted(os.listdir(dir_path)):
+        if filename.endswith('.json'):
+            with open(os.path.join(dir_path, filename)) as f:
+                payloads.append(CachedValue(json.load(f), {'ct': time.time(), 'v': 1}))
+    return payloads
+
+
+def _payloads_from_redis(redis_url, pattern, limit):
+    client = redis.StrictRedis.from_url(redis_url)
+    reader = CacheSerializer()
+    payloads = []
+    for key in client.scan_iter(match=pattern, count=100):
+        if key.startswith(b'_lock') or key.startswith(DEPENDENCY_KEY_PREFIX.encode()) or \
+                key.startswith(CHUNK_KEY_PREFIX.encode()):
+            continue
+        data = client.get(key)
+        if (data is not None) and not data.startswith(CHUNK_MANIFEST_PREFIX):   # skip the huge values
+            payloads.append(reader.loads(data))
+        if len(payloads) >= limit:
+            break
+    return payloads
+
+
+def _time_per_payload(fn, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - start) / (repeat * len(items)) * 1000000  # microseconds
+
+
+def _benchmark(name, dumps, loads, payloads, repeat):
+    written = [dumps(p) for p in payloads]
+    return {
+        'name': name,
+        'bytes': sum([len(w) for w in written]),
+        'dumps_us': _time_per_payload(dumps, payloads, repeat),
+        'loads_us': _time_per_payload(loads, written, repeat),
+    }
+
+
+def run(payloads, repeat):
+    results = [_benchmark('pickle (current)', lambda v: pickle.dumps(v, pickle.HIGHEST_PROTOCOL), pickle.loads,
+                          payloads, repeat)]
+    for name, options in CONFIGURATIONS:
+        serializer = CacheSerializer(**options)
+        results.append(_benchmark(name, serializer.dumps, serializer.loads, payloads, repeat))
+    baseline = results[0]
+    print("{} payloads, {} bytes pickled".format(len(payloads), baseline['bytes']))
+    print("{:<18} {:>12} {:>8} {:>12} {:>12}".format('format', 'bytes', 'ratio', 'dumps (us)', 'loads (us)'))
+    for r in results:
+        print("{:<18} {:>12} {:>8.2f} {:>12.1f} {:>12.1f}".format(r['name'], r['bytes'],
+                                                                 float(r['bytes']) / float(baseline['bytes']),
+                                                                 r['dumps_us'], r['loads_us']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark cache serializers against pickle")
+    parser.add_argument('--dir', help="directory of recorded JSON payloads")
+    parser.add_argument('--redis-url', help="sample payloads from this redis cache instead")
+    parser.add_argument('--pattern', default='*', help="key pattern to sample from redis")
+    parser.add_argument('--limit', type=int, default=200, help="max payloads to sample from redis")
+    parser.add_argument('--repeat', type=int, default=20, help="times to repeat each measurement")
+    args = parser.parse_args()
+    if args.dir:
+        recorded = _payloads_from_dir(args.dir)
+    elif args.redis_url:
+        recorded = _payloads_from_redis(args.redis_url, args.pattern, args.limit)
+    else:
+        parser.error("pass in --dir or --redis-url")
+    if len(recorded) == 0:
+        parser.error("no payloads found")
+    run(recorded, args.repeat)
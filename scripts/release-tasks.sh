@@ -1,2 +1,3 @@
 #!/bin/bash
 python -m scripts.cache_tag_sets.py
+flask prewarm-cache || echo "Cache prewarming failed, carrying on"
@@ -18,7 +18,11 @@ from flask_executor import Executor
 
 from server.sessions import RedisSessionInterface
 from server.util.config import get_default_config, ConfigException
-from server.commands import sync_frontend_db
+from server.util.clientpool import pool_connections
+from server.util import limiter
+from server.util.resilience import services, parse_timeouts
+from server.util import transport
+from server.commands import sync_frontend_db, prewarm_cache, cache_versions
 from server.database import UserDatabase, AnalyticsDatabase
 
 SERVER_MODE_DEV = "dev"
@@ -62,9 +66,36 @@ except ConfigException as e:
     logger.info("no sentry logging")
 
 
-# Connect to MediaCloud
+# Connect to MediaCloud (all the clients share one pool of keep-alive connections, an adaptive limit on how many
+# calls can be out at once - see server.util.limiter - and a timeout and circuit breaker)
 TOOL_API_KEY = config.get('MEDIA_CLOUD_API_KEY')
 
+try:
+    limiter_redis_url = config.get('BACKEND_LIMITER_REDIS_URL')
+except ConfigException:
+    limiter_redis_url = None  # each worker process gets its own limit
+try:
+    limiter_initial = int(config.get('BACKEND_LIMITER_INITIAL'))
+except ConfigException:
+    limiter_initial = limiter.DEFAULT_INITIAL_LIMIT
+try:
+    limiter_max = int(config.get('BACKEND_LIMITER_MAX'))
+except ConfigException:
+    limiter_max = limiter.DEFAULT_MAX_LIMIT
+backend_limiter = limiter.backend_limiter(limiter_redis_url, initial_limit=limiter_initial, max_limit=limiter_max)
+
+# per-service timeouts for everything we call out to, ie. "word_embeddings:5, cliff:3" (see server.util.resilience)
+try:
+    services.set_timeouts(parse_timeouts(config.get('SERVICE_TIMEOUTS')))
+except ConfigException:
+    pass  # just use the defaults
+
+try:
+    pool_connections(connections_per_host=int(config.get('MEDIA_CLOUD_CONNECTIONS_PER_HOST')), limiter=backend_limiter,
+                     service=services.get('media_cloud'), latencies=transport.latencies)
+except ConfigException:
+    pool_connections(limiter=backend_limiter, service=services.get('media_cloud'), latencies=transport.latencies)
+
 mc = mediacloud.api.AdminMediaCloud(TOOL_API_KEY)
 try:
     mc.V2_API_URL = config.get('MEDIA_CLOUD_API_URL')
@@ -179,6 +210,8 @@ def create_app():
     my_app.session_interface = RedisSessionInterface(redis.StrictRedis.from_url(config.get('SESSION_REDIS_URL')))
 
     my_app.cli.add_command(sync_frontend_db)
+    my_app.cli.add_command(prewarm_cache)
+    my_app.cli.add_command(cache_versions)
 
     return my_app
 
@@ -195,6 +228,15 @@ login_manager.init_app(app)
 # using one shared executor pool for now - can revisit later if we need to
 executor = Executor(app)
 
+# log how many duplicate calls request-scoped memoization saved each request (at debug level)
+from server.cache.memo import log_request_memo_hits
+app.teardown_request(log_request_memo_hits)
+
+# give each request a time budget that every back-end call it makes works within (see server.util.deadline)
+from server.util import deadline
+app.before_request(deadline.start_request)
+app.after_request(deadline.add_partial_header)
+
 # set up all the views
 @app.route('/')
 def index():
@@ -221,6 +263,8 @@ import server.views.user
 import server.views.app
 import server.views.admin.users
 import server.views.admin.analytics
+import server.views.admin.cache
+import server.views.admin.backend
 import server.views.download
 import server.views.stories
 import server.views.media_search
@@ -2,10 +2,11 @@ import datetime
 import logging
 import flask_login
 import mediacloud.api
-from flask import session
+from flask import session, has_request_context
 
 from server import user_db, login_manager
 from server.util.config import get_default_config, ConfigException
+from server.util.clientpool import ClientPool, DEFAULT_MAX_CLIENTS
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,18 @@ ROLE_TM_READ_ONLY = 'tm-readonly'           # Topic mapper; excludes media and s
 config = get_default_config()
 
 
+def _config_or_default(key, default):
+    try:
+        return config.get(key)
+    except ConfigException:
+        return default
+
+
+# Media Cloud clients are reused for every call with the same API key (see server.util.clientpool)
+mc_clients = ClientPool(api_url=_config_or_default('MEDIA_CLOUD_API_URL', None),
+                        max_clients=int(_config_or_default('MEDIA_CLOUD_CLIENT_POOL_SIZE', DEFAULT_MAX_CLIENTS)))
+
+
 # User class
 class User(flask_login.UserMixin):
 
@@ -119,6 +132,13 @@ def user_is_admin():
     return user_has_auth_role('admin')
 
 
+def mc_key_has_auth_role(user_mc_key, role):
+    # we only know the roles of the logged in user, so any other key (ie. the tool key) is treated as having none
+    if not (has_request_context() and is_user_logged_in()):
+        return False
+    return (flask_login.current_user.id == user_mc_key) and flask_login.current_user.has_auth_role(role)
+
+
 def create_user(profile):
     user = User(profile)
     user.create_in_db_if_needed()
@@ -145,12 +165,7 @@ def user_admin_mediacloud_client(user_mc_key=None):
     mc_key_to_use = user_mc_key
     if mc_key_to_use is None:
         mc_key_to_use = user_mediacloud_key()
-    user_mc = mediacloud.api.AdminMediaCloud(mc_key_to_use)
-    try:
-        user_mc.V2_API_URL = config.get('MEDIA_CLOUD_API_URL')
-    except ConfigException:
-        pass  # just use the default API url because a custom one is not defined
-    return user_mc
+    return mc_clients.get(mediacloud.api.AdminMediaCloud, mc_key_to_use)
 
 
 def user_mediacloud_client(user_mc_key=None):
@@ -159,9 +174,4 @@ def user_mediacloud_client(user_mc_key=None):
     mc_key_to_use = user_mc_key
     if mc_key_to_use is None:
         mc_key_to_use = user_mediacloud_key()
-    user_mc = mediacloud.api.MediaCloud(mc_key_to_use)
-    try:
-        user_mc.V2_API_URL = config.get('MEDIA_CLOUD_API_URL')
-    except ConfigException:
-        pass  # just use the default API url because a custom one is not defined
-    return user_mc
+    return mc_clients.get(mediacloud.api.MediaCloud, mc_key_to_use)
@@ -0,0 +1,326 @@
+import functools
+import inspect
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from dogpile.cache.api import NO_VALUE
+from dogpile.cache.region import CacheRegion, value_version
+from dogpile.cache.util import compat
+from mediacloud.error import MCException
+
+from server import config
+from server.util.config import ConfigException
+from server.util.concurrency import map_concurrently
+from server.cache.access import shared_key_generator
+from server.cache.versions import VersionRegistry, code_version, versioned_key_generator
+from server.cache.keys import function_namespace, namespace_from_key, canonical_arguments, hashed_key
+from server.cache.local import LocalMemoryProxy
+from server.cache.serializers import CacheSerializer, DEFAULT_COMPRESSION_THRESHOLD
+from server.cache.refresh import background_refresh
+from server.cache.metrics import CacheMetrics
+from server.cache.singleflight import SingleFlight
+from server.cache.policy import TtlPolicy, parse_ttl_overrides
+from server.cache.negative import DEFAULT_NEGATIVE_TTL, error_payload, is_error_payload, is_negative, raise_cached_error, \
+    is_cacheable_error
+import server.cache.backends  # pylint: disable=unused-import
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_CACHE_MAX_BYTES = 16 * 1024 * 1024  # per worker process; set CACHE_LOCAL_MAX_BYTES=0 to turn off
+
+HARD_EXPIRATION_TIME = 60*60*24*3   # 3 days; Redis drops values after this
+DEFAULT_DBM_FILENAME = 'webtools-cache'  # in the temp dir, when CACHE_BACKEND=dbm and CACHE_DBM_FILE isn't set
+STALE_AFTER = 60*60*24  # a good soft TTL for slow calls; pass it as `expiration_time` to refresh in the background
+
+
+def _config_or_default(key, default):
+    try:
+        return config.get(key)
+    except ConfigException:
+        return default
+
+
+debug_cache_keys = _config_or_default('CACHE_KEY_DEBUG', '0') == '1'
+
+
+def _keyword_safe_key_generator(namespace, fn):
+    # can't use the default dogpile.cache one because it doesn't respect keyworded args; this one also builds
+    # canonical keys (see server.cache.keys) so equivalent calls share a cache entry
+    if namespace is None:
+        namespace = function_namespace(fn)
+    else:
+        namespace = '%s|%s' % (function_namespace(fn), namespace)
+
+    signature = inspect.signature(fn)
+    has_self = (len(signature.parameters) > 0) and (list(signature.parameters)[0] in ('self', 'cls'))
+    if has_self:
+        signature = signature.replace(parameters=list(signature.parameters.values())[1:])
+
+    def generate_key(*fn_args, **kw):
+        if has_self:
+            fn_args = fn_args[1:]
+        readable_args = " ".join(canonical_arguments(signature, fn_args, kw))
+        key = hashed_key(namespace, readable_args)
+        if debug_cache_keys:
+            logger.debug("cache key %s <- %s", key, readable_args)
+        return key
+    return generate_key
+
+
+class McCacheRegion(CacheRegion):
+    """
+    Our dogpile region, which adds some per-function options to `cache_on_arguments`:
+     * expiration_time: (standard dogpile) the soft TTL - after this the stale value is returned and refreshed in
+       the background (see server.cache.refresh)
+     * local_expiration_time: also hold results in the in-process L1 cache for this many seconds
+     * ttl: the hard TTL policy - how long Redis keeps results (see server.cache.policy)
+     * depends_on: a function returning the dependency tags of each result, so edits can invalidate it (see
+       server.cache.dependencies)
+     * negative_ttl: also cache Media Cloud errors and empty results, for this many seconds (see
+       server.cache.negative); NEGATIVE_TTL is the configured default
+     * shared_by: a function returning the access class of each call, so users who can all see the same results
+       share one entry instead of one per API key (see server.cache.access)
+     * version: part of every key, so changing it invalidates all the function's results; defaults to a hash of the
+       function's code (see server.cache.versions)
+    Identical calls that run at the same time in one worker are coalesced into one (see server.cache.singleflight).
+    """
+
+    def cache_on_arguments(self, namespace=None, expiration_time=None, should_cache_fn=None,
+                           to_str=compat.string_type, function_key_generator=None, local_expiration_time=None,
+                           ttl=None, depends_on=None, negative_ttl=None, shared_by=None, version=None):
+        dogpile_cache_on_arguments = super().cache_on_arguments
+        base_key_generator_factory = function_key_generator or self.function_key_generator
+        if shared_by is not None:
+            base_key_generator_factory = _shared_key_generator_factory(base_key_generator_factory, shared_by)
+
+        def wrapper(fn):
+            fn_namespace = function_namespace(fn)
+            if local_expiration_time is not None:
+                local_cache.enable(fn_namespace, local_expiration_time)
+            ttl_policy.register(fn_namespace, ttl)
+            fn_version = versions.register(fn_namespace, code_version(fn) if version is None else version)
+
+            def key_generator_factory(key_namespace, key_fn):
+                return versioned_key_generator(base_key_generator_factory(key_namespace, key_fn), fn_version)
+            decorator = dogpile_cache_on_arguments(
+                namespace=namespace, expiration_time=expiration_time, should_cache_fn=should_cache_fn, to_str=to_str,
+                function_key_generator=key_generator_factory)
+            # the same keys dogpile generates, so batch lookups and coalescing line up with the per-call entries
+            key_generator = key_generator_factory(namespace, fn)
+            cached_fn = _coalesced_and_counted(
+                fn_namespace, key_generator, negative_ttl,
+                decorator(_instrumented_creator(fn_namespace, fn, depends_on, negative_ttl)))
+            cached_fn.cache_key = key_generator
+            return cached_fn
+        return wrapper
+
+    def get_or_create_many(self, cached_fn, args_list, create_many=None):
+        """
+        Like `[cached_fn(*args) for args in args_list]`, but reads all the cached results with one get_multi (ie. one
+        Redis MGET) and then just calls cached_fn for the misses, at the same time.
+        :param cached_fn: a function decorated with cache_on_arguments
+        :param args_list: a list of positional argument tuples to call it with
+        :param create_many: makes all the misses in one go instead of calling cached_fn for each (ie. with one search
+        for all their ids); it gets their argument tuples and returns their values in the same order. The values are
+        cached under cached_fn's keys, except for any that are None (ie. not found), which are returned as they are.
+        """
+        keys = [cached_fn.cache_key(*args) for args in args_list]
+        results = {}
+        for key, value in zip(keys, self.backend.get_multi(keys)):
+            # cached errors are left to cached_fn, so it raises them
+            if (value is not NO_VALUE) and (value.metadata['v'] == value_version) and \
+                    not is_error_payload(value.payload):
+                results[key] = value.payload
+                metrics.record_call(namespace_from_key(key), False)
+        missing = {}
+        for key, args in zip(keys, args_list):
+            if key not in results:
+                missing.setdefault(key, args)
+        if create_many is None:
+            created = map_concurrently(lambda args: cached_fn(*args), list(missing.values()))
+        elif len(missing) > 0:
+            created = create_many(list(missing.values()))
+            found = {key: value for key, value in zip(missing.keys(), created) if value is not None}
+            if len(found) > 0:
+                self.set_multi(found)
+            for key in missing:
+                metrics.record_call(namespace_from_key(key), True)
+        else:
+            created = []
+        results.update(dict(zip(missing.keys(), created)))
+        return [results[key] for key in keys]
+
+    def stream(self, cached_fn, *args, **kwargs):
+        """
+        For cached functions that return bytes (ie. file downloads): like `cached_fn(*args, **kwargs)`, but returns an
+        iterator over the bytes. If the cached value was big enough to be stored in chunks they are read from Redis a
+        few at a time as the iterator is consumed, so the whole thing is never in memory at once (ie. hand it right to
+        a Flask Response). Streamed reads aren't refreshed in the background.
+        """
+        key = cached_fn.cache_key(*args, **kwargs)
+        stored = self.actual_backend.get_stream(key)
+        if (stored is not None) and (stored[0].get('v') == value_version):
+            metrics.record_call(namespace_from_key(key), False)
+            return stored[1]
+        return iter([cached_fn(*args, **kwargs)])
+
+    def _value(self, value):
+        cached_value = super()._value(value)
+        # the backend reads these to pick the Redis expiration and record dependencies
+        cached_value.metadata.update(getattr(_current_call, 'metadata', None) or {})
+        _current_call.metadata = None
+        return cached_value
+
+    def invalidate_dependencies(self, *dependencies):
+        """
+        Delete every cached value that was written with any of these dependency tags.
+        """
+        keys = self.actual_backend.pop_dependent_keys(dependencies)
+        if len(keys) > 0:
+            self.delete_multi(keys)   # through the L1 cache too
+        logger.debug("Invalidated %d cache keys depending on %s", len(keys), dependencies)
+
+
+def _shared_key_generator_factory(key_generator_factory, shared_by):
+    def factory(namespace, fn):
+        return shared_key_generator(key_generator_factory(namespace, fn), shared_by)
+    return factory
+
+
+# whether the cached call running in this thread (greenlet) had to run the function itself, and the extra metadata
+# for the value it created, on its way to the region's _value
+_current_call = threading.local()
+
+
+def _instrumented_creator(namespace, fn, depends_on, negative_ttl):
+    # runs whenever the cache has to call the real function: times it and works out the TTL policy and dependencies
+    # for the new value
+    @functools.wraps(fn)
+    def creator(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except MCException as mce:
+            if (negative_ttl is None) or not is_cacheable_error(mce):
+                raise
+            result = error_payload(mce)
+        metrics.record_fill(namespace, time.perf_counter() - start)
+        metadata = {}
+        if (negative_ttl is not None) and is_negative(result):
+            metadata['ttl'] = negative_ttl
+        elif ttl_policy.applies_to(namespace):
+            metadata['ttl'] = ttl_policy.ttl_for(namespace, result, args, kwargs)
+        if (depends_on is not None) and not ((negative_ttl is not None) and is_error_payload(result)):
+            metadata['deps'] = list(depends_on(result, *args, **kwargs))
+        _current_call.metadata = metadata
+        _current_call.filled = True
+        return result
+    return creator
+
+
+def _coalesced_and_counted(namespace, key_generator, negative_ttl, cached_fn):
+    # identical calls that are already running in this worker are coalesced (see server.cache.singleflight)
+    def call_and_count(*args, **kwargs):
+        outer_call_filled = getattr(_current_call, 'filled', False)
+        _current_call.filled = False
+        try:
+            return cached_fn(*args, **kwargs)
+        finally:
+            metrics.record_call(namespace, _current_call.filled)
+            _current_call.filled = outer_call_filled
+            _current_call.metadata = None   # in case the value wasn't stored (ie. should_cache_fn said no)
+
+    @functools.wraps(cached_fn)
+    def coalesced_and_counted(*args, **kwargs):
+        result, shared = single_flight.do(key_generator(*args, **kwargs), call_and_count, *args, **kwargs)
+        if shared:
+            metrics.record_coalesced(namespace)
+        if (negative_ttl is not None) and is_error_payload(result):
+            raise_cached_error(result)
+        return result
+    return coalesced_and_counted
+
+
+def coalesced(fn):
+    """
+    Decorator for back-end calls that aren't cached, so identical ones running at the same time in this worker share
+    one call to the back-end. Like with caching, include the user's API key as an argument if the results depend on it.
+    """
+    namespace = function_namespace(fn)
+    key_generator = _keyword_safe_key_generator(None, fn)
+
+    @functools.wraps(fn)
+    def coalesced_fn(*args, **kwargs):
+        result, shared = single_flight.do(key_generator(*args, **kwargs), fn, *args, **kwargs)
+        if shared:
+            metrics.record_coalesced(namespace)
+        return result
+    return coalesced_fn
+
+
+single_flight = SingleFlight()
+
+metrics = CacheMetrics()
+
+NEGATIVE_TTL = int(_config_or_default('CACHE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL))
+
+versions = VersionRegistry()
+
+ttl_policy = TtlPolicy(parse_ttl_overrides(_config_or_default('CACHE_TTL_OVERRIDES', None)))
+
+local_cache = LocalMemoryProxy(int(_config_or_default('CACHE_LOCAL_MAX_BYTES', DEFAULT_LOCAL_CACHE_MAX_BYTES)))
+
+serializer = CacheSerializer(
+    codec=_config_or_default('CACHE_SERIALIZER', 'pickle'),
+    compression=_config_or_default('CACHE_COMPRESSION', 'zstd'),
+    compression_threshold=int(_config_or_default('CACHE_COMPRESSION_THRESHOLD', DEFAULT_COMPRESSION_THRESHOLD)),
+)
+
+
+def _backend_configuration():
+    # Redis unless CACHE_BACKEND says otherwise; the local dbm file is for single-node and offline deployments
+    backend = _config_or_default('CACHE_BACKEND', 'redis')
+    arguments = {
+        'redis_expiration_time': HARD_EXPIRATION_TIME,
+        'distributed_lock': True,
+        'serializer': serializer,
+        'metrics': metrics,
+    }
+    if backend == 'redis':
+        arguments.update({
+            'url': config.get('CACHE_REDIS_URL'),
+            'port': 6379,
+            'db': 0,
+            'chunk_size': _config_or_default('CACHE_CHUNK_SIZE', None),
+        })
+        return 'mc.redis', arguments
+    if backend == 'dbm':
+        arguments['filename'] = _config_or_default('CACHE_DBM_FILE',
+                                                   os.path.join(tempfile.gettempdir(), DEFAULT_DBM_FILENAME))
+        return 'mc.dbm', arguments
+    raise ConfigException("Unknown CACHE_BACKEND '{}' - use 'redis' or 'dbm'".format(backend))
+
+
+_backend_name, _backend_arguments = _backend_configuration()
+
+cache = McCacheRegion(function_key_generator=_keyword_safe_key_generator,
+                      async_creation_runner=background_refresh).configure(
+    _backend_name,
+    arguments=_backend_arguments,
+    wrap=[local_cache]
+)
+
+
+def cache_stats():
+    """
+    :return: overall L1 usage, plus per-namespace metrics (see server.cache.metrics) and L1/Redis hit rates, and the
+    load on each Redis node
+    """
+    stats = local_cache.stats()
+    for namespace, namespace_metrics in metrics.stats().items():
+        stats['namespaces'].setdefault(namespace, {}).update(namespace_metrics)
+    stats['shards'] = cache.actual_backend.shard_stats()
+    return stats
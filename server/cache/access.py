@@ -0,0 +1,30 @@
+"""
+Access classes - sharing cached results between users who are allowed to see the same things. Lots of cached
+functions take the user's API key as their first argument just so one user can't see another's results, which means
+50 people looking at the same public topic fill 50 identical entries. Pass `shared_by` to `cache.cache_on_arguments`
+to key those functions by an access class instead: a function called with the same arguments as the cached one,
+returning the name of a group of users who can all see the result (built with the helpers below). The function is
+still called with the real API key, so results are always fetched by someone in the class. When in doubt, return the
+API key itself, so that user's results stay their own.
+"""
+import functools
+
+ACCESS_CLASS_PREFIX = '_access:'   # so they can't be mistaken for an API key
+
+ADMIN_ACCESS = '{}admin'.format(ACCESS_CLASS_PREFIX)     # can see everything
+PUBLIC_ACCESS = '{}public'.format(ACCESS_CLASS_PREFIX)   # anyone who is logged in
+
+
+def topic_readers_access(topics_id):
+    # anyone who can read this topic
+    return '{}topic:{}:readers'.format(ACCESS_CLASS_PREFIX, topics_id)
+
+
+def shared_key_generator(key_generator, shared_by):
+    """
+    :return: a key generator that puts the access class in place of the API key (the first argument)
+    """
+    @functools.wraps(key_generator)
+    def generate_key(user_mc_key, *args, **kwargs):
+        return key_generator(shared_by(user_mc_key, *args, **kwargs), *args, **kwargs)
+    return generate_key
@@ -0,0 +1,450 @@
+"""
+Our own dogpile.cache backends. These are registered with dogpile so the region can be configured by name.
+"""
+import fnmatch
+import json
+import logging
+import os
+import struct
+import time
+import uuid
+
+import redis
+from dogpile.cache import register_backend
+from dogpile.cache.api import NO_VALUE, CachedValue
+from dogpile.cache.backends.redis import RedisBackend
+from dogpile.cache.backends.file import DBMBackend
+
+from server.cache.serializers import CacheSerializer, SerializationException
+from server.cache.dependencies import dependency_key, DEPENDENCY_KEY_PREFIX
+from server.cache.filelock import FileKeyLockFactory
+from server.cache.keys import namespace_from_key
+from server.cache.metrics import TimedMutex
+from server.cache.policy import IMMUTABLE, IMMUTABLE_EXPIRATION_TIME, expiration_seconds
+from server.cache.sharding import HashRing, shard_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 512 * 1024  # bytes; bigger values are split into chunks of this size
+
+CHUNK_MANIFEST_PREFIX = b'_chunked:'
+CHUNK_KEY_PREFIX = '_chunks:'
+CHUNK_GRACE_SECONDS = 60  # chunks outlive their manifest by this much, so reads that already started can finish
+CHUNKS_PER_READ = 4
+
+
+class McRedisBackend(RedisBackend):
+    """
+    The standard dogpile Redis backend always pickles; this one uses a pluggable serializer instead (pass one in as
+    the `serializer` argument). Values that can't be read back (ie. written by a newer version of the app) are
+    treated as misses. Each value is kept in Redis for the TTL its policy picked (see server.cache.policy), falling
+    back to `redis_expiration_time`, and its key is added to the Redis set for each of its dependency tags (see
+    server.cache.dependencies). Pass a CacheMetrics in as `metrics` to record value sizes and lock waits.
+
+    Values bigger than `chunk_size` bytes are split over several Redis keys, so no single GET or SET has to move a
+    huge blob. The value's own key just holds a small manifest listing the chunks. Values that are plain bytes (ie.
+    file downloads) are chunked as-is, without serializing them, so they can be streamed back out chunk by chunk (see
+    `get_stream`). Each write uses fresh chunk keys, and old chunks expire a little after their manifest, so readers
+    never see a mix of two writes.
+
+    The `url` can be a comma-separated list of Redis URLs, to spread the keys over all of them by consistent hashing
+    (see server.cache.sharding). The lock for a key lives on the same node as the key.
+    """
+
+    def __init__(self, arguments):
+        arguments = arguments.copy()
+        self.serializer = arguments.pop('serializer', None) or CacheSerializer()
+        self.metrics = arguments.pop('metrics', None)
+        self.chunk_size = int(arguments.pop('chunk_size', None) or DEFAULT_CHUNK_SIZE)
+        super().__init__(arguments)
+
+    def _create_client(self):
+        urls = [u.strip() for u in (self.url or '').split(',') if len(u.strip()) > 0]
+        if len(urls) > 1:
+            self.shards = {shard_name(url): self._create_shard_client(url) for url in urls}
+        else:
+            # one node, however it was set up (url, host and port, or connection pool)
+            self.url = urls[0] if len(urls) > 0 else None
+            self.shards = {shard_name(self.url) if self.url else self.host: super()._create_client()}
+        self.ring = HashRing(sorted(self.shards.keys()))
+        return self.shards[self.ring.nodes[0]]   # `client` is the only node, if there's just one
+
+    def _create_shard_client(self, url):
+        args = {'url': url}
+        if self.socket_timeout:
+            args['socket_timeout'] = self.socket_timeout
+        return redis.StrictRedis.from_url(**args)
+
+    def client_for(self, key):
+        return self.shards[self.ring.node_for(key)]
+
+    def _mget(self, keys):
+        found = {}
+        for node, node_keys in self.ring.group(keys).items():
+            found.update(zip(node_keys, self.shards[node].mget(node_keys)))
+        return [found[key] for key in keys]
+
+    def get_mutex(self, key):
+        if not self.distributed_lock:
+            return None
+        # not thread-local, because background refreshes release the lock from a different greenlet
+        mutex = self.client_for(key).lock('_lock{0}'.format(key), self.lock_timeout, self.lock_sleep, thread_local=False)
+        if self.metrics is None:
+            return mutex
+        namespace = namespace_from_key(key)
+        return TimedMutex(mutex, lambda seconds: self.metrics.record_lock_wait(namespace, seconds))
+
+    def _dumps(self, key, value):
+        data = self.serializer.dumps(value)
+        if self.metrics is not None:
+            self.metrics.record_size(namespace_from_key(key), len(data))
+        return data
+
+    def _loads(self, key, data):
+        if data is None:
+            return NO_VALUE
+        try:
+            if data.startswith(CHUNK_MANIFEST_PREFIX):
+                value = self._load_chunked(key, _manifest(data))
+                if value is NO_VALUE:
+                    return NO_VALUE
+            else:
+                value = self.serializer.loads(data)
+        except (SerializationException, ValueError, EOFError) as se:
+            logger.warning("Couldn't read cached value for %s: %s", key, se)
+            return NO_VALUE
+        if value.metadata.get('ttl') == IMMUTABLE:
+            # immutable values never go stale, so don't let a soft expiration_time refresh them in the background
+            value.metadata['ct'] = time.time()
+        return value
+
+    def _expiration_time(self, value):
+        return expiration_seconds(value.metadata.get('ttl'), self.redis_expiration_time)
+
+    def get(self, key):
+        return self._loads(key, self.client_for(key).get(key))
+
+    def get_multi(self, keys):
+        if not keys:
+            return []
+        return [self._loads(key, data) for key, data in zip(keys, self._mget(keys))]
+
+    def _load_chunked(self, key, manifest):
+        data = b''.join(self._read_chunks(key, manifest))
+        if len(data) != manifest['size']:
+            return NO_VALUE  # some chunks are gone
+        if manifest['raw']:
+            return CachedValue(data, manifest['metadata'])
+        return self.serializer.loads(data)
+
+    def _read_chunks(self, key, manifest):
+        # a few chunks at a time, so the whole value is never held here at once
+        chunk_keys = _chunk_keys(manifest)
+        for i in range(0, len(chunk_keys), CHUNKS_PER_READ):
+            for chunk in self._mget(chunk_keys[i:i + CHUNKS_PER_READ]):
+                if chunk is None:
+                    logger.warning("Missing chunk of cached value for %s", key)
+                    return
+                yield chunk
+
+    def get_stream(self, key):
+        """
+        :return: the metadata and an iterator over the bytes of a value that was stored as raw chunks, or None if this
+        key doesn't hold one
+        """
+        data = self.client_for(key).get(key)
+        if (data is None) or not data.startswith(CHUNK_MANIFEST_PREFIX):
+            return None
+        manifest = _manifest(data)
+        if not manifest['raw']:
+            return None
+        return manifest['metadata'], self._read_chunks(key, manifest)
+
+    def _write(self, pipes, key, value):
+        expiration_time = self._expiration_time(value)
+        raw = isinstance(value.payload, bytes) and (len(value.payload) > self.chunk_size)
+        data = value.payload if raw else self._dumps(key, value)
+        if raw and (self.metrics is not None):
+            self.metrics.record_size(namespace_from_key(key), len(data))
+        if len(data) > self.chunk_size:
+            data = self._write_chunks(pipes, key, value, data, raw, expiration_time)
+        if expiration_time:
+            pipes.for_key(key).setex(key, expiration_time, data)
+        else:
+            pipes.for_key(key).set(key, data)
+        for dependency in value.metadata.get('deps', []):
+            # remember which keys to delete when this dependency changes; kept as long as the longest-lived value
+            pipes.for_key(dependency_key(dependency)).sadd(dependency_key(dependency), key)
+            pipes.for_key(dependency_key(dependency)).expire(dependency_key(dependency), IMMUTABLE_EXPIRATION_TIME)
+
+    def _write_chunks(self, pipes, key, value, data, raw, expiration_time):
+        manifest = {
+            'id': uuid.uuid4().hex,
+            'count': (len(data) + self.chunk_size - 1) // self.chunk_size,
+            'size': len(data),
+            'raw': raw,
+            'metadata': value.metadata if raw else None,
+        }
+        for chunk_key, offset in zip(_chunk_keys(manifest), range(0, len(data), self.chunk_size)):
+            chunk = data[offset:offset + self.chunk_size]
+            if expiration_time:
+                pipes.for_key(chunk_key).setex(chunk_key, expiration_time + CHUNK_GRACE_SECONDS, chunk)
+            else:
+                pipes.for_key(chunk_key).set(chunk_key, chunk)
+        logger.debug("Cached %s in %d chunks", key, manifest['count'])
+        return CHUNK_MANIFEST_PREFIX + json.dumps(manifest).encode('utf-8')
+
+    def set(self, key, value):
+        self.set_multi({key: value})
+
+    def set_multi(self, mapping):
+        pipes = _ShardPipelines(self)
+        for key, value in mapping.items():
+            self._write(pipes, key, value)
+        pipes.execute()
+
+    def delete(self, key):
+        self.delete_multi([key])
+
+    def delete_multi(self, keys):
+        if not keys:
+            return
+        pipes = _ShardPipelines(self)
+        for key, data in zip(keys, self._mget(keys)):
+            if (data is not None) and data.startswith(CHUNK_MANIFEST_PREFIX):
+                # let the chunks go soon, rather than now, in case someone is in the middle of reading them
+                for chunk_key in _chunk_keys(_manifest(data)):
+                    pipes.for_key(chunk_key).expire(chunk_key, CHUNK_GRACE_SECONDS)
+            pipes.for_key(key).delete(key)
+        pipes.execute()
+
+    def namespace_usage(self, namespace):
+        """
+        :return: how many values are cached for this namespace (ie. a cached function), and their total size in bytes
+        """
+        count = 0
+        size = 0
+        for client in self.shards.values():
+            keys = list(client.scan_iter(match='{}|*'.format(namespace), count=1000))
+            pipe = client.pipeline(transaction=False)
+            for key in keys:
+                pipe.strlen(key)
+            count += len(keys)
+            size += sum(pipe.execute()) if len(keys) > 0 else 0
+        return count, size
+
+    def scan_keys(self, pattern, batch_size=1000):
+        """
+        :param pattern: a Redis glob pattern, ie. "server.views.apicache:_cached_story_count|*"
+        :return: an iterator over the matching keys, in lists of up to batch_size keys
+        """
+        for client in self.shards.values():
+            batch = []
+            for key in client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key.decode('utf-8') if isinstance(key, bytes) else key)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if len(batch) > 0:
+                yield batch
+
+    def shard_stats(self):
+        """
+        :return: the load on each Redis node, and the share of the keys the hash ring sends to it
+        """
+        stats = {}
+        shares = self.ring.shares()
+        for name, client in self.shards.items():
+            try:
+                info = client.info()
+                stats[name] = {
+                    'ring_share': shares[name],
+                    'keys': client.dbsize(),
+                    'used_memory': info.get('used_memory'),
+                    'ops_per_sec': info.get('instantaneous_ops_per_sec'),
+                    'connected_clients': info.get('connected_clients'),
+                }
+            except redis.RedisError as re:
+                stats[name] = {'ring_share': shares[name], 'error': str(re)}
+        return stats
+
+    def pop_dependent_keys(self, dependencies):
+        """
+        :return: all the keys that were written with any of these dependency tags (which are cleared out)
+        """
+        keys = set()
+        for node, dependency_keys in self.ring.group([dependency_key(d) for d in dependencies]).items():
+            pipe = self.shards[node].pipeline()
+            for key in dependency_keys:
+                pipe.smembers(key)
+                pipe.delete(key)
+            for members in pipe.execute()[::2]:
+                keys.update([k.decode('utf-8') if isinstance(k, bytes) else k for k in members])
+        return sorted(keys)
+
+
+class _ShardPipelines:
+    # one pipeline per Redis node, so a batch of writes is still one round trip to each of them
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._pipes = {}
+
+    def for_key(self, key):
+        node = self._backend.ring.node_for(key)
+        if node not in self._pipes:
+            self._pipes[node] = self._backend.shards[node].pipeline(transaction=False)
+        return self._pipes[node]
+
+    def execute(self):
+        for pipe in self._pipes.values():
+            pipe.execute()
+
+
+class McDbmBackend(DBMBackend):
+    """
+    A cache in a local dbm file, shared by all the worker processes on the box - for single-node or offline
+    deployments, and test runs, that don't want to run Redis. Values are written with the same serializer as
+    McRedisBackend, and expire after the same TTLs (expired values are cleared out every so often). Dependency tags
+    work too. The dogpile lock is per key, and works across processes (see server.cache.filelock). Arguments:
+     * filename: the dbm file (plus some lock files next to it)
+     * redis_expiration_time: the default TTL, named the same as for Redis so the two are configured alike
+    """
+
+    HEADER = struct.Struct('>d')  # when the value expires (0 for never), in front of the serialized value
+    PURGE_EVERY = 1000  # writes (per process)
+
+    def __init__(self, arguments):
+        arguments = arguments.copy()
+        self.serializer = arguments.pop('serializer', None) or CacheSerializer()
+        self.metrics = arguments.pop('metrics', None)
+        self.default_expiration_time = arguments.pop('redis_expiration_time', 0)
+        self.distributed_lock = arguments.pop('distributed_lock', True)
+        arguments['dogpile_lockfile'] = False   # we make our own, per key
+        super().__init__(arguments)
+        self._key_locks = FileKeyLockFactory(self.filename + '.keys.lock', arguments.get('lock_sleep', 0.1))
+        self._writes = 0
+
+    def get_mutex(self, key):
+        if not self.distributed_lock:
+            return None
+        mutex = self._key_locks(key)
+        if self.metrics is None:
+            return mutex
+        namespace = namespace_from_key(key)
+        return TimedMutex(mutex, lambda seconds: self.metrics.record_lock_wait(namespace, seconds))
+
+    def _loads(self, key, data):
+        if data is None:
+            return NO_VALUE
+        expires_at = self.HEADER.unpack_from(data)[0]
+        if expires_at and (expires_at < time.time()):
+            return NO_VALUE
+        try:
+            value = self.serializer.loads(data[self.HEADER.size:])
+        except (SerializationException, ValueError, EOFError) as se:
+            logger.warning("Couldn't read cached value for %s: %s", key, se)
+            return NO_VALUE
+        if value.metadata.get('ttl') == IMMUTABLE:
+            value.metadata['ct'] = time.time()  # see McRedisBackend._loads
+        return value
+
+    def _dumps(self, key, value):
+        expiration_time = expiration_seconds(value.metadata.get('ttl'), self.default_expiration_time)
+        data = self.serializer.dumps(value)
+        if self.metrics is not None:
+            self.metrics.record_size(namespace_from_key(key), len(data))
+        return self.HEADER.pack(time.time() + expiration_time if expiration_time else 0) + data
+
+    def get(self, key):
+        return self.get_multi([key])[0]
+
+    def get_multi(self, keys):
+        with self._dbm_file(False) as dbm:
+            return [self._loads(key, _dbm_get(dbm, key)) for key in keys]
+
+    def get_stream(self, _key):
+        return None  # values aren't chunked here; the region just reads them whole
+
+    def set(self, key, value):
+        self.set_multi({key: value})
+
+    def set_multi(self, mapping):
+        with self._dbm_file(True) as dbm:
+            for key, value in mapping.items():
+                dbm[key] = self._dumps(key, value)
+                for dependency in value.metadata.get('deps', []):
+                    dependents = set(_dbm_get(dbm, dependency_key(dependency), b'').split())
+                    dependents.add(key.encode('utf-8'))
+                    dbm[dependency_key(dependency)] = b' '.join(sorted(dependents))
+        self._writes += len(mapping)
+        if self._writes >= self.PURGE_EVERY:
+            self._writes = 0
+            self.purge_expired()
+
+    def delete_multi(self, keys):
+        with self._dbm_file(True) as dbm:
+            for key in keys:
+                if _dbm_get(dbm, key) is not None:
+                    del dbm[key]
+
+    def purge_expired(self):
+        now = time.time()
+        with self._dbm_file(True) as dbm:
+            for key in [k for k in dbm.keys() if not k.startswith(DEPENDENCY_KEY_PREFIX.encode())]:
+                expires_at = self.HEADER.unpack_from(dbm[key])[0]
+                if expires_at and (expires_at < now):
+                    del dbm[key]
+
+    def pop_dependent_keys(self, dependencies):
+        keys = set()
+        with self._dbm_file(True) as dbm:
+            for dependency in dependencies:
+                dependents = _dbm_get(dbm, dependency_key(dependency))
+                if dependents is not None:
+                    keys.update([k.decode('utf-8') for k in dependents.split()])
+                    del dbm[dependency_key(dependency)]
+        return sorted(keys)
+
+    def namespace_usage(self, namespace):
+        prefix = '{}|'.format(namespace).encode('utf-8')
+        with self._dbm_file(False) as dbm:
+            sizes = [len(dbm[k]) for k in dbm.keys() if k.startswith(prefix)]
+        return len(sizes), sum(sizes)
+
+    def scan_keys(self, pattern, batch_size=1000):
+        with self._dbm_file(False) as dbm:
+            keys = [k.decode('utf-8') for k in dbm.keys() if fnmatch.fnmatchcase(k.decode('utf-8'), pattern)]
+        for i in range(0, len(keys), batch_size):
+            yield keys[i:i + batch_size]
+
+    def shard_stats(self):
+        with self._dbm_file(False) as dbm:
+            key_count = len(dbm.keys())
+        return {self.filename: {'keys': key_count, 'file_bytes': _dbm_file_size(self.filename)}}
+
+
+def _dbm_get(dbm, key, default=None):
+    # gdbm objects don't have a .get
+    try:
+        return dbm[key]
+    except KeyError:
+        return default
+
+
+def _dbm_file_size(filename):
+    directory, name = os.path.split(filename)
+    return sum([os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)
+                if f.startswith(name) and not f.endswith('.lock')])
+
+
+def _manifest(data):
+    return json.loads(data[len(CHUNK_MANIFEST_PREFIX):].decode('utf-8'))
+
+
+def _chunk_keys(manifest):
+    return ['{}{}:{}'.format(CHUNK_KEY_PREFIX, manifest['id'], i) for i in range(manifest['count'])]
+
+
+register_backend('mc.redis', 'server.cache.backends', 'McRedisBackend')
+register_backend('mc.dbm', 'server.cache.backends', 'McDbmBackend')
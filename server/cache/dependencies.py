@@ -0,0 +1,32 @@
+"""
+Dependency tags for cached values, so edits can invalidate everything that shows what they changed. A cached function
+lists the things its result depends on with the `depends_on` argument to `cache.cache_on_arguments` - a function
+called with the result and arguments of the cached call, returning a list of tags built with the helpers below. The
+backend remembers which keys carry each tag (in a Redis set), and `cache.invalidate_dependencies` deletes them all.
+"""
+
+DEPENDENCY_KEY_PREFIX = '_deps:'
+LATEST_SNAPSHOT = 'latest'
+
+
+def collection_dependency(tags_id):
+    # collections are just tags, so this works for any tag
+    return 'collection:{}'.format(tags_id)
+
+
+def media_dependency(media_id):
+    return 'media:{}'.format(media_id)
+
+
+def topic_snapshot_dependency(topics_id, snapshots_id=None):
+    # no snapshots_id means "the latest one", which changes whenever a new version is generated
+    return 'topic:{}:snapshot:{}'.format(topics_id, snapshots_id if snapshots_id is not None else LATEST_SNAPSHOT)
+
+
+def topic_permissions_dependency(topics_id):
+    # who can read the topic (see server.cache.access)
+    return 'topic:{}:permissions'.format(topics_id)
+
+
+def dependency_key(dependency):
+    return '{}{}'.format(DEPENDENCY_KEY_PREFIX, dependency)
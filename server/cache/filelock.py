@@ -0,0 +1,105 @@
+"""
+Cross-process locks for the local (dbm) cache backend, so only one gunicorn worker on the box fills each missing key.
+Each key gets a POSIX lock on one byte of a shared lock file (picked by hashing the key), so there is no limit on the
+number of keys and no lock files to clean up. POSIX locks belong to the whole process, so an in-process lock per key
+makes greenlets in the same worker wait for each other too. Locks aren't tied to the thread (greenlet) that took them,
+because background refreshes release them from a different one.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+import time
+
+LOCK_FILE_RANGE = 2 ** 30  # how many different bytes of the lock file keys can hash to
+
+
+class _LockFile:
+    # one file descriptor per process - closing any descriptor for the file drops all of this process's locks on it
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+
+    def fd(self):
+        with self._lock:
+            if self._pid != os.getpid():  # opened before gunicorn forked this worker
+                self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+                self._pid = os.getpid()
+            return self._fd
+
+
+class _KeyLocks:
+    # in-process locks, kept just while someone holds or waits for them
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}  # key -> [lock, number of users]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def done(self, key):
+        with self._lock:
+            entry = self._locks[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+
+class FileKeyLock:
+
+    def __init__(self, lock_file, key_locks, key, sleep):
+        self._lock_file = lock_file
+        self._key_locks = key_locks
+        self._key = key
+        self._offset = int(hashlib.md5(key.encode('utf-8')).hexdigest()[:8], 16) % LOCK_FILE_RANGE
+        self._sleep = sleep
+        self._local_lock = None
+
+    def _try_lock_file(self):
+        try:
+            fcntl.lockf(self._lock_file.fd(), fcntl.LOCK_EX | fcntl.LOCK_NB, 1, self._offset)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, wait=True):
+        local_lock = self._key_locks.get(self._key)
+        if not local_lock.acquire(wait):
+            self._key_locks.done(self._key)
+            return False
+        # poll rather than block, so waiting doesn't hold up the other greenlets in this worker
+        while not self._try_lock_file():
+            if not wait:
+                local_lock.release()
+                self._key_locks.done(self._key)
+                return False
+            time.sleep(self._sleep)
+        self._local_lock = local_lock
+        return True
+
+    def release(self):
+        fcntl.lockf(self._lock_file.fd(), fcntl.LOCK_UN, 1, self._offset)
+        self._local_lock.release()
+        self._local_lock = None
+        self._key_locks.done(self._key)
+
+
+class FileKeyLockFactory:
+    """
+    Makes the lock for a key; all the processes using the same lock file exclude each other.
+    """
+
+    def __init__(self, path, sleep=0.1):
+        self._lock_file = _LockFile(path)
+        self._key_locks = _KeyLocks()
+        self._sleep = sleep
+
+    def __call__(self, key):
+        return FileKeyLock(self._lock_file, self._key_locks, key, self._sleep)
@@ -0,0 +1,114 @@
+"""
+Helpers for building cache keys. Our keys look like "module:function|arg1=value1 arg2=value2" (plus the function's
+version - see server.cache.versions), where the argument part is canonical - the same logical call always produces
+the same key no matter how the arguments were passed in. Long keys (ie. ones with huge Solr queries in them) get
+hashed down to a fixed-length digest.
+"""
+import hashlib
+import inspect
+import re
+
+MAX_READABLE_KEY_LENGTH = 250  # anything longer than this gets hashed
+
+# what the front-end sends for optional ids and filters it doesn't have (ie. snapshots_id=undefined); only arguments
+# like that are treated as if they weren't set, so a search for the word "null" isn't the same as an empty query
+UNSET_VALUES = ['undefined', 'null']
+UNSET_FILTER_ARGUMENTS = ['fq']
+
+_OPTIONAL_ID_PATTERN = re.compile(r'_ids?$')
+_INTEGER_PATTERN = re.compile(r'^-?\d+$')
+_ID_LIST_PATTERN = re.compile(r'^\s*\d+(\s*,\s*\d+)+\s*$')
+
+
+def function_namespace(fn):
+    return '%s:%s' % (fn.__module__, fn.__name__)
+
+
+def namespace_from_key(key):
+    # our keys all start with "module:function", so we can pull that off to find out what cached function it is for
+    return key.split('|', 1)[0]
+
+
+def _all_ids(values):
+    return all((isinstance(v, int) and not isinstance(v, bool)) or (isinstance(v, str) and _INTEGER_PATTERN.match(v))
+               for v in values)
+
+
+def canonical_value(value):
+    """
+    Turn an argument into a string that is the same for things we consider equivalent: '123' and 123, and [1, 2] and
+    '1,2'. Only lists of ids are joined with bare commas; the items of any other list, set or dict are quoted, so
+    ['a,b', 'c'] and ['a', 'b,c'] stay different.
+    """
+    if value is None:
+        canonical = ''
+    elif isinstance(value, (bool, int)):
+        canonical = str(value)
+    elif isinstance(value, str) and _INTEGER_PATTERN.match(value):
+        canonical = str(int(value))
+    elif isinstance(value, str) and _ID_LIST_PATTERN.match(value):
+        canonical = ",".join([str(int(part)) for part in value.split(",")])
+    elif isinstance(value, (list, tuple)) and _all_ids(value):
+        canonical = ",".join([canonical_value(v) for v in value])
+    elif isinstance(value, (list, tuple)):
+        canonical = "[" + ",".join([repr(canonical_value(v)) for v in value]) + "]"
+    elif isinstance(value, (set, frozenset)) and _all_ids(value):
+        canonical = ",".join(sorted([canonical_value(v) for v in value], key=int))
+    elif isinstance(value, (set, frozenset)):
+        canonical = "{" + ",".join(sorted([repr(canonical_value(v)) for v in value])) + "}"
+    elif isinstance(value, dict):
+        canonical = "{" + " ".join(["{!r}={!r}".format(str(k), canonical_value(value[k]))
+                                    for k in sorted(value.keys(), key=str)]) + "}"
+    else:
+        canonical = str(value)
+    return canonical
+
+
+def _is_optional_id_or_filter(name):
+    return (_OPTIONAL_ID_PATTERN.search(name) is not None) or (name in UNSET_FILTER_ARGUMENTS)
+
+
+def canonical_argument(name, value):
+    """
+    Like canonical_value, but an optional id or filter argument (ie. snapshots_id or fq) set to 'undefined' or 'null'
+    is the same as None.
+    """
+    if isinstance(value, str) and (value in UNSET_VALUES) and _is_optional_id_or_filter(name):
+        value = None
+    return canonical_value(value)
+
+
+def canonical_arguments(signature, args, kwargs):
+    """
+    Bind the arguments to the function signature (filling in defaults), so it doesn't matter if something was
+    passed positionally or by keyword, or in what order the keywords were passed.
+    :return: a list of "name=value" strings
+    """
+    try:
+        bound = signature.bind(*args, **kwargs)
+    except TypeError:
+        # let the real call raise the error; just make a reasonable key in the meantime
+        return [canonical_value(a) for a in args] + \
+               ["{}={}".format(k, canonical_argument(k, kwargs[k])) for k in sorted(kwargs.keys())]
+    bound.apply_defaults()
+    parts = []
+    for name, value in bound.arguments.items():
+        kind = signature.parameters[name].kind
+        if kind == inspect.Parameter.VAR_KEYWORD:
+            parts += ["{}={}".format(k, canonical_argument(k, value[k])) for k in sorted(value.keys())]
+        elif kind == inspect.Parameter.VAR_POSITIONAL:
+            parts += [canonical_value(v) for v in value]
+        else:
+            parts.append("{}={}".format(name, canonical_argument(name, value)))
+    return parts
+
+
+def hashed_key(namespace, readable_args):
+    """
+    Keep short keys readable, but hash long ones so they don't eat up Redis memory. We always keep the namespace
+    on the front so we can tell what function a key is for.
+    """
+    key = namespace + "|" + readable_args
+    if len(key) <= MAX_READABLE_KEY_LENGTH:
+        return key
+    return namespace + "|#" + hashlib.sha1(readable_args.encode('utf-8')).hexdigest()
@@ -0,0 +1,101 @@
+"""
+Request-scoped batch loading, like Facebook's DataLoader. Lots of places look things up by id one at a time (ie. a
+story for each sentence, or for each row of a page), often from several threads at once (see `gather`). A loader
+collects the ids asked for within a short window, looks them all up with one `load_many` call, and hands each caller
+its own results in the order it asked for them. Results are remembered for the rest of the request, so asking again
+is free.
+
+Loaders are kept on the request's WSGI environ rather than `flask.g`, because the threads `gather` starts get their own
+app context (and so their own `g`) but share the request. Outside of a request each call gets a fresh loader, so
+there's no batching across calls but lookups still happen in chunks.
+"""
+import copy
+import threading
+import time
+
+from flask import request, has_request_context
+
+BATCH_WINDOW = 0.002  # seconds to wait for other callers to join a batch
+ENVIRON_KEY = 'webtools.loaders'
+
+
+class _Batch:
+
+    def __init__(self):
+        self.keys = []
+        self.done = threading.Event()
+        self.error = None
+
+
+class BatchLoader:
+
+    def __init__(self, load_many, window=BATCH_WINDOW):
+        """
+        :param load_many: a function that takes a list of keys and returns their values, in the same order
+        """
+        self._load_many = load_many
+        self._window = window
+        self._lock = threading.Lock()
+        self._open_batch = None
+        self._in_flight = {}  # key -> the batch it is being loaded in
+        self._results = {}
+
+    def load(self, key):
+        return self.load_many([key])[0]
+
+    def load_many(self, keys):
+        """
+        :return: the value for each key, in the same order (each caller gets its own copy, because callers often add
+        things to them)
+        """
+        leader_of = None
+        waiting_on = set()
+        with self._lock:
+            for key in keys:
+                if (key in self._results) or (key in self._in_flight):
+                    if key in self._in_flight:
+                        waiting_on.add(self._in_flight[key])
+                    continue
+                if self._open_batch is None:
+                    self._open_batch = leader_of = _Batch()
+                self._open_batch.keys.append(key)
+                self._in_flight[key] = self._open_batch
+                waiting_on.add(self._open_batch)
+        if leader_of is not None:
+            self._dispatch(leader_of)
+        for batch in waiting_on:
+            batch.done.wait()
+            if batch.error is not None:
+                raise batch.error
+        with self._lock:
+            return [copy.deepcopy(self._results[key]) for key in keys]
+
+    def _dispatch(self, batch):
+        time.sleep(self._window)  # let anyone else asking right now join in
+        with self._lock:
+            self._open_batch = None  # later callers start a new batch
+        try:
+            values = self._load_many(batch.keys)
+        except Exception as e:  # pylint: disable=broad-except
+            batch.error = e  # raised in every caller waiting on this batch
+            values = None
+        with self._lock:
+            if values is not None:
+                self._results.update(zip(batch.keys, values))
+            for key in batch.keys:
+                del self._in_flight[key]
+        batch.done.set()
+
+
+def request_loader(name, load_many):
+    """
+    :return: this request's loader with this name (made with `load_many` the first time it is asked for)
+    """
+    if not has_request_context():
+        return BatchLoader(load_many, window=0)
+    loaders = request.environ.setdefault(ENVIRON_KEY, {})
+    return loaders.setdefault(name, BatchLoader(load_many))
+
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
@@ -0,0 +1,205 @@
+"""
+An optional in-process (L1) cache that sits in front of the shared Redis cache inside each gunicorn worker. It is
+meant for tiny, hot values (tags, tag sets, media, stats) that are read dozens of times per page load, so we can skip
+the Redis round trip for them. Each namespace has to opt in, via `local_expiration_time` on the decorator.
+"""
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict, Counter, defaultdict
+
+from dogpile.cache.api import NO_VALUE
+from dogpile.cache.proxy import ProxyBackend
+
+from server.cache.keys import namespace_from_key
+
+logger = logging.getLogger(__name__)
+
+
+class LocalMemoryCache:
+    """
+    A least-recently-used cache of serialized values, bounded by the total number of bytes it holds. Each entry
+    has its own time-to-live. We store the serialized bytes (not the objects) so callers that mutate the results
+    they get back (and plenty of ours do) can't change what other requests see.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, data)
+        self._size = 0
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def set(self, key, data, ttl):
+        size = len(data)
+        if size > self.max_bytes:
+            return  # never worth blowing the whole cache for one value
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl, data)
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        _expires_at, data = self._entries.pop(key)
+        self._size -= len(data)
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalMemoryProxy(ProxyBackend):
+    """
+    Dogpile proxy that checks the per-worker LocalMemoryCache before going to the real backend, for namespaces that
+    have been enabled. It also counts hits and misses per namespace, so we can report L1 and Redis hit rates
+    separately.
+    """
+
+    def __init__(self, max_bytes):
+        super().__init__()
+        self.local = LocalMemoryCache(max_bytes)
+        self._namespace_ttls = {}  # namespace -> seconds to hold values locally
+        self._counts = defaultdict(Counter)
+
+    @property
+    def enabled(self):
+        return self.local.max_bytes > 0
+
+    def enable(self, namespace, ttl):
+        self._namespace_ttls[namespace] = ttl
+
+    def _local_ttl(self, key):
+        if not self.enabled:
+            return None
+        return self._namespace_ttls.get(namespace_from_key(key))
+
+    def _hold(self, key, value, ttl):
+        # never hold a value here for longer than Redis will (ie. short-lived negative entries)
+        value_ttl = value.metadata.get('ttl') if hasattr(value, 'metadata') else None
+        if isinstance(value_ttl, int):
+            ttl = min(ttl, value_ttl)
+        self.local.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl)
+
+    def get(self, key):
+        namespace = namespace_from_key(key)
+        ttl = self._local_ttl(key)
+        if ttl is not None:
+            data = self.local.get(key)
+            if data is not None:
+                self._counts[namespace]['local_hits'] += 1
+                return pickle.loads(data)
+            self._counts[namespace]['local_misses'] += 1
+        value = self.proxied.get(key)
+        self._record_backend_result(namespace, value)
+        if (ttl is not None) and (value is not NO_VALUE):
+            self._hold(key, value, ttl)
+        return value
+
+    def get_multi(self, keys):
+        results = {}
+        keys_to_fetch = []
+        for key in keys:
+            namespace = namespace_from_key(key)
+            data = self.local.get(key) if self._local_ttl(key) is not None else None
+            if data is not None:
+                self._counts[namespace]['local_hits'] += 1
+                results[key] = pickle.loads(data)
+            else:
+                if self._local_ttl(key) is not None:
+                    self._counts[namespace]['local_misses'] += 1
+                keys_to_fetch.append(key)
+        if keys_to_fetch:
+            for key, value in zip(keys_to_fetch, self.proxied.get_multi(keys_to_fetch)):
+                self._record_backend_result(namespace_from_key(key), value)
+                ttl = self._local_ttl(key)
+                if (ttl is not None) and (value is not NO_VALUE):
+                    self._hold(key, value, ttl)
+                results[key] = value
+        return [results[key] for key in keys]
+
+    def set(self, key, value):
+        self.proxied.set(key, value)
+        ttl = self._local_ttl(key)
+        if ttl is not None:
+            self._hold(key, value, ttl)
+
+    def set_multi(self, mapping):
+        self.proxied.set_multi(mapping)
+        for key, value in mapping.items():
+            ttl = self._local_ttl(key)
+            if ttl is not None:
+                self._hold(key, value, ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.proxied.delete(key)
+
+    def delete_multi(self, keys):
+        for key in keys:
+            self.local.delete(key)
+        self.proxied.delete_multi(keys)
+
+    def _record_backend_result(self, namespace, value):
+        self._counts[namespace]['backend_misses' if value is NO_VALUE else 'backend_hits'] += 1
+
+    def stats(self):
+        """
+        :return: a dict with overall L1 usage, plus per-namespace hit rates for the L1 and the backend (ie. Redis)
+        """
+        namespaces = {}
+        for namespace, counts in self._counts.items():
+            namespaces[namespace] = {
+                'local': _hit_rate(counts['local_hits'], counts['local_misses']),
+                'backend': _hit_rate(counts['backend_hits'], counts['backend_misses']),
+                'local_ttl': self._namespace_ttls.get(namespace),
+            }
+        return {
+            'local': {
+                'enabled': self.enabled,
+                'max_bytes': self.local.max_bytes,
+                'bytes': self.local.size,
+                'entries': len(self.local),
+                'evictions': self.local.evictions,
+            },
+            'namespaces': namespaces,
+        }
+
+
+def _hit_rate(hits, misses):
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': float(hits) / float(total) if total > 0 else None,
+    }
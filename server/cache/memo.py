@@ -0,0 +1,57 @@
+"""
+Request-scoped memoization. Lots of helpers get called over and over with the same arguments while answering one
+request (ie. the timespan list for a topic, once for each focus in a focal set). Decorate them with
+`request_memoized` and they run at most once per request for each set of arguments; the results are held on
+`flask.g`, so they go away when the request is done. Outside of a request the helper is just called. This works in
+front of the Redis cache or in front of uncached calls, and is fine for per-user results because a request only has
+one user.
+"""
+import copy
+import functools
+import inspect
+import logging
+from collections import Counter
+
+from flask import g, has_app_context, has_request_context
+
+from server.cache.keys import function_namespace, canonical_arguments
+
+logger = logging.getLogger(__name__)
+
+
+def request_memoized(fn):
+    namespace = function_namespace(fn)
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def memoized(*args, **kwargs):
+        if not has_request_context():
+            return fn(*args, **kwargs)
+        if 'request_memo' not in g:
+            g.request_memo = {}
+            g.request_memo_hits = Counter()
+        key = (namespace, " ".join(canonical_arguments(signature, args, kwargs)))
+        if key in g.request_memo:
+            g.request_memo_hits[namespace] += 1
+            # callers often add things to the results they get, so everyone gets their own copy
+            return copy.deepcopy(g.request_memo[key])
+        result = fn(*args, **kwargs)
+        g.request_memo[key] = copy.deepcopy(result)
+        return result
+    return memoized
+
+
+def request_memo_hits():
+    """
+    :return: how many duplicate calls memoization avoided during this request, by function namespace
+    """
+    if not has_app_context():
+        return Counter()
+    return g.get('request_memo_hits', Counter())
+
+
+def log_request_memo_hits(_exception=None):
+    # register this as a teardown_request handler to see what each request avoided
+    hits = request_memo_hits()
+    if len(hits) > 0:
+        logger.debug("Request memoization avoided %d duplicate calls: %s", sum(hits.values()), dict(hits))
@@ -0,0 +1,149 @@
+"""
+Per-namespace (ie. per cached function) instrumentation for the cache region: how often calls are served from the
+cache, how many shared the result of an identical call already in progress, how long filling a miss from the back-end
+takes, how big the serialized values are, and how long callers wait on the dogpile lock while someone else fills it.
+Counts are per worker process, since the last restart.
+"""
+import threading
+import time
+from collections import defaultdict
+
+METRIC_PREFIX = 'webtools_cache'
+
+
+class _Timing:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, amount):
+        self.count += 1
+        self.total += amount
+        self.max = max(self.max, amount)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': float(self.total) / self.count if self.count > 0 else None,
+            'max': self.max,
+        }
+
+
+class _NamespaceMetrics:
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.fill_seconds = _Timing()
+        self.value_bytes = _Timing()
+        self.lock_wait_seconds = _Timing()
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / total if total > 0 else None,
+            'coalesced': self.coalesced,
+            'fill_seconds': self.fill_seconds.as_dict(),
+            'value_bytes': self.value_bytes.as_dict(),
+            'lock_wait_seconds': self.lock_wait_seconds.as_dict(),
+        }
+
+
+class CacheMetrics:
+    """
+    Collects metrics for the region. The region counts calls (a call that had to run the cached function is a miss,
+    anything else a hit), times the fills, and the backend reports value sizes and lock waits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._namespaces = defaultdict(_NamespaceMetrics)
+
+    def record_call(self, namespace, filled):
+        with self._lock:
+            if filled:
+                self._namespaces[namespace].misses += 1
+            else:
+                self._namespaces[namespace].hits += 1
+
+    def record_coalesced(self, namespace):
+        # a call that waited for an identical one in progress to finish, instead of running itself
+        with self._lock:
+            self._namespaces[namespace].coalesced += 1
+
+    def record_fill(self, namespace, seconds):
+        with self._lock:
+            self._namespaces[namespace].fill_seconds.add(seconds)
+
+    def record_size(self, namespace, size):
+        with self._lock:
+            self._namespaces[namespace].value_bytes.add(size)
+
+    def record_lock_wait(self, namespace, seconds):
+        with self._lock:
+            self._namespaces[namespace].lock_wait_seconds.add(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._namespaces.clear()
+
+    def stats(self):
+        with self._lock:
+            return {namespace: metrics.as_dict() for namespace, metrics in self._namespaces.items()}
+
+    def as_text(self):
+        """
+        :return: the metrics in the Prometheus text exposition format, so they can be scraped
+        """
+        stats = self.stats()
+        lines = []
+
+        def add_metric(name, metric_type, description, value_fn):
+            full_name = '{}_{}'.format(METRIC_PREFIX, name)
+            lines.append('# HELP {} {}'.format(full_name, description))
+            lines.append('# TYPE {} {}'.format(full_name, metric_type))
+            for namespace in sorted(stats.keys()):
+                lines.append('{}{{namespace="{}"}} {}'.format(full_name, _escape_label(namespace),
+                                                             value_fn(stats[namespace])))
+        add_metric('hits_total', 'counter', "Calls answered from the cache", lambda s: s['hits'])
+        add_metric('misses_total', 'counter', "Calls that had to call the back-end", lambda s: s['misses'])
+        add_metric('coalesced_total', 'counter', "Calls that shared the result of an identical one in progress",
+                   lambda s: s['coalesced'])
+        for name, description in [('fill_seconds', "Time spent filling misses from the back-end"),
+                                  ('value_bytes', "Serialized size of values written to the cache"),
+                                  ('lock_wait_seconds', "Time spent waiting for another worker to fill a miss")]:
+            add_metric(name + '_count', 'counter', description + " (count)", lambda s, n=name: s[n]['count'])
+            add_metric(name + '_sum', 'counter', description + " (total)", lambda s, n=name: s[n]['total'])
+            add_metric(name + '_max', 'gauge', description + " (max)", lambda s, n=name: s[n]['max'])
+        return "\n".join(lines) + "\n"
+
+
+class TimedMutex:
+    """
+    Wraps a dogpile mutex to report how long blocking acquires wait.
+    """
+
+    def __init__(self, mutex, on_wait):
+        self.mutex = mutex
+        self._on_wait = on_wait
+
+    def acquire(self, wait=True):
+        if not wait:
+            return self.mutex.acquire(wait)
+        start = time.perf_counter()
+        acquired = self.mutex.acquire(wait)
+        self._on_wait(time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self.mutex.release()
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
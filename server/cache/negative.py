@@ -0,0 +1,43 @@
+"""
+Negative caching - remembering, for a little while, that a call failed with a Media Cloud error or came back empty.
+Without it nothing is cached when the back-end throws, so every poll from the browser retries the same failing call,
+piling on more work just when the back-end is struggling. Cached functions opt in with the `negative_ttl` argument
+to `cache.cache_on_arguments`; their errors and empty results are then cached for that many seconds (instead of their
+usual TTL), and cached errors are raised again as MCExceptions, so `api_error_handler` reports them just like the
+original. Results that aren't errors or empty are cached exactly as before. Functions that shouldn't be cached at all
+otherwise can pass `should_cache_fn=is_negative` too, so only their failures are. Errors that are about this moment
+or this request rather than the call itself (ie. the request running out of time) set `cacheable = False` on their
+class, and are always raised rather than cached. So are authentication and permission errors (401 and 403): they
+depend on whose API key made the call, and plenty of cached functions are shared between users.
+"""
+from mediacloud.error import MCException
+
+DEFAULT_NEGATIVE_TTL = 30  # seconds
+
+ERROR_KEY = '_mc_error'
+USER_SPECIFIC_STATUSES = [401, 403]
+
+
+def is_cacheable_error(mc_exception):
+    return getattr(mc_exception, 'cacheable', True) and (mc_exception.status_code not in USER_SPECIFIC_STATUSES)
+
+
+def error_payload(mc_exception):
+    # a plain dict, so any of the serializer codecs can store it
+    return {ERROR_KEY: {'message': mc_exception.message, 'status_code': mc_exception.status_code}}
+
+
+def is_error_payload(value):
+    return isinstance(value, dict) and (len(value) == 1) and (ERROR_KEY in value)
+
+
+def is_empty(value):
+    return (value is None) or (isinstance(value, (list, tuple, dict, set, str)) and len(value) == 0)
+
+
+def is_negative(value):
+    return is_error_payload(value) or is_empty(value)
+
+
+def raise_cached_error(value):
+    raise MCException(value[ERROR_KEY]['message'], value[ERROR_KEY]['status_code'])
@@ -0,0 +1,77 @@
+"""
+Hard TTL policies - how long Redis keeps the results of a cached function. Without one a value lives for the region's
+default (3 days). Set one with the `ttl` argument to `cache.cache_on_arguments`; it can be:
+ * a number of seconds
+ * IMMUTABLE, for results that never change (ie. anything about a finished topic snapshot)
+ * a function called with the result and the arguments of the cached call, returning either of those (or None for
+   the default) - so the same function can cache results differently depending on what they were
+Deployments can override any of them by namespace with the CACHE_TTL_OVERRIDES config setting.
+"""
+ONE_HOUR = 60*60
+ONE_DAY = ONE_HOUR * 24
+
+IMMUTABLE = 'immutable'
+IMMUTABLE_EXPIRATION_TIME = ONE_DAY * 30  # even immutable values go eventually, so keys nobody reads don't pile up
+
+
+def immutable_when(is_final, ttl=None):
+    """
+    A TTL policy for results that stop changing at some point, like counts within a snapshot that is complete.
+    :param is_final: called with the result and arguments of the cached call; return True if it can't change anymore
+    :param ttl: the TTL to use until then (None means the default)
+    """
+    def policy(result, *args, **kwargs):
+        return IMMUTABLE if is_final(result, *args, **kwargs) else ttl
+    return policy
+
+
+def parse_ttl_overrides(text):
+    """
+    Read a CACHE_TTL_OVERRIDES config string like
+    `server.views.apicache:_cached_story_count:3600,server.util.tags:_cached_tag_page:immutable` (not "=", which the
+    config file parser splits lines on)
+    """
+    overrides = {}
+    for item in [i.strip() for i in (text or '').split(',') if len(i.strip()) > 0]:
+        namespace, _, ttl = item.rpartition(':')
+        if len(namespace) == 0:
+            raise ValueError("Cache TTL override '{}' should look like namespace:seconds".format(item))
+        overrides[namespace.strip()] = IMMUTABLE if ttl.strip() == IMMUTABLE else int(ttl)
+    return overrides
+
+
+class TtlPolicy:
+    """
+    The TTL policies of all our cached functions, by namespace (see server.cache.keys.function_namespace).
+    """
+
+    def __init__(self, overrides=None):
+        self._ttls = {}
+        self._overrides = overrides or {}
+
+    def register(self, namespace, ttl):
+        self._ttls[namespace] = ttl
+
+    def applies_to(self, namespace):
+        return (self._ttls.get(namespace) is not None) or (namespace in self._overrides)
+
+    def ttl_for(self, namespace, result, args, kwargs):
+        if namespace in self._overrides:
+            return self._overrides[namespace]
+        ttl = self._ttls.get(namespace)
+        if callable(ttl):
+            ttl = ttl(result, *args, **kwargs)
+        return ttl
+
+    def policies(self):
+        ttls = {ns: ('dynamic' if callable(ttl) else ttl) for ns, ttl in self._ttls.items() if ttl is not None}
+        ttls.update(self._overrides)
+        return ttls
+
+
+def expiration_seconds(ttl, default):
+    if ttl is None:
+        return default
+    if ttl == IMMUTABLE:
+        return IMMUTABLE_EXPIRATION_TIME
+    return int(ttl)
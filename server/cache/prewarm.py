@@ -0,0 +1,143 @@
+"""
+Prewarming - filling the cache with hot, user-agnostic entries ahead of time (ie. right after a deploy or a Redis
+flush), so the first users don't pay for all the cold misses. Run it with `flask prewarm-cache`. The manifest below
+lists what can be prewarmed; set CACHE_PREWARM to a comma-separated list of names to only do some of them.
+"""
+# pylint: disable=import-outside-toplevel
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from server.util.limiter import bulk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+
+
+class PrewarmEntry:
+    """
+    Something to prewarm: the cache namespaces it fills, and a function that returns the calls that fill them (as a
+    list of (label, fn, args) tuples).
+    """
+
+    def __init__(self, name, namespaces, tasks_fn):
+        self.name = name
+        self.namespaces = namespaces
+        self.tasks_fn = tasks_fn
+
+    def tasks(self):
+        return self.tasks_fn()
+
+
+def _featured_collections():
+    import server.views.sources.apicache as sources_apicache
+    return [('featured collections', sources_apicache.featured_collections, ())]
+
+
+def _stats():
+    import server.views.apicache as base_apicache
+    return [('stats', base_apicache.cached_stats, ())]
+
+
+def _metadata_tag_sets():
+    from server import TOOL_API_KEY
+    from server.util.tags import TagSetDiscoverer, tag_set_with_tags
+    return [('metadata tag set {}'.format(tag_sets_id), tag_set_with_tags, (TOOL_API_KEY, tag_sets_id, False, True))
+            for tag_sets_id in TagSetDiscoverer().media_metadata_sets()]
+
+
+def _topic_platform_info():
+    import server.views.topics.apicache as topics_apicache
+    return [('topic platform info', topics_apicache.topic_platform_info, ())]
+
+
+MANIFEST = [
+    PrewarmEntry('featured_collections', ['server.views.sources.apicache:_cached_featured_collection_list'],
+                 _featured_collections),
+    PrewarmEntry('stats', ['server.views.apicache:cached_stats'], _stats),
+    PrewarmEntry('metadata_tag_sets', ['server.util.tags:cached_tag_set_file', 'server.util.tags:_cached_tag_page'],
+                 _metadata_tag_sets),
+    PrewarmEntry('topic_platform_info', ['server.views.topics.apicache:topic_platform_info'], _topic_platform_info),
+]
+
+
+def manifest_entries(names=None):
+    """
+    :param names: the names of the entries to return (all of them if None)
+    """
+    if names is None:
+        return MANIFEST
+    unknown = set(names) - set([e.name for e in MANIFEST])
+    if len(unknown) > 0:
+        raise ValueError("Unknown cache prewarm entries: {}".format(", ".join(sorted(unknown))))
+    return [e for e in MANIFEST if e.name in names]
+
+
+def plan(entries):
+    """
+    Dry run - list the calls prewarming the entries would make, without making them.
+    :return: a list of dicts with name, label, function and key - the cache key the call fills, or None if the function
+    isn't cached itself (it fills the cache through the calls it makes, ie. a page at a time)
+    """
+    calls = []
+    for entry in entries:
+        for label, fn, args in entry.tasks():
+            cache_key = getattr(fn, 'cache_key', None)
+            calls.append({'name': entry.name, 'label': label, 'function': fn.__name__,
+                          'key': None if cache_key is None else cache_key(*args)})
+    return calls
+
+
+def estimate(entries):
+    """
+    Dry run - report how many entries each namespace holds in Redis right now, and how big they are. Nothing is
+    fetched from the back-end.
+    :return: a list of dicts with namespace, entries and bytes
+    """
+    from server.cache import cache
+    usage = []
+    for entry in entries:
+        for namespace in entry.namespaces:
+            count, size = cache.actual_backend.namespace_usage(namespace)
+            usage.append({'name': entry.name, 'namespace': namespace, 'entries': count, 'bytes': size})
+    return usage
+
+
+@bulk
+def _run_as_tool_user(tool_user, fn, args):
+    # our cached functions expect a request with a logged in user, so they can find an API key to use
+    # (at bulk priority, so prewarming right after a deploy doesn't crowd out the first users)
+    import flask_login
+    from server import app
+    with app.test_request_context():
+        flask_login.login_user(tool_user)
+        start = time.perf_counter()
+        fn(*args)
+        return time.perf_counter() - start
+
+
+def prewarm(entries, concurrency=DEFAULT_CONCURRENCY, progress=None):
+    """
+    Make every call in the entries (with the tool user's API key), so the results are cached.
+    :param progress: called with (number done, total, label, seconds or None, error or None) after each call
+    :return: the number of calls that failed
+    """
+    from server import mc
+    from server.auth import User
+    tool_user = User(mc.userProfile())
+    tasks = [task for entry in entries for task in entry.tasks()]
+    failures = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(_run_as_tool_user, tool_user, fn, args): label for label, fn, args in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                seconds, error = future.result(), None
+            except Exception as e:  # pylint: disable=broad-except
+                # keep going, so one bad entry doesn't stop a release
+                seconds, error = None, e
+                failures += 1
+                logger.exception("Couldn't prewarm %s", futures[future])
+            if progress is not None:
+                progress(done, len(tasks), futures[future], seconds, error)
+    return failures
@@ -0,0 +1,32 @@
+"""
+Stale-while-revalidate support. Functions decorated with an `expiration_time` get a soft TTL: once a value is older
+than that it is still returned right away, and one background refresh runs while holding the (distributed) dogpile
+lock, so every other worker keeps getting the stale value instead of piling onto the back-end. Values are only
+really gone once Redis expires them (the hard TTL).
+"""
+import logging
+from flask import has_request_context
+
+from server import executor
+
+logger = logging.getLogger(__name__)
+
+
+def background_refresh(region, key, creator, mutex):
+    """
+    Our dogpile `async_creation_runner`. Dogpile hands us the lock it acquired; we have to release it when the
+    refresh is done.
+    """
+    def refresh():
+        try:
+            region.set(key, creator())
+        except Exception:  # pylint: disable=broad-except
+            # the stale value stays in place, and the next request after it expires will try again
+            logger.exception("Background refresh failed for %s", key)
+        finally:
+            mutex.release()
+    if has_request_context():
+        # the executor copies the request context over, so creators can still find the logged in user's API key
+        executor.submit(refresh)
+    else:
+        refresh()
@@ -0,0 +1,151 @@
+"""
+Serializing values for the cache. Values are compressed if they are big enough to make that worth it, and can be
+written as pickles or msgpack (see scripts/benchmark_cache_serializer.py for how they compare on our payloads - on
+typical API responses pickle+zstd was both smallest and fastest to read). Every payload starts with a small header
+recording the format version, codec and compression, so we can change any of those later. Payloads without the header
+are read as the raw pickles that dogpile.cache used to write, so old entries can still be read during a rollout.
+Anything that can't be read (ie. a corrupt or truncated value) raises a SerializationException, so the cache treats it
+as a miss.
+"""
+import logging
+import pickle
+import zlib
+
+from dogpile.cache.api import CachedValue
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MC'
+FORMAT_VERSION = 1
+
+CODEC_PICKLE = b'p'
+CODEC_MSGPACK = b'm'
+
+COMPRESSION_NONE = b'-'
+COMPRESSION_ZLIB = b'z'
+COMPRESSION_ZSTD = b's'
+COMPRESSION_LZ4 = b'l'
+
+CODECS = {
+    'pickle': CODEC_PICKLE,
+    'msgpack': CODEC_MSGPACK,
+}
+
+COMPRESSIONS = {
+    'none': COMPRESSION_NONE,
+    'zlib': COMPRESSION_ZLIB,
+    'zstd': COMPRESSION_ZSTD,
+    'lz4': COMPRESSION_LZ4,
+}
+
+DEFAULT_COMPRESSION_THRESHOLD = 1024  # bytes; smaller values aren't worth compressing
+
+
+class SerializationException(Exception):
+    pass
+
+
+def _compress(compression, data):
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if compression == COMPRESSION_LZ4:
+        return lz4.frame.compress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(data, 6)
+    return data
+
+
+def _decompress(compression, data):
+    if compression == COMPRESSION_NONE:
+        return data
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    if (compression == COMPRESSION_ZSTD) and (zstandard is not None):
+        return zstandard.ZstdDecompressor().decompress(data)
+    if (compression == COMPRESSION_LZ4) and (lz4 is not None):
+        return lz4.frame.decompress(data)
+    # either we don't know this one, or the library needed to decompress it isn't installed here
+    raise SerializationException("Can't decompress '{}' payload".format(compression))
+
+
+def _unsupported_type(obj):
+    # raising here makes us fall back to pickle for values msgpack can't round-trip exactly (tuples, dates, etc.)
+    raise TypeError("can't msgpack {}".format(type(obj)))
+
+
+class CacheSerializer:
+    """
+    Turns CachedValues into bytes and back again.
+    """
+
+    def __init__(self, codec='pickle', compression='zstd', compression_threshold=DEFAULT_COMPRESSION_THRESHOLD):
+        if (codec == 'msgpack') and (msgpack is None):
+            logger.warning("msgpack not installed; caching with pickle instead")
+            codec = 'pickle'
+        if (compression == 'zstd') and (zstandard is None):
+            compression = 'zlib'
+        if (compression == 'lz4') and (lz4 is None):
+            compression = 'zlib'
+        self.codec = CODECS[codec]
+        self.compression = COMPRESSIONS[compression]
+        self.compression_threshold = compression_threshold
+
+    def dumps(self, value):
+        codec = self.codec
+        data = None
+        if codec == CODEC_MSGPACK:
+            try:
+                data = msgpack.packb([value.payload, value.metadata], use_bin_type=True, strict_types=True,
+                                     default=_unsupported_type)
+            except (TypeError, ValueError, OverflowError):
+                codec = CODEC_PICKLE
+        if codec == CODEC_PICKLE:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        compression = COMPRESSION_NONE
+        if (self.compression != COMPRESSION_NONE) and (len(data) > self.compression_threshold):
+            compression = self.compression
+            data = _compress(compression, data)
+        return MAGIC + bytes([FORMAT_VERSION]) + codec + compression + data
+
+    def loads(self, data):
+        try:
+            value = self._loads(data)
+        except SerializationException:
+            raise
+        except Exception as e:  # pylint: disable=broad-except
+            # unpickling garbage can raise just about anything, and each compression library has its own errors
+            raise SerializationException("Can't read cached value: {!r}".format(e)) from e
+        if not isinstance(value, CachedValue):
+            raise SerializationException("Cached value is a {}, not a CachedValue".format(type(value).__name__))
+        return value
+
+    def _loads(self, data):
+        if not data.startswith(MAGIC):
+            return pickle.loads(data)  # written before we had our own format
+        version = data[2]
+        if version != FORMAT_VERSION:
+            raise SerializationException("Unknown cache format version {}".format(version))
+        codec = data[3:4]
+        compression = data[4:5]
+        data = _decompress(compression, data[5:])
+        if codec == CODEC_PICKLE:
+            return pickle.loads(data)
+        if codec == CODEC_MSGPACK:
+            if msgpack is None:
+                raise SerializationException("Can't read msgpack payload without msgpack installed")
+            payload, metadata = msgpack.unpackb(data, raw=False, strict_map_key=False)
+            return CachedValue(payload, metadata)
+        raise SerializationException("Unknown codec '{}'".format(codec))
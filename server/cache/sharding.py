@@ -0,0 +1,60 @@
+"""
+Consistent hashing, for spreading the cache over more than one Redis node. Each node gets lots of points on a hash
+ring, and a key lives on the node that owns the first point at or after the key's own hash. Adding or removing a node
+only moves the keys between it and its neighbours on the ring (about 1/N of them), instead of reshuffling everything.
+"""
+import bisect
+import hashlib
+from urllib.parse import urlsplit
+
+DEFAULT_POINTS_PER_NODE = 160
+
+
+def _hash(value):
+    return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+
+def shard_name(url):
+    """
+    :return: a name for the node at this Redis URL that doesn't include the password, so it is safe to show (and
+    doesn't move all its keys if the password changes)
+    """
+    parts = urlsplit(url)
+    return '{}{}'.format(parts.netloc.rpartition('@')[2], parts.path)
+
+
+class HashRing:
+
+    def __init__(self, nodes, points_per_node=DEFAULT_POINTS_PER_NODE):
+        if len(nodes) == 0:
+            raise ValueError("A hash ring needs at least one node")
+        self.nodes = list(nodes)
+        ring = sorted([(_hash('{}#{}'.format(node, i)), node) for node in self.nodes for i in range(points_per_node)])
+        self._points = [point for point, _node in ring]
+        self._owners = [node for _point, node in ring]
+
+    def node_for(self, key):
+        if len(self.nodes) == 1:
+            return self.nodes[0]
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def shares(self):
+        """
+        :return: the fraction of the hash space (and so, roughly, of the keys) each node owns
+        """
+        space = float(2 ** 64)
+        shares = {node: 0.0 for node in self.nodes}
+        for i, point in enumerate(self._points):
+            previous = self._points[i - 1] if i > 0 else self._points[-1] - 2 ** 64
+            shares[self._owners[i]] += (point - previous) / space
+        return shares
+
+    def group(self, keys):
+        """
+        :return: a dict of node -> the keys (in order) that live on it
+        """
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.node_for(key), []).append(key)
+        return groups
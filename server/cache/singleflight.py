@@ -0,0 +1,68 @@
+"""
+In-process request coalescing ("single-flight"). When a bunch of greenlets in the same worker make the same call at
+the same time (ie. all the widgets on a topic dashboard loading at once), only the first one actually runs it; the
+others wait for it to finish and get a copy of its result (or its exception). This works for calls that aren't cached
+in Redis too.
+
+Waiting doesn't go past the waiter's own deadline (see `server.util.deadline`). An error that was about the first
+caller rather than the call (ie. its request ran out of time, which is `cacheable = False`) isn't passed on; the
+others run the call themselves instead.
+"""
+import copy
+import threading
+
+from server.util import deadline
+from server.util.deadline import DeadlineExceeded
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> the _Call in progress
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Call fn, unless a call with the same key is already running, in which case wait for that one.
+        :return: a tuple of the result, and whether it came from someone else's call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+        if not leader:
+            if not call.done.wait(deadline.cap(None)):
+                raise DeadlineExceeded()
+            if call.error is not None:
+                if not getattr(call.error, 'cacheable', True):
+                    return fn(*args, **kwargs), False
+                raise call.error
+            # callers often add things to the results they get, so everyone gets their own copy
+            return copy.deepcopy(call.result), True
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return (copy.deepcopy(call.result) if call.waiters > 0 else call.result), False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
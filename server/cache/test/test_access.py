@@ -0,0 +1,75 @@
+import unittest
+
+from server.cache import McCacheRegion, _keyword_safe_key_generator
+from server.cache.access import ADMIN_ACCESS, PUBLIC_ACCESS, topic_readers_access
+
+PUBLIC_TOPIC = 1
+PRIVATE_TOPIC = 2
+
+# which users can read each topic; 'admin-key' can read everything
+READERS = {
+    PUBLIC_TOPIC: None,
+    PRIVATE_TOPIC: ['reader-1', 'reader-2'],
+}
+
+
+def _topic_access_class(user_mc_key, topics_id, *_args, **_kwargs):
+    if user_mc_key == 'admin-key':
+        return ADMIN_ACCESS
+    if READERS[topics_id] is None:
+        return PUBLIC_ACCESS
+    if user_mc_key in READERS[topics_id]:
+        return topic_readers_access(topics_id)
+    return user_mc_key
+
+
+class AccessClassTest(unittest.TestCase):
+
+    def setUp(self):
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'dogpile.cache.memory')
+        self._calls = []
+
+        @self._region.cache_on_arguments(shared_by=_topic_access_class)
+        def _story_count(user_mc_key, topics_id, q=None):
+            self._calls.append(user_mc_key)
+            allowed = (user_mc_key == 'admin-key') or (READERS[topics_id] is None) or \
+                (user_mc_key in READERS[topics_id])
+            return {'q': q, 'count': 10 if allowed else 0, 'fetched_by': user_mc_key}
+        self._story_count = _story_count
+
+    def testSharedWithinClass(self):
+        assert self._story_count('reader-1', PRIVATE_TOPIC, q='foo')['count'] == 10
+        assert self._story_count('reader-2', PRIVATE_TOPIC, q='foo')['fetched_by'] == 'reader-1'
+        assert self._calls == ['reader-1']
+        for user_mc_key in ['reader-1', 'reader-2', 'someone-else']:
+            self._story_count(user_mc_key, PUBLIC_TOPIC, q='foo')
+        assert self._calls == ['reader-1', 'reader-1']
+
+    def testNeverSharedOutsideClass(self):
+        self._story_count('reader-1', PRIVATE_TOPIC, q='foo')
+        self._story_count('admin-key', PRIVATE_TOPIC, q='foo')
+        # an outsider gets their own (empty) results, fetched with their own key
+        result = self._story_count('someone-else', PRIVATE_TOPIC, q='foo')
+        assert (result['count'] == 0) and (result['fetched_by'] == 'someone-else')
+        assert self._calls == ['reader-1', 'admin-key', 'someone-else']
+        assert self._story_count('another-one', PRIVATE_TOPIC, q='foo')['fetched_by'] == 'another-one'
+        # and their results aren't shared with the readers either
+        assert self._story_count('reader-2', PRIVATE_TOPIC, q='foo')['fetched_by'] == 'reader-1'
+
+    def testKeys(self):
+        keys = set([self._story_count.cache_key(user_mc_key, PRIVATE_TOPIC, q='foo')
+                    for user_mc_key in ['reader-1', 'reader-2', 'admin-key', 'someone-else']])
+        assert len(keys) == 3
+        assert self._story_count.cache_key('reader-1', PRIVATE_TOPIC, q='foo') != \
+            self._story_count.cache_key('reader-1', PRIVATE_TOPIC, q='bar')
+
+    def testBatches(self):
+        self._story_count('reader-1', PRIVATE_TOPIC, 'foo')
+        results = self._region.get_or_create_many(self._story_count, [('reader-2', PRIVATE_TOPIC, 'foo'),
+                                                                      ('someone-else', PRIVATE_TOPIC, 'foo')])
+        assert [r['fetched_by'] for r in results] == ['reader-1', 'someone-else']
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from server import config
+from server.cache import McCacheRegion, _keyword_safe_key_generator
+from server.cache.backends import CHUNK_MANIFEST_PREFIX, CHUNK_KEY_PREFIX
+
+CHUNK_SIZE = 1024
+
+
+class ChunkedValueTest(unittest.TestCase):
+
+    def setUp(self):
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'mc.redis', arguments={'url': config.get('CACHE_REDIS_URL'), 'redis_expiration_time': 60,
+                                   'chunk_size': CHUNK_SIZE})
+        self._client = self._region.actual_backend.client
+        self._calls = 0
+
+        @self._region.cache_on_arguments()
+        def _media_with_tag(tags_id):
+            self._calls += 1
+            return [{'media_id': i, 'name': 'source {} in {}'.format(i, tags_id)} for i in range(500)]
+        self._media_with_tag = _media_with_tag
+
+        @self._region.cache_on_arguments()
+        def _media_map(timespan_maps_id):
+            self._calls += 1
+            return ''.join(['<node id="{}-{}"/>'.format(timespan_maps_id, i) for i in range(1000)]).encode('utf-8')
+        self._media_map = _media_map
+        self._media_with_tag.invalidate(1)
+        self._media_map.invalidate(1)
+
+    def testBigValue(self):
+        media = self._media_with_tag(1)
+        stored = self._client.get(self._media_with_tag.cache_key(1))
+        assert stored.startswith(CHUNK_MANIFEST_PREFIX)
+        assert self._media_with_tag(1) == media
+        assert self._calls == 1
+
+    def testMissingChunk(self):
+        self._media_with_tag(1)
+        self._client.delete(*list(self._client.scan_iter(match=CHUNK_KEY_PREFIX + '*')))
+        self._media_with_tag(1)   # treated as a miss
+        assert self._calls == 2
+
+    def testStream(self):
+        expected = self._media_map(1)
+        chunks = list(self._region.stream(self._media_map, 1))
+        assert len(chunks) > 1
+        assert max([len(c) for c in chunks]) == CHUNK_SIZE
+        assert b''.join(chunks) == expected
+        assert self._media_map(1) == expected
+        assert self._calls == 1
+
+    def testStreamMiss(self):
+        chunks = list(self._region.stream(self._media_map, 1))
+        assert len(chunks) == 1
+        assert self._calls == 1
+        assert len(list(self._region.stream(self._media_map, 1))) > 1
+        assert self._calls == 1
+
+    def testDelete(self):
+        existing_chunk_keys = set(self._client.scan_iter(match=CHUNK_KEY_PREFIX + '*'))
+        self._media_map(1)
+        chunk_keys = set(self._client.scan_iter(match=CHUNK_KEY_PREFIX + '*')) - existing_chunk_keys
+        assert len(chunk_keys) > 1
+        self._media_map.invalidate(1)
+        assert self._client.get(self._media_map.cache_key(1)) is None
+        assert all(0 < self._client.ttl(key) <= 60 for key in chunk_keys)   # gone soon
+
+
+if __name__ == "__main__":
+    unittest.main()
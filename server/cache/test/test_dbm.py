@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from dogpile.cache.api import NO_VALUE
+
+from server.cache import McCacheRegion, _keyword_safe_key_generator
+from server.cache.dependencies import collection_dependency
+from server.cache.filelock import FileKeyLockFactory
+
+
+def _try_lock(path, key, results):
+    results.put(FileKeyLockFactory(path)(key).acquire(False))
+
+
+class DbmBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'mc.dbm', arguments={'filename': os.path.join(self._dir, 'cache'), 'redis_expiration_time': 60,
+                                 'distributed_lock': True})
+        self._calls = 0
+
+        @self._region.cache_on_arguments(depends_on=lambda result, tags_id: [collection_dependency(tags_id)])
+        def _collection(tags_id):
+            self._calls += 1
+            return {'tags_id': tags_id}
+        self._collection = _collection
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def testReadsAndWrites(self):
+        assert self._collection(1) == {'tags_id': 1}
+        assert self._collection(1) == {'tags_id': 1}
+        assert self._calls == 1
+        assert self._region.get_or_create_many(self._collection, [(i,) for i in range(5)]) == \
+            [{'tags_id': i} for i in range(5)]
+        assert self._calls == 5
+        assert self._region.actual_backend.namespace_usage(self._collection.cache_key(1).split('|')[0])[0] == 5
+
+    def testExpiry(self):
+        backend = self._region.actual_backend
+        self._collection(1)
+        key = self._collection.cache_key(1)
+        value = backend.get(key)
+        value.metadata['ttl'] = 1
+        backend.set(key, value)
+        assert backend.get(key) is not NO_VALUE
+        time.sleep(1.1)
+        assert backend.get(key) is NO_VALUE
+        backend.purge_expired()
+        assert backend.namespace_usage(key.split('|')[0]) == (0, 0)
+
+    def testInvalidation(self):
+        self._collection(1)
+        self._collection(2)
+        self._region.invalidate_dependencies(collection_dependency(1))
+        self._collection(1)
+        self._collection(2)
+        assert self._calls == 3
+
+    def testLocks(self):
+        locks = FileKeyLockFactory(os.path.join(self._dir, 'test.lock'))
+        lock = locks('a')
+        assert lock.acquire()
+        assert not locks('a').acquire(False)
+        assert locks('b').acquire(False)
+        results = multiprocessing.Queue()
+        other_process = multiprocessing.Process(target=_try_lock, args=(os.path.join(self._dir, 'test.lock'), 'a',
+                                                                         results))
+        other_process.start()
+        other_process.join()
+        assert results.get() is False
+        lock.release()
+        assert locks('a').acquire(False)
+
+
+if __name__ == "__main__":
+    unittest.main()
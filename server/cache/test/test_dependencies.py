@@ -0,0 +1,46 @@
+import unittest
+
+from server import config
+from server.cache import McCacheRegion, _keyword_safe_key_generator
+from server.cache.dependencies import collection_dependency, media_dependency
+
+
+def _media_list_dependencies(media_list, tags_id):
+    return [collection_dependency(tags_id)] + [media_dependency(m['media_id']) for m in media_list]
+
+
+class DependencyInvalidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'mc.redis', arguments={'url': config.get('CACHE_REDIS_URL')})
+        self._calls = 0
+
+        @self._region.cache_on_arguments(depends_on=_media_list_dependencies)
+        def _media_with_tag(tags_id):
+            self._calls += 1
+            return [{'media_id': tags_id * 10 + i} for i in range(3)]
+        self._media_with_tag = _media_with_tag
+        self._region.invalidate_dependencies(collection_dependency(1), collection_dependency(2))
+        self._media_with_tag.invalidate(1)
+        self._media_with_tag.invalidate(2)
+
+    def testInvalidatesTaggedValues(self):
+        self._media_with_tag(1)
+        self._media_with_tag(2)
+        self._region.invalidate_dependencies(collection_dependency(1))
+        self._media_with_tag(1)
+        self._media_with_tag(2)
+        assert self._calls == 3   # only collection 1 was fetched again
+
+    def testSharedDependency(self):
+        self._media_with_tag(1)
+        self._media_with_tag(2)
+        self._region.invalidate_dependencies(media_dependency(21))
+        self._media_with_tag(1)
+        self._media_with_tag(2)
+        assert self._calls == 3
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+from server.cache import _keyword_safe_key_generator
+from server.cache.keys import canonical_value, canonical_argument, MAX_READABLE_KEY_LENGTH
+
+
+def _topic_story_count(_user_mc_key, _topics_id, **kwargs):
+    return kwargs
+
+
+def _story_count(q, fq, rows=10):
+    return q, fq, rows
+
+
+class CanonicalValueTest(unittest.TestCase):
+
+    def testNumbers(self):
+        assert canonical_value('123') == canonical_value(123)
+
+    def testUnsetArguments(self):
+        assert canonical_argument('snapshots_id', None) == canonical_argument('snapshots_id', 'undefined')
+        assert canonical_argument('foci_id', None) == canonical_argument('foci_id', 'null')
+        assert canonical_argument('fq', None) == canonical_argument('fq', 'undefined')
+        # a search for the word "null" isn't an empty one
+        assert canonical_argument('q', None) != canonical_argument('q', 'null')
+        assert canonical_value(None) != canonical_value('undefined')
+
+    def testIdLists(self):
+        assert canonical_value([1, 2, 3]) == canonical_value('1,2,3')
+        assert canonical_value([1, 2, 3]) == canonical_value('1, 2, 3')
+        assert canonical_value([1, 2, 3]) != canonical_value([3, 2, 1])  # order can matter (ie. lists of words)
+
+    def testOtherLists(self):
+        assert canonical_value(['a,b', 'c']) != canonical_value(['a', 'b,c'])
+        assert canonical_value(['a', 'b']) != canonical_value('a,b')
+        assert canonical_value(['a', None]) == canonical_value(('a', None))
+        assert canonical_value({'b', 'a'}) == canonical_value({'a', 'b'})
+        assert canonical_value({'a,b', 'c'}) != canonical_value({'a', 'b,c'})
+        assert canonical_value({2, '10'}) == canonical_value('2,10')
+
+    def testDicts(self):
+        assert canonical_value({'a': 1, 'b': 2}) == canonical_value({'b': 2, 'a': '1'})
+        assert canonical_value({'a': '1 b=2'}) != canonical_value({'a': 1, 'b': 2})
+
+
+class KeyGeneratorTest(unittest.TestCase):
+
+    def testKeywordOrderIgnored(self):
+        generate_key = _keyword_safe_key_generator(None, _topic_story_count)
+        key1 = generate_key('key', 1, snapshots_id=1, q='x')
+        key2 = generate_key('key', '1', q='x', snapshots_id='1')
+        assert key1 == key2
+
+    def testPositionalOrKeyword(self):
+        generate_key = _keyword_safe_key_generator(None, _story_count)
+        assert generate_key('q', 'fq') == generate_key('q', fq='fq')
+        assert generate_key('q', 'fq') == generate_key('q', 'fq', rows=10)  # defaults are filled in
+        assert generate_key('q', 'fq') != generate_key('q', 'fq', rows=20)
+
+    def testNamespacePrefix(self):
+        generate_key = _keyword_safe_key_generator(None, _story_count)
+        assert generate_key('q', 'fq').startswith(__name__ + ':_story_count|')
+
+    def testLongKeysHashed(self):
+        generate_key = _keyword_safe_key_generator(None, _story_count)
+        long_query = " OR ".join(["media_id:{}".format(i) for i in range(1000)])
+        key = generate_key(long_query, None)
+        assert len(key) < MAX_READABLE_KEY_LENGTH
+        assert key.startswith(__name__ + ':_story_count|#')
+        assert key == generate_key(q=long_query, fq='undefined')
+        assert generate_key('null', None) != generate_key(None, None)
+        assert key != generate_key(long_query + " OR media_id:1001", None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import threading
+import unittest
+
+from flask import Flask
+
+from server.cache.loader import BatchLoader, request_loader, chunked
+
+
+class BatchLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self._batches = []
+
+        def load_many(keys):
+            self._batches.append(list(keys))
+            return [{'stories_id': key} for key in keys]
+        self._load_many = load_many
+
+    def testOrderAndMemo(self):
+        loader = BatchLoader(self._load_many)
+        assert [s['stories_id'] for s in loader.load_many([3, 1, 2, 1])] == [3, 1, 2, 1]
+        assert loader.load(2) == {'stories_id': 2}
+        assert self._batches == [[3, 1, 2]]
+
+    def testCopies(self):
+        loader = BatchLoader(self._load_many)
+        loader.load(1)['title'] = 'changed by a caller'
+        assert loader.load(1) == {'stories_id': 1}
+
+    def testBatchesConcurrentCalls(self):
+        loader = BatchLoader(self._load_many, window=0.05)
+        results = {}
+
+        def load(key):
+            results[key] = loader.load(key)
+        threads = [threading.Thread(target=load, args=(key,)) for key in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(self._batches) == 1
+        assert sorted(self._batches[0]) == [0, 1, 2, 3, 4]
+        assert all(results[key] == {'stories_id': key} for key in range(5))
+
+    def testErrors(self):
+        def fail(keys):
+            raise ValueError("back-end is down")
+        loader = BatchLoader(fail)
+        self.assertRaises(ValueError, loader.load, 1)
+        loader = BatchLoader(self._load_many)   # and nothing was remembered, so a retry works
+        assert loader.load(1) == {'stories_id': 1}
+
+    def testPerRequest(self):
+        app = Flask(__name__)
+        with app.test_request_context():
+            loader = request_loader('stories', self._load_many)
+            loader.load(1)
+            assert request_loader('stories', self._load_many) is loader
+        with app.test_request_context():
+            assert request_loader('stories', self._load_many) is not loader
+        assert request_loader('stories', self._load_many) is not request_loader('stories', self._load_many)
+
+    def testChunked(self):
+        assert chunked([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import time
+
+from dogpile.cache import make_region
+
+from server.cache.keys import namespace_from_key
+from server.cache.local import LocalMemoryCache, LocalMemoryProxy
+
+
+class LocalMemoryCacheTest(unittest.TestCase):
+
+    def testGetAndSet(self):
+        local = LocalMemoryCache(1000)
+        assert local.get('a') is None
+        local.set('a', b'12345', 60)
+        assert local.get('a') == b'12345'
+        assert local.size == 5
+
+    def testExpires(self):
+        local = LocalMemoryCache(1000)
+        local.set('a', b'12345', -1)
+        assert local.get('a') is None
+        assert local.size == 0
+
+    def testEvictsLeastRecentlyUsed(self):
+        local = LocalMemoryCache(10)
+        local.set('a', b'12345', 60)
+        local.set('b', b'12345', 60)
+        local.get('a')  # so b is now the oldest
+        local.set('c', b'12345', 60)
+        assert local.get('b') is None
+        assert local.get('a') == b'12345'
+        assert local.get('c') == b'12345'
+        assert local.size == 10
+        assert local.evictions == 1
+
+    def testSkipsValuesBiggerThanCache(self):
+        local = LocalMemoryCache(4)
+        local.set('a', b'12345', 60)
+        assert local.get('a') is None
+
+
+class LocalMemoryProxyTest(unittest.TestCase):
+
+    def setUp(self):
+        self._proxy = LocalMemoryProxy(1000)
+        self._region = make_region().configure('dogpile.cache.memory', wrap=[self._proxy])
+        self._proxy.enable('my.module:my_function', 60)
+
+    def testNamespaceFromKey(self):
+        assert namespace_from_key('my.module:my_function|1 2') == 'my.module:my_function'
+
+    def testEnabledNamespaceHitsLocally(self):
+        key = 'my.module:my_function|1'
+        self._region.get_or_create(key, lambda: {'tags_id': 1})
+        self._proxy.proxied.delete(key)  # so only the local copy is left
+        assert self._region.get(key) == {'tags_id': 1}
+        counts = self._proxy.stats()['namespaces']['my.module:my_function']
+        assert counts['local']['hits'] == 1
+        assert counts['backend']['hits'] == 0
+
+    def testOtherNamespacesSkipLocal(self):
+        key = 'my.module:other_function|1'
+        self._region.get_or_create(key, lambda: {'tags_id': 1})
+        assert len(self._proxy.local) == 0
+
+    def testCallersGetTheirOwnCopy(self):
+        key = 'my.module:my_function|2'
+        self._region.get_or_create(key, lambda: [1, 2, 3])
+        first = self._region.get(key)
+        first.remove(1)
+        assert self._region.get(key) == [1, 2, 3]
+
+    def testDeleteClearsLocal(self):
+        key = 'my.module:my_function|3'
+        self._region.get_or_create(key, lambda: 'value')
+        self._region.delete(key)
+        assert self._proxy.local.get(key) is None
+
+    def testLocalTtl(self):
+        self._proxy.enable('my.module:short_function', 0.01)
+        key = 'my.module:short_function|1'
+        self._region.get_or_create(key, lambda: 'value')
+        time.sleep(0.02)
+        assert self._proxy.local.get(key) is None
+
+
+if __name__ == "__main__":
+    unittest.main()
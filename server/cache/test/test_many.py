@@ -0,0 +1,54 @@
+import unittest
+
+from server.cache import McCacheRegion, _keyword_safe_key_generator
+
+
+class GetOrCreateManyTest(unittest.TestCase):
+
+    def setUp(self):
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'dogpile.cache.memory')
+        self._fetched = []
+
+        @self._region.cache_on_arguments()
+        def _media(mc_api_key, media_id):
+            self._fetched.append(media_id)
+            return {'media_id': media_id, 'key': mc_api_key}
+        self._media = _media
+
+    def testOnlyFetchesMisses(self):
+        self._media(None, 1)
+        results = self._region.get_or_create_many(self._media, [(None, 1), (None, 2), (None, 3)])
+        assert [r['media_id'] for r in results] == [1, 2, 3]
+        assert self._fetched == [1, 2, 3]
+
+    def testSharesSingleCallEntries(self):
+        self._region.get_or_create_many(self._media, [(None, 1), (None, 2)])
+        self._media(None, 2)
+        self._media(media_id=1, mc_api_key=None)
+        assert self._fetched == [1, 2]
+
+    def testDuplicateIds(self):
+        results = self._region.get_or_create_many(self._media, [(None, 1), (None, '1'), (None, 2)])
+        assert len(results) == 3
+        assert self._fetched == [1, 2]
+
+    def testCreateMany(self):
+        self._media(None, 1)
+        created = []
+
+        def media_by_ids(args_list):
+            created.append([media_id for _key, media_id in args_list])
+            return [{'media_id': media_id, 'key': None} if media_id != 4 else None for _key, media_id in args_list]
+        results = self._region.get_or_create_many(self._media, [(None, 1), (None, 2), (None, 3), (None, 4)],
+                                                  create_many=media_by_ids)
+        assert [r['media_id'] if r else None for r in results] == [1, 2, 3, None]
+        assert created == [[2, 3, 4]]
+        # each one it made is cached on its own, but not the one it couldn't find
+        self._media(None, 3)
+        self._media(None, 4)
+        assert self._fetched == [1, 4]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from flask import Flask
+
+from server.cache.memo import request_memoized, request_memo_hits
+
+
+class RequestMemoTest(unittest.TestCase):
+
+    def setUp(self):
+        self._app = Flask(__name__)
+        self._calls = 0
+
+        @request_memoized
+        def _timespan_list(topics_id, snapshots_id=None, foci_id=None):
+            self._calls += 1
+            return [{'topics_id': topics_id, 'snapshots_id': snapshots_id, 'foci_id': foci_id}]
+        self._timespan_list = _timespan_list
+
+    def testOncePerRequest(self):
+        with self._app.test_request_context():
+            self._timespan_list(1, snapshots_id=2)
+            self._timespan_list(1, 2)
+            self._timespan_list('1', snapshots_id=2, foci_id=None)
+            self._timespan_list(1, 2, foci_id=3)
+            assert self._calls == 2
+            assert sum(request_memo_hits().values()) == 2
+        with self._app.test_request_context():
+            self._timespan_list(1, 2)
+            assert self._calls == 3
+            assert sum(request_memo_hits().values()) == 0
+
+    def testResultsAreCopies(self):
+        with self._app.test_request_context():
+            timespans = self._timespan_list(1)
+            timespans[0]['focal_set'] = 'added by a caller'
+            assert 'focal_set' not in self._timespan_list(1)[0]
+
+    def testOutsideOfRequest(self):
+        self._timespan_list(1)
+        self._timespan_list(1)
+        assert self._calls == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import threading
+import time
+import unittest
+
+from server.cache import McCacheRegion, _keyword_safe_key_generator, metrics
+from server.cache.metrics import CacheMetrics, TimedMutex
+
+NAMESPACE = 'server.cache.test.test_metrics:_story_list'
+
+
+class CacheMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'dogpile.cache.memory')
+
+    def testHitsAndMisses(self):
+        @self._region.cache_on_arguments()
+        def _story_list(q):
+            return [q]
+        _story_list('a')
+        _story_list('a')
+        _story_list('a')
+        _story_list('b')
+        stats = metrics.stats()[NAMESPACE]
+        assert stats['hits'] == 2
+        assert stats['misses'] == 2
+        assert stats['hit_rate'] == 0.5
+        assert stats['fill_seconds']['count'] == 2
+
+    def testNestedCalls(self):
+        @self._region.cache_on_arguments()
+        def _story_count(q):
+            return len(q)
+
+        @self._region.cache_on_arguments()
+        def _story_list(q):
+            return [q] * _story_count(q)
+        _story_count('abc')
+        _story_list('abc')   # a miss, even though the call inside it was a hit
+        stats = metrics.stats()
+        assert stats[NAMESPACE]['misses'] == 1
+        assert stats['server.cache.test.test_metrics:_story_count']['hits'] == 1
+
+    def testCoalescedCalls(self):
+        @self._region.cache_on_arguments()
+        def _story_list(q):
+            time.sleep(0.05)
+            return [q]
+        threads = [threading.Thread(target=_story_list, args=('a',)) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = metrics.stats()[NAMESPACE]
+        assert stats['misses'] == 1
+        assert stats['coalesced'] == 2
+
+    def testTextFormat(self):
+        collector = CacheMetrics()
+        collector.record_call('server.views.apicache:_cached_tag', False)
+        collector.record_size('server.views.apicache:_cached_tag', 120)
+        text = collector.as_text()
+        assert '# TYPE webtools_cache_hits_total counter' in text
+        assert 'webtools_cache_hits_total{namespace="server.views.apicache:_cached_tag"} 1' in text
+        assert 'webtools_cache_value_bytes_sum{namespace="server.views.apicache:_cached_tag"} 120' in text
+
+    def testLockWait(self):
+        waits = []
+        mutex = TimedMutex(threading.Lock(), waits.append)
+        assert mutex.acquire()
+        assert mutex.acquire(False) is False   # non-blocking tries aren't waits
+        mutex.release()
+        assert len(waits) == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
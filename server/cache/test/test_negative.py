@@ -0,0 +1,115 @@
+import unittest
+
+from mediacloud.error import MCException
+
+from server.cache import McCacheRegion, _keyword_safe_key_generator
+from server.cache.negative import is_negative
+from server.util import deadline
+from server.util.deadline import DeadlineExceeded
+from server.util.limiter import BackendBusy
+from server.util.resilience import ServiceUnavailable
+
+
+class NegativeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'dogpile.cache.memory')
+        self._calls = 0
+
+    def testErrorsAreCached(self):
+        @self._region.cache_on_arguments(negative_ttl=30)
+        def _story_count(q):
+            self._calls += 1
+            raise MCException("Invalid query: {}".format(q), 400)
+        for _ in range(3):
+            with self.assertRaises(MCException) as cm:
+                _story_count('(bad')
+            assert cm.exception.message == "Invalid query: (bad"
+            assert cm.exception.status_code == 400
+        assert self._calls == 1
+
+    def testUserErrorsNotCached(self):
+        # ie. one user's bad key, which shouldn't lock everyone else sharing the key out
+        @self._region.cache_on_arguments(negative_ttl=30)
+        def _story_count(_q):
+            self._calls += 1
+            raise MCException("Invalid API key", 403)
+        for _ in range(2):
+            self.assertRaises(MCException, _story_count, 'q')
+        assert self._calls == 2
+
+    def testErrorsNotCachedByDefault(self):
+        @self._region.cache_on_arguments()
+        def _story_count(q):
+            self._calls += 1
+            raise MCException("Invalid query: {}".format(q), 400)
+        for _ in range(2):
+            self.assertRaises(MCException, _story_count, '(bad')
+        assert self._calls == 2
+
+    def testDeadlineNotCached(self):
+        @self._region.cache_on_arguments(negative_ttl=30)
+        def _story_count(_q):
+            self._calls += 1
+            deadline.check()
+            return {'count': 1}
+        with deadline.within(0):
+            self.assertRaises(DeadlineExceeded, _story_count, 'q')
+        assert _story_count('q') == {'count': 1}
+        assert self._calls == 2
+
+    def testBackendBusyNotCached(self):
+        busy = [True]
+
+        @self._region.cache_on_arguments(negative_ttl=30)
+        def _story_count(_q):
+            self._calls += 1
+            if busy[0]:
+                raise BackendBusy("Too busy")
+            return {'count': 1}
+        self.assertRaises(BackendBusy, _story_count, 'q')
+        busy[0] = False
+        assert _story_count('q') == {'count': 1}
+        assert self._calls == 2
+
+    def testServiceUnavailableNotCached(self):
+        down = [True]
+
+        @self._region.cache_on_arguments(negative_ttl=30)
+        def _story_count(_q):
+            self._calls += 1
+            if down[0]:
+                raise ServiceUnavailable("media_cloud isn't responding right now")
+            return {'count': 1}
+        self.assertRaises(ServiceUnavailable, _story_count, 'q')
+        down[0] = False
+        assert _story_count('q') == {'count': 1}
+        assert self._calls == 2
+
+    def testNegativeOnly(self):
+        @self._region.cache_on_arguments(negative_ttl=30, should_cache_fn=is_negative)
+        def _focal_sets(topics_id):
+            self._calls += 1
+            return [{'focal_sets_id': 1}] if topics_id == 1 else []
+        _focal_sets(1)
+        _focal_sets(1)
+        assert self._calls == 2   # good results aren't cached
+        _focal_sets(2)
+        _focal_sets(2)
+        assert self._calls == 3   # empty ones are
+
+    def testBatchLookupRaisesCachedErrors(self):
+        @self._region.cache_on_arguments(negative_ttl=30)
+        def _media(media_id):
+            self._calls += 1
+            if media_id == 2:
+                raise MCException("Not found", 404)
+            return {'media_id': media_id}
+        self.assertRaises(MCException, _media, 2)
+        self.assertRaises(MCException, self._region.get_or_create_many, _media, [(1,), (2,)])
+        assert self._calls == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from dogpile.cache.api import CachedValue
+
+from server.cache import McCacheRegion, _keyword_safe_key_generator
+from server.cache.backends import McRedisBackend
+from server.cache.policy import TtlPolicy, IMMUTABLE, IMMUTABLE_EXPIRATION_TIME, immutable_when, \
+    parse_ttl_overrides
+from server.util.config import EnvOrFileBasedConfig
+
+
+def _is_final_page(results, _tag_sets_id, rows):
+    return len(results) == rows
+
+
+class TtlPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'dogpile.cache.memory')
+
+    def _stored_ttl(self):
+        return [v.metadata.get('ttl') for v in self._region.backend._cache.values()]
+
+    def testFixedTtl(self):
+        @self._region.cache_on_arguments(ttl=60)
+        def _tag_page(tag_sets_id, rows):
+            return list(range(tag_sets_id, rows))
+        _tag_page(1, 10)
+        assert self._stored_ttl() == [60]
+
+    def testDynamicTtl(self):
+        @self._region.cache_on_arguments(ttl=immutable_when(_is_final_page, 60))
+        def _tag_page(tag_sets_id, _rows):
+            return list(range(tag_sets_id))
+        _tag_page(10, 10)
+        _tag_page(3, 10)
+        assert sorted(self._stored_ttl(), key=str) == [60, IMMUTABLE]
+
+    def testNoPolicy(self):
+        @self._region.cache_on_arguments()
+        def _tag_page(tag_sets_id, rows):
+            return list(range(tag_sets_id, rows))
+        _tag_page(1, 10)
+        assert self._stored_ttl() == [None]
+
+    def testOverrides(self):
+        overrides = parse_ttl_overrides('server.util.tags:_cached_tag_page:immutable, server.views.apicache:x:30')
+        assert overrides == {'server.util.tags:_cached_tag_page': IMMUTABLE, 'server.views.apicache:x': 30}
+        policy = TtlPolicy(overrides)
+        policy.register('server.views.apicache:x', 60)
+        assert policy.ttl_for('server.views.apicache:x', None, [], {}) == 30
+        self.assertRaises(ValueError, parse_ttl_overrides, '3600')
+
+    def testOverridesFromConfigFile(self):
+        config_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, config_dir)
+        path = os.path.join(config_dir, 'app.config')
+        with open(path, 'w') as f:
+            f.write("CACHE_TTL_OVERRIDES = server.views.sources.apicache:_cached_timeperiod_story_count:3600\n")
+        text = EnvOrFileBasedConfig(path).get('CACHE_TTL_OVERRIDES')
+        assert parse_ttl_overrides(text) == {'server.views.sources.apicache:_cached_timeperiod_story_count': 3600}
+
+    def testRedisExpiration(self):
+        backend = McRedisBackend({'url': 'redis://localhost:6379/0', 'redis_expiration_time': 100})
+        assert backend._expiration_time(CachedValue(1, {'ct': time.time(), 'v': 1})) == 100
+        assert backend._expiration_time(CachedValue(1, {'ct': time.time(), 'v': 1, 'ttl': 10})) == 10
+        assert backend._expiration_time(CachedValue(1, {'ct': time.time(), 'v': 1, 'ttl': IMMUTABLE})) == \
+            IMMUTABLE_EXPIRATION_TIME
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from server import config
+from server.cache import McCacheRegion, _keyword_safe_key_generator
+from server.cache.prewarm import manifest_entries, plan, PrewarmEntry, MANIFEST
+
+
+class PrewarmManifestTest(unittest.TestCase):
+
+    def testAllEntries(self):
+        assert manifest_entries() == MANIFEST
+
+    def testSomeEntries(self):
+        entries = manifest_entries(['stats', 'featured_collections'])
+        assert [e.name for e in entries] == ['featured_collections', 'stats']
+
+    def testUnknownEntry(self):
+        self.assertRaises(ValueError, manifest_entries, ['stats', 'not_a_thing'])
+
+
+class NamespaceUsageTest(unittest.TestCase):
+
+    def setUp(self):
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'mc.redis', arguments={'url': config.get('CACHE_REDIS_URL')})
+
+        @self._region.cache_on_arguments()
+        def _story_list(q):
+            return [q]
+        self._story_list = _story_list
+        self._story_list.invalidate('a')
+        self._story_list.invalidate('b')
+
+    def testPlan(self):
+        fetched = []
+
+        def _story_pages(q):
+            fetched.append(q)
+        entries = [PrewarmEntry('stories', ['server.cache.test.test_prewarm:_story_list'],
+                                lambda: [('stories about {}'.format(q), self._story_list, (q,)) for q in 'ab']),
+                   PrewarmEntry('pages', [], lambda: [('story pages', _story_pages, ('a',))])]
+        calls = plan(entries)
+        assert [(c['name'], c['label'], c['function']) for c in calls] == [
+            ('stories', 'stories about a', '_story_list'), ('stories', 'stories about b', '_story_list'),
+            ('pages', 'story pages', '_story_pages')]
+        assert calls[0]['key'] == self._story_list.cache_key('a')
+        assert calls[0]['key'] != calls[1]['key']
+        assert calls[2]['key'] is None
+        assert len(fetched) == 0
+        assert self._region.actual_backend.namespace_usage('server.cache.test.test_prewarm:_story_list') == (0, 0)
+
+    def testUsage(self):
+        namespace = 'server.cache.test.test_prewarm:_story_list'
+        assert self._region.actual_backend.namespace_usage(namespace) == (0, 0)
+        self._story_list('a')
+        self._story_list('b')
+        count, size = self._region.actual_backend.namespace_usage(namespace)
+        assert count == 2
+        assert size > 0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import time
+import unittest
+
+from dogpile.cache.region import CacheRegion
+
+from server.cache.refresh import background_refresh
+
+
+class BackgroundRefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        self._region = CacheRegion(async_creation_runner=background_refresh).configure('dogpile.cache.memory')
+        self._calls = 0
+
+    def _creator(self):
+        self._calls += 1
+        return self._calls
+
+    def testStaleValueReturnedThenRefreshed(self):
+        self._region.get_or_create('key', self._creator, expiration_time=0.01)
+        time.sleep(0.02)
+        assert self._region.get_or_create('key', self._creator, expiration_time=0.01) == 1  # the stale one
+        assert self._region.get('key', ignore_expiration=True) == 2  # refreshed
+
+    def testFailedRefreshKeepsStaleValue(self):
+        self._region.get_or_create('key', self._creator, expiration_time=0.01)
+        time.sleep(0.02)
+
+        def broken_creator():
+            raise RuntimeError("back-end is down")
+        assert self._region.get_or_create('key', broken_creator, expiration_time=0.01) == 1
+        assert self._region.get('key', ignore_expiration=True) == 1
+        # and the lock was released, so the next try can refresh it
+        assert self._region.get_or_create('key', self._creator, expiration_time=0.01) == 1
+        assert self._region.get('key', ignore_expiration=True) == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import pickle
+import time
+import unittest
+
+from dogpile.cache.api import CachedValue
+
+from server.cache.serializers import CacheSerializer, SerializationException
+
+STORY = {
+    'stories_id': 1234, 'media_id': 1, 'title': 'A story about caching', 'language': 'en',
+    'story_tags': [{'tags_id': 9360669, 'tag': 'nyt_labeller_v1.0.0', 'tag_sets_id': 1964}],
+}
+STORY_LIST = [dict(STORY, stories_id=i) for i in range(100)]
+
+
+def _cached_value(payload):
+    return CachedValue(payload, {'ct': time.time(), 'v': 1})
+
+
+class CacheSerializerTest(unittest.TestCase):
+
+    def testRoundTrip(self):
+        serializer = CacheSerializer()
+        value = _cached_value(STORY_LIST)
+        loaded = serializer.loads(serializer.dumps(value))
+        assert loaded.payload == value.payload
+        assert loaded.metadata == value.metadata
+
+    def testCompressesBigValues(self):
+        serializer = CacheSerializer(compression='zlib')
+        value = _cached_value(STORY_LIST)
+        assert len(serializer.dumps(value)) < len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) / 4
+
+    def testMsgpackRoundTrip(self):
+        serializer = CacheSerializer(codec='msgpack')
+        value = _cached_value(STORY_LIST)
+        loaded = serializer.loads(serializer.dumps(value))
+        assert loaded.payload == value.payload
+        assert loaded.metadata == value.metadata
+
+    def testFallsBackToPickle(self):
+        serializer = CacheSerializer(codec='msgpack')
+        value = _cached_value({'stories_id': 1234, 'dates': ('2020-01-01', '2020-02-01')})
+        loaded = serializer.loads(serializer.dumps(value))
+        assert loaded.payload['dates'] == ('2020-01-01', '2020-02-01')   # still a tuple
+
+    def testIntegerDictKeys(self):
+        serializer = CacheSerializer(codec='msgpack')
+        value = _cached_value({1234: 'a story'})
+        assert serializer.loads(serializer.dumps(value)).payload == {1234: 'a story'}
+
+    def testReadsOldPickles(self):
+        serializer = CacheSerializer()
+        value = _cached_value(STORY)
+        loaded = serializer.loads(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        assert loaded.payload == STORY
+
+    def testReadsOtherFormats(self):
+        value = _cached_value(STORY_LIST)
+        written = CacheSerializer(codec='msgpack', compression='zlib').dumps(value)
+        assert CacheSerializer().loads(written).payload == value.payload
+
+    def testCorruptValues(self):
+        for compression in ['zlib', 'zstd']:
+            serializer = CacheSerializer(compression=compression)
+            written = serializer.dumps(_cached_value(STORY_LIST))
+            for corrupt in [b'garbage', written[:5] + b'garbage', written[:len(written) // 2], pickle.dumps(12)]:
+                self.assertRaises(SerializationException, serializer.loads, corrupt)
+
+
+if __name__ == "__main__":
+    unittest.main()
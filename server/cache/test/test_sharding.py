@@ -0,0 +1,75 @@
+import unittest
+from urllib.parse import urlsplit, urlunsplit
+
+from server import config
+from server.cache import McCacheRegion, _keyword_safe_key_generator
+from server.cache.dependencies import collection_dependency
+from server.cache.sharding import HashRing, shard_name
+
+KEYS = ['server.views.apicache:_cached_tag|tags_id={}'.format(i) for i in range(10000)]
+
+
+def _redis_url_with_db(db):
+    parts = urlsplit(config.get('CACHE_REDIS_URL'))
+    return urlunsplit((parts.scheme, parts.netloc, '/{}'.format(db), '', ''))
+
+
+class HashRingTest(unittest.TestCase):
+
+    def testSpread(self):
+        ring = HashRing(['redis-a:6379/0', 'redis-b:6379/0', 'redis-c:6379/0'])
+        counts = {node: len(keys) for node, keys in ring.group(KEYS).items()}
+        assert len(counts) == 3
+        assert min(counts.values()) > len(KEYS) / 3 * 0.8
+        assert abs(sum(ring.shares().values()) - 1) < 0.0001
+
+    def testAddingANode(self):
+        nodes = ['redis-a:6379/0', 'redis-b:6379/0', 'redis-c:6379/0']
+        before = HashRing(nodes)
+        after = HashRing(nodes + ['redis-d:6379/0'])
+        moved = [key for key in KEYS if before.node_for(key) != after.node_for(key)]
+        assert all(after.node_for(key) == 'redis-d:6379/0' for key in moved)   # only onto the new node
+        assert len(moved) < len(KEYS) * 0.35
+
+    def testShardName(self):
+        assert shard_name('redis://:secret@cache-1.example.com:6379/2') == 'cache-1.example.com:6379/2'
+
+
+class ShardedBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'mc.redis', arguments={'url': ','.join([_redis_url_with_db(14), _redis_url_with_db(15)]),
+                                   'redis_expiration_time': 60})
+        self._calls = 0
+
+        @self._region.cache_on_arguments(depends_on=lambda result, tags_id: [collection_dependency(tags_id)])
+        def _collection(tags_id):
+            self._calls += 1
+            return {'tags_id': tags_id}
+        self._collection = _collection
+        self._region.invalidate_dependencies(*[collection_dependency(i) for i in range(20)])
+
+    def testReadsAndWrites(self):
+        backend = self._region.actual_backend
+        assert len(backend.shards) == 2
+        assert self._region.get_or_create_many(self._collection, [(i,) for i in range(20)]) == \
+            [{'tags_id': i} for i in range(20)]
+        assert self._region.get_or_create_many(self._collection, [(i,) for i in range(20)]) == \
+            [{'tags_id': i} for i in range(20)]
+        assert self._calls == 20
+        self._region.invalidate_dependencies(collection_dependency(3))
+        self._collection(3)
+        assert self._calls == 21
+        assert set(backend.shard_stats().keys()) == set(backend.shards.keys())
+
+    def testLocksLiveWithTheirKeys(self):
+        backend = self._region.actual_backend
+        backend.distributed_lock = True
+        for i in range(20):
+            key = self._collection.cache_key(i)
+            assert backend.get_mutex(key).redis is backend.client_for(key)
+
+
+if __name__ == "__main__":
+    unittest.main()
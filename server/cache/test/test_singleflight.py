@@ -0,0 +1,103 @@
+import threading
+import time
+import unittest
+
+from server.cache.singleflight import SingleFlight
+from server.util import deadline
+from server.util.deadline import DeadlineExceeded, within
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self._single_flight = SingleFlight()
+        self._calls = 0
+
+    def _slow_story_count(self, q):
+        self._calls += 1
+        time.sleep(0.05)
+        if q is None:
+            raise ValueError("no query")
+        return {'count': len(q)}
+
+    def _call_at_once(self, q, times):
+        results = []
+
+        def worker():
+            try:
+                results.append(self._single_flight.do(q, self._slow_story_count, q))
+            except ValueError as ve:
+                results.append(ve)
+        threads = [threading.Thread(target=worker) for _ in range(times)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def testCoalescesIdenticalCalls(self):
+        results = self._call_at_once('obama', 5)
+        assert self._calls == 1
+        assert [r[0] for r in results] == [{'count': 5}] * 5
+        assert sorted([r[1] for r in results]) == [False, True, True, True, True]
+        assert self._single_flight.in_flight() == 0
+
+    def testEveryoneGetsTheirOwnCopy(self):
+        results = self._call_at_once('obama', 2)
+        results[0][0]['count'] = 0
+        assert results[1][0]['count'] == 5
+
+    def testSharesErrors(self):
+        results = self._call_at_once(None, 3)
+        assert self._calls == 1
+        assert all(isinstance(r, ValueError) for r in results)
+
+    def _story_count_by_deadline(self, q):
+        self._calls += 1
+        time.sleep(0.1)
+        deadline.check()
+        return {'count': len(q)}
+
+    def _call_within(self, seconds, results, delay=0):
+        time.sleep(delay)
+        with within(seconds):
+            try:
+                results[seconds] = self._single_flight.do('obama', self._story_count_by_deadline, 'obama')
+            except DeadlineExceeded as de:
+                results[seconds] = de
+
+    def testLeadersDeadlineIsntShared(self):
+        # the first request runs out of time, but the second still has plenty so runs the call itself
+        results = {}
+        threads = [threading.Thread(target=self._call_within, args=(0.05, results)),
+                   threading.Thread(target=self._call_within, args=(5, results, 0.01))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert isinstance(results[0.05], DeadlineExceeded)
+        assert results[5] == ({'count': 5}, False)
+        assert self._calls == 2
+
+    def testWaitingStopsAtOwnDeadline(self):
+        results = {}
+        threads = [threading.Thread(target=self._call_within, args=(5, results)),
+                   threading.Thread(target=self._call_within, args=(0.03, results, 0.01))]
+        start = time.monotonic()
+        for t in threads:
+            t.start()
+        threads[1].join()
+        assert time.monotonic() - start < 0.08
+        threads[0].join()
+        assert isinstance(results[0.03], DeadlineExceeded)
+        assert results[5] == ({'count': 5}, False)
+        assert self._calls == 1
+
+    def testLaterCallsRunAgain(self):
+        self._single_flight.do('obama', self._slow_story_count, 'obama')
+        self._single_flight.do('obama', self._slow_story_count, 'obama')
+        assert self._calls == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from server import config
+from server.cache import McCacheRegion, _keyword_safe_key_generator, versions
+from server.cache.versions import code_version, key_version, version_usage, collect_garbage, UNVERSIONED
+
+NAMESPACE = 'server.cache.test.test_versions:_story_list'
+
+
+def _count(q):
+    return len(q)
+
+
+def _count_again(q):
+    return len(q)
+
+
+def _count_differently(q):
+    return len(q) + 1
+
+
+class CodeVersionTest(unittest.TestCase):
+
+    def testSameCode(self):
+        assert code_version(_count) == code_version(_count_again)
+        assert code_version(_count) != code_version(_count_differently)
+
+    def testKeyVersion(self):
+        assert key_version('server.views.apicache:_cached_tag|@1a2b3c4d|tags_id=5') == '1a2b3c4d'
+        assert key_version('server.views.apicache:_cached_tag|tags_id=5') == UNVERSIONED
+
+
+class VersionedRegionTest(unittest.TestCase):
+
+    def setUp(self):
+        self._region = McCacheRegion(function_key_generator=_keyword_safe_key_generator).configure(
+            'mc.redis', arguments={'url': config.get('CACHE_REDIS_URL')})
+        self._region.delete_multi([key for keys in self._region.actual_backend.scan_keys(NAMESPACE + '|*')
+                                   for key in keys])
+        self._calls = 0
+
+    def _story_list(self, version):
+        @self._region.cache_on_arguments(version=version)
+        def _story_list(q):
+            self._calls += 1
+            return [q]
+        return _story_list
+
+    def testVersionInKey(self):
+        assert self._story_list('3').cache_key('a') == NAMESPACE + '|@3|q=a'
+        assert self._story_list(None).cache_key('a') == '{}|@{}|q=a'.format(NAMESPACE, versions.current(NAMESPACE))
+
+    def testNewVersionMisses(self):
+        self._story_list('1')('a')
+        self._story_list('1')('a')
+        assert self._calls == 1
+        self._story_list('2')('a')
+        assert self._calls == 2
+
+    def testGarbageCollection(self):
+        old_story_list = self._story_list('1')
+        old_story_list('a')
+        old_story_list('b')
+        self._story_list('2')('a')
+        usage = version_usage(self._region.actual_backend, versions, [NAMESPACE])
+        assert usage == {NAMESPACE: {'1': {'keys': 2, 'current': False}, '2': {'keys': 1, 'current': True}}}
+        assert collect_garbage(self._region, versions, [NAMESPACE], batch_size=1, pause=0) == {NAMESPACE: 2}
+        usage = version_usage(self._region.actual_backend, versions, [NAMESPACE])
+        assert usage == {NAMESPACE: {'2': {'keys': 1, 'current': True}}}
+
+    def testUnregisteredKeysKept(self):
+        # ie. the cached functions of another app sharing this Redis, which this one didn't import
+        removed = 'server.cache.test.test_versions:_removed'
+        self._region.set(removed + '|@1|q=a', 1)
+        assert not versions.is_registered(removed)
+        assert collect_garbage(self._region, versions, [removed], pause=0) == {}
+        assert collect_garbage(self._region, versions, [removed], pause=0, include_unregistered=True) == {removed: 1}
+
+
+if __name__ == "__main__":
+    unittest.main()
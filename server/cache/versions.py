@@ -0,0 +1,153 @@
+"""
+Namespace versions - so changing what a cached function returns only invalidates that function, instead of needing a
+`redis-cli FLUSHALL`. Every cached function has a version that is part of its keys ("module:function|@version|args").
+By default it is a hash of the function's code, so editing the function moves it to new keys on the next deploy. If
+what changed is somewhere else (ie. a helper it calls, or the back-end), bump it by hand with the `version` argument
+to `cache.cache_on_arguments`. Old versions aren't read anymore and expire on their own; `flask cache-versions --gc`
+deletes them sooner.
+
+Each app (topics, sources, explorer, tools) only imports its own views, but they all share one Redis, so anything
+that decides a version is obsolete has to know about every app's cached functions first (see `register_every_app`).
+"""
+import hashlib
+import importlib
+import logging
+import pkgutil
+import time
+import types
+from collections import Counter
+
+from server.cache.keys import namespace_from_key
+
+logger = logging.getLogger(__name__)
+
+VERSION_MARKER = '@'
+UNVERSIONED = '(none)'  # keys written before functions had versions
+APP_NAMESPACES = 'server.*'  # our cached functions are all in the server package; other apps can share Redis
+DEFAULT_SCAN_BATCH_SIZE = 1000
+DEFAULT_GC_BATCH_SIZE = 500
+GC_PAUSE_SECONDS = 0.05  # between batches, so collecting garbage doesn't hog Redis
+CACHED_PACKAGES = ['server.views', 'server.platforms', 'server.util']  # where our cached functions live
+
+
+def _code_fingerprint(code):
+    parts = [code.co_code.hex(), ",".join(code.co_names)]
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            parts.append(_code_fingerprint(const))
+        elif isinstance(const, frozenset):
+            parts.append(repr(sorted([repr(c) for c in const])))  # set order changes from process to process
+        else:
+            parts.append(repr(const))
+    return "|".join(parts)
+
+
+def code_version(fn):
+    """
+    :return: a short hash of the function's code (not its name or line numbers, so moving it around doesn't count)
+    """
+    return hashlib.sha1(_code_fingerprint(fn.__code__).encode('utf-8')).hexdigest()[:8]
+
+
+def versioned_key_generator(key_generator, version):
+    # "module:function|args" -> "module:function|@version|args"
+    prefix = '|{}{}|'.format(VERSION_MARKER, version)
+
+    def generate_key(*args, **kwargs):
+        namespace, _, rest = key_generator(*args, **kwargs).partition('|')
+        return namespace + prefix + rest
+    return generate_key
+
+
+def key_version(key):
+    rest = key.partition('|')[2]
+    if not rest.startswith(VERSION_MARKER):
+        return UNVERSIONED
+    return rest[len(VERSION_MARKER):].partition('|')[0]
+
+
+class VersionRegistry:
+    """
+    The current version of every cached function in this app, by namespace.
+    """
+
+    def __init__(self):
+        self._versions = {}
+
+    def register(self, namespace, version):
+        version = str(version)
+        if ('|' in version) or (len(version) == 0):
+            raise ValueError("Cache version for {} can't be empty or have a '|' in it".format(namespace))
+        self._versions[namespace] = version
+        return version
+
+    def current(self, namespace):
+        return self._versions.get(namespace)
+
+    def is_registered(self, namespace):
+        return namespace in self._versions
+
+
+def register_every_app(packages=None):
+    """
+    Import every module that could have cached functions (not just the views this app serves), so they are all in the
+    registry.
+    """
+    for package_name in (packages or CACHED_PACKAGES):
+        package = importlib.import_module(package_name)
+        for module in pkgutil.walk_packages(package.__path__, package_name + '.'):
+            if '.test' not in module.name:
+                importlib.import_module(module.name)
+
+
+def _scan(backend, namespaces, batch_size):
+    if namespaces is None:
+        # one pass over everything, which also finds the leftovers of cached functions that were deleted
+        yield from backend.scan_keys('{}|*'.format(APP_NAMESPACES), batch_size)
+    else:
+        for namespace in namespaces:
+            yield from backend.scan_keys('{}|*'.format(namespace), batch_size)
+
+
+def version_usage(backend, registry, namespaces=None, batch_size=DEFAULT_SCAN_BATCH_SIZE):
+    """
+    :param namespaces: the cached functions to look at (all of them by default)
+    :return: a dict of namespace -> a dict of version -> {'keys': count, 'current': bool}
+    """
+    usage = {}
+    for keys in _scan(backend, namespaces, batch_size):
+        for key in keys:
+            namespace, version = namespace_from_key(key), key_version(key)
+            versions = usage.setdefault(namespace, {})
+            entry = versions.setdefault(version, {'keys': 0, 'current': version == registry.current(namespace)})
+            entry['keys'] += 1
+    return usage
+
+
+def _is_obsolete(registry, key, include_unregistered):
+    namespace = namespace_from_key(key)
+    if not registry.is_registered(namespace):
+        return include_unregistered
+    return key_version(key) != registry.current(namespace)
+
+
+def collect_garbage(region, registry, namespaces=None, batch_size=DEFAULT_GC_BATCH_SIZE, pause=GC_PAUSE_SECONDS,
+                    include_unregistered=False):
+    """
+    Delete the values cached by old versions of these functions (all of them by default), a batch at a time. Only run
+    this once every worker is on the new code - old workers would just miss on everything.
+    :param include_unregistered: also delete the values of functions that aren't in the registry (ie. ones that have
+    been removed from the code); only safe once `register_every_app` has run, or other apps lose their cache
+    :return: a dict of namespace -> how many keys were deleted
+    """
+    # find them all first; deleting keys while scanning can make the scan skip some
+    obsolete = [key for keys in _scan(region.actual_backend, namespaces, DEFAULT_SCAN_BATCH_SIZE)
+                for key in keys if _is_obsolete(registry, key, include_unregistered)]
+    for i in range(0, len(obsolete), batch_size):
+        region.delete_multi(obsolete[i:i + batch_size])
+        if pause > 0:
+            time.sleep(pause)
+    deleted = Counter([namespace_from_key(key) for key in obsolete])
+    for namespace, count in sorted(deleted.items()):
+        logger.info("Deleted %d obsolete cache keys from %s", count, namespace)
+    return dict(deleted)
@@ -46,3 +46,96 @@ def sync_frontend_db(test):
         print("Successfully deleted users")
     else:
         print("No users to delete")
+
+
+@click.command("prewarm-cache")
+@click.option('--only', multiple=True, help="Name of a manifest entry to prewarm (can be repeated). Defaults to the "
+                                            "CACHE_PREWARM config setting, or everything.")
+@click.option('--concurrency', type=int, default=4, help="How many back-end calls to make at once.")
+@click.option('--dry-run', is_flag=True, default=False,
+              help="Just list the calls prewarming would make (and the keys they fill), and what is cached for these "
+                   "entries now. Doesn't fetch anything.")
+@with_appcontext
+def prewarm_cache(only, concurrency, dry_run):
+    """
+    Fill the cache with hot, user-agnostic data (ie. featured collections and metadata tag sets), so the first users
+    after a deploy or cache flush don't have to wait for it. Meant to be run from the release step.
+    """
+    from server import config
+    from server.util.config import ConfigException
+    from server.cache import prewarm
+    names = list(only) or None
+    if names is None:
+        try:
+            names = [n.strip() for n in config.get('CACHE_PREWARM').split(',') if len(n.strip()) > 0]
+        except ConfigException:
+            names = None
+    entries = prewarm.manifest_entries(names)
+    if dry_run:
+        calls = prewarm.plan(entries)
+        for entry in entries:
+            entry_calls = [c for c in calls if c['name'] == entry.name]
+            print("{}: {} calls".format(entry.name, len(entry_calls)))
+            for call in entry_calls:
+                key = call['key'] or "(not cached itself; fills the cache through the calls it makes)"
+                print("  {}: {} -> {}".format(call['label'], call['function'], key))
+        total_entries = 0
+        total_bytes = 0
+        for usage in prewarm.estimate(entries):
+            print("{name} ({namespace}): {entries} cached, {bytes} bytes".format(**usage))
+            total_entries += usage['entries']
+            total_bytes += usage['bytes']
+        print("{} calls to make; {} entries, {} bytes cached now for {}".format(
+            len(calls), total_entries, total_bytes, ", ".join([e.name for e in entries])))
+        print("Dry run only! Nothing fetched.")
+        return
+
+    def progress(done, total, label, seconds, error):
+        if error is None:
+            print("[{}/{}] {} ({:.2f}s)".format(done, total, label, seconds))
+        else:
+            print("[{}/{}] {} FAILED: {}".format(done, total, label, error))
+    failures = prewarm.prewarm(entries, concurrency=concurrency, progress=progress)
+    if failures > 0:
+        raise click.ClickException("'{}' prewarm calls failed".format(failures))
+    print("Successfully prewarmed {}".format(", ".join([e.name for e in entries])))
+
+
+@click.command("cache-versions")
+@click.option('--only', multiple=True, help="A cached function's namespace, ie. "
+                                            "server.views.apicache:_cached_story_count (can be repeated). Defaults "
+                                            "to all of them.")
+@click.option('--gc', is_flag=True, default=False,
+              help="Delete the values cached by old versions. Only do this once every worker is running this code.")
+@click.option('--include-removed', is_flag=True, default=False,
+              help="With --gc, also delete the values of cached functions that aren't in the code anymore.")
+@click.option('--batch-size', type=int, default=500, help="How many keys to delete at a time.")
+@with_appcontext
+def cache_versions(only, gc, include_removed, batch_size):
+    """
+    List how many values are cached for each version of each cached function, and optionally delete the ones from
+    versions this code doesn't use anymore.
+    """
+    from server.cache import cache, versions as version_registry
+    from server.cache.versions import version_usage, collect_garbage, register_every_app
+    # every app shares the cache, so know about all their cached functions, not just this app's
+    register_every_app()
+    namespaces = list(only) or None
+    obsolete_keys = 0
+    removed_keys = 0
+    for namespace, usage in version_usage(cache.actual_backend, version_registry, namespaces).items():
+        registered = version_registry.is_registered(namespace)
+        for version, details in sorted(usage.items()):
+            print("{} @{}: {} keys{}".format(namespace, version, details['keys'],
+                                             " (current)" if details['current'] else
+                                             "" if registered else " (not in the code)"))
+            if registered and not details['current']:
+                obsolete_keys += details['keys']
+            elif not registered:
+                removed_keys += details['keys']
+    print("'{}' keys from obsolete versions, '{}' from functions not in the code".format(obsolete_keys, removed_keys))
+    if not gc:
+        return
+    deleted = collect_garbage(cache, version_registry, namespaces, batch_size=batch_size,
+                              include_unregistered=include_removed)
+    print("Successfully deleted '{}' obsolete keys".format(sum(deleted.values())))
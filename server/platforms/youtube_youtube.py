@@ -5,7 +5,7 @@ import dateutil.parser
 
 from server.cache import cache
 from server.platforms.provider import ContentProvider, MC_DATE_FORMAT
-import requests
+from server.util.transport import session_for
 
 # 2014-09-21T00:00:00Z
 YT_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
@@ -87,5 +87,5 @@ class YouTubeYouTubeProvider(ContentProvider):
             'order': order,
             'pageToken': page_token,
         }
-        response = requests.get(YT_SEARCH_API_URL, params=params)
+        response = session_for('youtube').get(YT_SEARCH_API_URL, params=params)
         return response.json()
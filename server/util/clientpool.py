@@ -0,0 +1,172 @@
+"""
+Pooled Media Cloud API clients. Making a new client for every call means no HTTP connection is ever reused, so fan-out
+loops pay for a TCP (and TLS) handshake on every request. Here clients are kept per API key and client class, in a
+bounded pool that drops the least recently used ones and any that sit idle too long. They all send their requests
+through one shared `requests` session, which keeps connections alive and caps how many are open to each host (callers
+past the cap wait their turn). The locks are plain threading ones, which gevent patches, so this is safe for both
+threads and greenlets. If given a limiter (see `server.util.limiter`), every request also waits for a slot in it, if
+given a service (see `server.util.resilience`) it goes through that service's circuit breaker and timeout, and if given
+latency histograms (see `server.util.transport`) how long it took is recorded in them. Requests never wait past the
+current request's deadline (see `server.util.deadline`).
+"""
+# pylint: disable=too-many-instance-attributes
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import mediacloud.api
+import requests
+from requests.adapters import HTTPAdapter
+
+from server.util import deadline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CLIENTS = 1000
+DEFAULT_IDLE_SECONDS = 300
+DEFAULT_CONNECTIONS_PER_HOST = 50
+MAX_HOSTS = 10
+LATENCY_NAME = 'media_cloud'
+
+
+class PooledSession:
+    """
+    Stands in for the `requests` module inside the mediacloud client library (which calls `requests.get` and friends
+    directly), sending everything through one keep-alive session instead. If it sits idle too long the session is
+    replaced, so we don't try to reuse connections the server has already given up on.
+    """
+
+    codes = requests.codes
+
+    def __init__(self, connections_per_host=DEFAULT_CONNECTIONS_PER_HOST, idle_seconds=DEFAULT_IDLE_SECONDS,
+                 limiter=None, service=None, latencies=None, clock=time.monotonic):
+        self._connections_per_host = connections_per_host
+        self._limiter = limiter
+        self._service = service
+        self._latencies = latencies
+        self._idle_seconds = idle_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._session = None
+        self._last_used = None
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=MAX_HOSTS, pool_maxsize=self._connections_per_host, pool_block=True)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def session(self):
+        with self._lock:
+            now = self._clock()
+            if (self._session is not None) and (now - self._last_used > self._idle_seconds):
+                self._session.close()
+                self._session = None
+            if self._session is None:
+                self._session = self._new_session()
+            self._last_used = now
+            return self._session
+
+    def _timed_request(self, method, url, **kwargs):
+        if self._latencies is None:
+            return self.session().request(method, url, **kwargs)
+        start = time.perf_counter()
+        try:
+            return self.session().request(method, url, **kwargs)
+        finally:
+            self._latencies.observe(LATENCY_NAME, time.perf_counter() - start)
+
+    def _request(self, method, url, **kwargs):
+        if self._limiter is None:
+            return self._timed_request(method, url, **kwargs)
+        return self._limiter.call(self._timed_request, method, url, is_failure=_overloaded,
+                                  kind=_call_kind(method, url), **kwargs)
+
+    def _send(self, method, url, **kwargs):
+        if self._service is None:
+            kwargs['timeout'] = deadline.cap(kwargs.get('timeout'))
+            return self._request(method, url, **kwargs)
+        # the breaker goes outside the limiter, so when it is open calls fail right away instead of waiting for a slot
+        kwargs['timeout'] = deadline.cap(kwargs.get('timeout', self._service.timeout))
+        return self._service.call(self._request, method, url, is_failure=_overloaded, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self._send('GET', url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self._send('POST', url, data=data, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self._send('PUT', url, data=data, **kwargs)
+
+
+def _call_kind(method, url):
+    # ie. "GET /api/v2/topics/<id>/stories/count", so the limiter compares calls with others to the same endpoint
+    return '{} {}'.format(method, re.sub(r'/\d+(?=/|$)', '/<id>', urlparse(url).path))
+
+
+def _overloaded(response):
+    # server errors and "slow down"s, but not ordinary client errors like a bad query
+    return (response.status_code >= 500) or (response.status_code == 429)
+
+
+class ClientPool:
+    """
+    Media Cloud clients by (client class, API key). Clients don't hold any state besides their key and the API url,
+    so one can be shared by every request made with that key.
+    """
+
+    def __init__(self, api_url=None, max_clients=DEFAULT_MAX_CLIENTS, idle_seconds=DEFAULT_IDLE_SECONDS,
+                 clock=time.monotonic):
+        self._api_url = api_url
+        self._max_clients = max_clients
+        self._idle_seconds = idle_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()  # (class, key) -> [client, last used], least recently used first
+
+    def get(self, client_class, api_key):
+        pool_key = (client_class, api_key)
+        with self._lock:
+            now = self._clock()
+            self._evict_idle(now)
+            entry = self._clients.get(pool_key)
+            if entry is None:
+                entry = [self._new_client(client_class, api_key), now]
+                self._clients[pool_key] = entry
+                while len(self._clients) > self._max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                entry[1] = now
+                self._clients.move_to_end(pool_key)
+            return entry[0]
+
+    def _new_client(self, client_class, api_key):
+        client = client_class(api_key)
+        if self._api_url is not None:
+            client.V2_API_URL = self._api_url
+        return client
+
+    def _evict_idle(self, now):
+        # the least recently used are at the front, so stop at the first one that is still fresh
+        while len(self._clients) > 0:
+            pool_key, (_client, last_used) = next(iter(self._clients.items()))
+            if now - last_used <= self._idle_seconds:
+                break
+            del self._clients[pool_key]
+
+    def __len__(self):
+        return len(self._clients)
+
+
+def pool_connections(connections_per_host=DEFAULT_CONNECTIONS_PER_HOST, idle_seconds=DEFAULT_IDLE_SECONDS,
+                     limiter=None, service=None, latencies=None):
+    """
+    Send every Media Cloud client's requests (pooled or not, ie. the tool client too) through one keep-alive session.
+    """
+    mediacloud.api.requests = PooledSession(connections_per_host, idle_seconds, limiter, service, latencies)
+    logger.debug("Media Cloud clients share a session with up to %d connections per host", connections_per_host)
@@ -0,0 +1,122 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import has_request_context, copy_current_request_context
+
+from server.util import deadline
+from server.util.deadline import DeadlineExceeded
+
+MAX_WORKERS = 10
+
+
+def map_concurrently(fn, items, max_workers=MAX_WORKERS):
+    """
+    Like `[fn(item) for item in items]`, but the calls run at the same time. Each call gets its own copy of the request
+    context, so it can still find the logged in user's API key. Outside of a request (or for one item) this just runs
+    them in order.
+    """
+    items = list(items)
+    if (len(items) < 2) or not has_request_context():
+        return [fn(item) for item in items]
+    # a pool of our own, rather than the shared executor, so callers already running in that can't deadlock it
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        futures = [pool.submit(copy_current_request_context(fn), item) for item in items]
+        return [f.result() for f in futures]
+
+
+class Call:
+    """
+    One call in a batch for `gather`, ie. `Call(apicache.topic_story_count, user_mc_key, topics_id, q=q)`. Chain on
+    `within(seconds)` to give it a timeout, and `or_default(value, SomeError)` to get value back instead of an error.
+    Calls never run past the request's deadline (see `server.util.deadline`); `or_default(value, DeadlineExceeded)`
+    to leave out ones that don't finish in time (and mark the results as partial).
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = None
+        self.default = None
+        self.errors = ()
+
+    def within(self, seconds):
+        self.timeout = seconds
+        return self
+
+    def or_default(self, default, *errors):
+        """
+        :param errors: the exception types that mean "use the default" (ie. MCException, or
+        concurrent.futures.TimeoutError for calls that take too long, or DeadlineExceeded for ones the request ran
+        out of time for); any exception if none are given
+        """
+        self.default = default
+        self.errors = errors or (Exception,)
+        return self
+
+
+class _StartedCall:
+    # runs a Call, noting when it actually started so its timeout doesn't count time spent waiting for a worker; it runs
+    # to the deadline of whoever made it, and isn't started at all if that has passed
+
+    def __init__(self, call):
+        self.call = call
+        self.deadline = deadline.current()
+        self.started = threading.Event()
+        self.started_at = None
+
+    def __call__(self):
+        self.started_at = time.monotonic()
+        self.started.set()
+        with deadline.use(self.deadline):
+            deadline.check()
+            return self.call.fn(*self.call.args, **self.call.kwargs)
+
+    def _wait(self, future):
+        timeouts = []
+        if self.call.timeout is not None:
+            if not self.started.wait(deadline.remaining()):
+                raise DeadlineExceeded()  # never got a worker in time
+            timeouts.append(self.call.timeout - (time.monotonic() - self.started_at))
+        if deadline.remaining() is not None:
+            timeouts.append(deadline.remaining())
+        try:
+            return future.result(timeout=max(0, min(timeouts)) if len(timeouts) > 0 else None)
+        except FutureTimeoutError as e:
+            if deadline.expired():
+                raise DeadlineExceeded() from e
+            raise
+
+    def result(self, future):
+        try:
+            return self._wait(future)
+        except self.call.errors as e:
+            if isinstance(e, DeadlineExceeded):
+                deadline.mark_partial()
+            return self.call.default
+
+
+def gather(calls, max_workers=MAX_WORKERS):
+    """
+    Make a batch of independent calls (ie. to our apicache functions, so they are still cached) at the same time, so
+    a view waits about as long as the slowest one instead of the sum of them all. At most max_workers run at once.
+    Each call gets its own copy of the request context, so it can still find the logged in user's API key.
+    :param calls: a list of Calls
+    :return: their results, in the same order; the first error (or timeout) that wasn't defaulted is raised (once the
+    request's deadline passes the calls still running are left behind, and the ones that haven't started are dropped)
+    """
+    calls = list(calls)
+    if len(calls) == 0:
+        return []
+    started_calls = [_StartedCall(c) for c in calls]
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(calls)))
+    futures = []
+    try:
+        futures = [pool.submit(copy_current_request_context(c) if has_request_context() else c)
+                   for c in started_calls]
+        return [c.result(f) for c, f in zip(started_calls, futures)]
+    finally:
+        # don't wait for calls that timed out; just drop the ones that haven't started
+        for f in futures:
+            f.cancel()
+        pool.shutdown(wait=False)
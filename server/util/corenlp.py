@@ -1,8 +1,8 @@
-import requests
 from typing import List, Dict
 
 from server import config
 from server.cache import cache
+from server.util.transport import session_for
 
 
 CORENLP_URL = config.get('CORENLP_URL')
@@ -18,7 +18,7 @@ def quotes_from_text(text: str) -> List[Dict]:
 @cache.cache_on_arguments()
 def _fetch_annotations(text: str) -> Dict:
     url = 'http://' + CORENLP_URL + '/?properties={"annotators":"tokenize,ssplit,pos,lemma,ner,depparse,coref,quote","outputFormat":"json"}'
-    r = requests.post(url, data=text.encode('utf-8'))
+    r = session_for('corenlp').post(url, data=text.encode('utf-8'))
     return r.json()
 
 
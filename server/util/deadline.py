@@ -0,0 +1,174 @@
+"""
+Per-request time budgets. Without one a single request that fans out into dozens of back-end calls (ie. the word2vec
+timespans or the story split counts for a big collection) can run right up to gunicorn's 500 second timeout, holding
+a worker, threads and back-end slots the whole time.
+
+Each request gets a deadline when it starts: DEFAULT_SECONDS for ordinary API calls, DOWNLOAD_SECONDS for CSV
+downloads, or whatever a view asks for with `@time_budget(seconds)`. Clients can ask for less with a
+`X-Request-Timeout: <seconds>` header (but not for more). The deadline is kept on the request's WSGI environ, so the
+threads `gather` and the executor start for the request see it too. Elsewhere (ie. scripts) use `within(seconds)`.
+
+Everything that waits on something outside - outbound HTTP calls (see `server.util.transport` and
+`server.util.clientpool`), waiting for a back-end slot, `gather` - caps how long it waits at the time left, and raises
+`DeadlineExceeded` (a 504) once it has run out, so the rest of the work is dropped instead of started. Views that can
+return what they have so far mark the work they can skip with `or_partial` (or `Call.or_default(..., DeadlineExceeded)`
+in a `gather`), and the response then gets a `X-Partial-Results: true` header.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import request, has_request_context, current_app
+from mediacloud.error import MCException
+
+DEFAULT_SECONDS = 120
+DOWNLOAD_SECONDS = 450  # just under gunicorn's timeout
+HEADER = 'X-Request-Timeout'
+PARTIAL_HEADER = 'X-Partial-Results'
+ENVIRON_KEY = 'webtools.deadline'
+PARTIAL_ENVIRON_KEY = 'webtools.partial'
+
+_local = threading.local()
+
+
+class DeadlineExceeded(MCException):
+    """
+    Raised instead of starting (or waiting on) more work once a request has used up its time budget.
+    """
+
+    cacheable = False  # it's about this request, not the call, so never negative-cache it
+
+    def __init__(self, message="This is taking too long, so we stopped; try again with a smaller query"):
+        super().__init__(message, 504)
+
+
+def time_budget(seconds):
+    """
+    Decorator for views that need a different budget than the default (put it under `@app.route`).
+    """
+    def decorator(fn):
+        fn.time_budget = seconds
+        return fn
+    return decorator
+
+
+def _endpoint_budget():
+    view = current_app.view_functions.get(request.endpoint)
+    seconds = getattr(view, 'time_budget', None)
+    if seconds is not None:
+        return seconds
+    return DOWNLOAD_SECONDS if request.path.endswith('.csv') else DEFAULT_SECONDS
+
+
+def start_request():
+    # register this as a before_request handler
+    seconds = _endpoint_budget()
+    try:
+        asked_for = float(request.headers.get(HEADER, ''))
+        if asked_for > 0:
+            seconds = min(seconds, asked_for)
+    except ValueError:
+        pass  # no header (or junk in it)
+    request.environ[ENVIRON_KEY] = time.monotonic() + seconds
+
+
+def add_partial_header(response):
+    # register this as an after_request handler
+    if is_partial():
+        response.headers[PARTIAL_HEADER] = 'true'
+    return response
+
+
+def current():
+    """
+    :return: when (on the `time.monotonic` clock) the current work has to be done by, or None if there's no limit
+    """
+    deadline = getattr(_local, 'deadline', None)
+    if (deadline is None) and has_request_context():
+        deadline = request.environ.get(ENVIRON_KEY)
+    return deadline
+
+
+@contextmanager
+def use(deadline):
+    """
+    Work to the given deadline (ie. one from `current()` in another thread) in this thread; None leaves it as it is.
+    """
+    previous = getattr(_local, 'deadline', None)
+    if deadline is not None:
+        _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def within(seconds):
+    """
+    Give the work done inside this a time budget (or what's left of the current one, if that is less).
+    """
+    deadline = time.monotonic() + seconds
+    if current() is not None:
+        deadline = min(deadline, current())
+    return use(deadline)
+
+
+def remaining():
+    """
+    :return: seconds left before the deadline (0 or less once it has passed), or None if there's no limit
+    """
+    deadline = current()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired():
+    seconds_left = remaining()
+    return (seconds_left is not None) and (seconds_left <= 0)
+
+
+def check():
+    if expired():
+        raise DeadlineExceeded()
+
+
+def cap(seconds):
+    """
+    :param seconds: a timeout (or None for none)
+    :return: that timeout, cut down to the time left before the deadline
+    """
+    check()
+    seconds_left = remaining()
+    if seconds_left is None:
+        return seconds
+    return seconds_left if seconds is None else min(seconds, seconds_left)
+
+
+def mark_partial():
+    if has_request_context():
+        request.environ[PARTIAL_ENVIRON_KEY] = True
+
+
+def is_partial():
+    """
+    :return: if some of the work for this request was skipped because it ran out of time
+    """
+    return has_request_context() and request.environ.get(PARTIAL_ENVIRON_KEY, False)
+
+
+def or_partial(default=None):
+    """
+    Decorator for a piece of work (ie. an executor job) the response can do without: once the request is out of time it
+    returns default instead (without starting, if it hasn't yet) and marks the results as partial.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                check()
+                return fn(*args, **kwargs)
+            except DeadlineExceeded:
+                mark_partial()
+                return default
+        return wrapper
+    return decorator
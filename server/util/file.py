@@ -1,9 +1,9 @@
-import requests
 import os
 import datetime as dt
 from werkzeug.utils import secure_filename
 
 from server import app
+from server.util.transport import session_for
 
 
 def save_file_to_upload_folder(file_to_save, filename):
@@ -20,7 +20,7 @@ def save_url_to_temp_file(remote_url: str) -> str:
     :return: the local temp filepath
     """
     content_name = remote_url.rsplit('/', 1)[1]
-    r = requests.get(remote_url, allow_redirects=True)
+    r = session_for('remote_files').get(remote_url, allow_redirects=True)
     filename = "{}-{}-{}".format(content_name, dt.datetime.now().strftime("%Y%m%d%H%M%S"),
                                  secure_filename("fetched-file"))
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
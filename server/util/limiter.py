@@ -0,0 +1,424 @@
+"""
+An adaptive limit on how many calls we have out to a back-end (ie. Media Cloud) at once, so a few big jobs (CSV
+downloads, per-source historical counts) can't flood it and slow things down for everyone else. The limit adapts
+AIMD-style, like TCP does: every call that comes back cleanly nudges it up a little (by 1/limit, so about +1 per
+"round" of calls), and a failure (an error, or a 503 or 429 from the back-end) or an unusually slow call cuts it by a
+fraction (at most once per cooldown, so one bad moment doesn't drive it to the floor). Some calls legitimately take
+minutes (ie. word counts on big queries), so "slow" is measured against recent calls of the same kind (ie. the same
+API endpoint): a call counts as slow if it took more than `slow_factor` times the 90th percentile of those.
+
+Calls are either interactive (the default - someone is waiting on a page) or bulk (background jobs and long downloads;
+mark them with `@bulk` or `with bulk_priority():`). Bulk calls can only ever use part of the limit, so there is always
+room left for interactive ones, and they also wait their turn behind any interactive callers waiting in this process.
+If too many callers are already waiting, new ones get a 503 right away instead of piling on more (backpressure).
+
+The slots are counted in this process by default, or in Redis so every worker on every host shares one limit. Slots
+in Redis expire, so the ones held by a worker that crashed mid-call are given back on their own.
+"""
+# pylint: disable=too-many-instance-attributes
+import functools
+import inspect
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import redis
+from mediacloud.error import MCException
+
+from server.util import deadline
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+PRIORITIES = [INTERACTIVE, BULK]
+
+DEFAULT_INITIAL_LIMIT = 20
+DEFAULT_MIN_LIMIT = 2
+DEFAULT_MAX_LIMIT = 100
+DEFAULT_SLOW_FACTOR = 3  # calls this many times slower than usual for their kind are a sign of overload
+SLOW_PERCENTILE = 90
+LATENCY_WINDOW = 100  # recent calls of each kind to work "usual" out from
+MIN_LATENCY_SAMPLES = 20  # until then only failures count
+MAX_KINDS = 500  # forget the least recently used kinds past this
+DEFAULT_DECREASE_FACTOR = 0.7
+DEFAULT_COOLDOWN = 2  # seconds between decreases
+DEFAULT_MAX_WAITING = 200  # per priority, in each process
+DEFAULT_MAX_WAIT = 120  # seconds
+BULK_SHARE = 0.75  # of the limit that bulk calls can use
+POLL_SECONDS = 0.05
+SLOT_TTL = 600  # seconds, longer than any call should take
+METRIC_PREFIX = 'webtools_backend_limiter'
+
+_priority = threading.local()
+
+
+class BackendBusy(MCException):
+    """
+    Raised instead of waiting for a slot when too many calls are already waiting (or a call waited too long).
+    """
+
+    cacheable = False  # about how busy this worker is right now, so never negative-cache it
+
+    def __init__(self, message):
+        super().__init__(message, 503)
+
+
+def current_priority():
+    return getattr(_priority, 'value', INTERACTIVE)
+
+
+@contextmanager
+def bulk_priority():
+    previous = current_priority()
+    _priority.value = BULK
+    try:
+        yield
+    finally:
+        _priority.value = previous
+
+
+def _bulk_generator(generator):
+    # only the steps of the generator run at bulk priority, not whatever its consumer does in between
+    while True:
+        with bulk_priority():
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+        yield item
+
+
+def bulk(fn):
+    """
+    Decorator for functions (or generators, ie. CSV streams) whose back-end calls are bulk work.
+    """
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            return _bulk_generator(fn(*args, **kwargs))
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with bulk_priority():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class LocalSlots:
+    """
+    Slots counted in this process (each worker gets its own limit).
+    """
+
+    def __init__(self, initial_limit, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self._limit = float(initial_limit)
+        self._in_flight = set()
+        self._clock = clock
+        self._last_decrease = None
+
+    def try_acquire(self, token, share):
+        with self._lock:
+            if len(self._in_flight) >= max(1, int(self._limit * share)):
+                return False
+            self._in_flight.add(token)
+            return True
+
+    def release(self, token):
+        with self._lock:
+            self._in_flight.discard(token)
+
+    def increase(self, max_limit):
+        with self._lock:
+            self._limit = min(float(max_limit), self._limit + 1 / self._limit)
+
+    def decrease(self, factor, min_limit, cooldown):
+        with self._lock:
+            now = self._clock()
+            if (self._last_decrease is not None) and (now - self._last_decrease < cooldown):
+                return False
+            self._last_decrease = now
+            self._limit = max(float(min_limit), self._limit * factor)
+            return True
+
+    def limit(self):
+        return self._limit
+
+    def in_flight(self):
+        return len(self._in_flight)
+
+
+# KEYS: slots, limit; ARGV: token, now, ttl, share, initial limit
+_ACQUIRE_SCRIPT = """
+redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[2])
+local limit = tonumber(redis.call('get', KEYS[2]) or ARGV[5])
+if redis.call('zcard', KEYS[1]) >= math.max(1, math.floor(limit * tonumber(ARGV[4]))) then
+  return 0
+end
+redis.call('zadd', KEYS[1], tonumber(ARGV[2]) + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+# KEYS: limit; ARGV: max limit, initial limit
+_INCREASE_SCRIPT = """
+local limit = tonumber(redis.call('get', KEYS[1]) or ARGV[2])
+limit = math.min(tonumber(ARGV[1]), limit + 1 / limit)
+redis.call('set', KEYS[1], tostring(limit))
+return tostring(limit)
+"""
+
+# KEYS: limit, cooldown; ARGV: factor, min limit, initial limit, cooldown (milliseconds)
+_DECREASE_SCRIPT = """
+if not redis.call('set', KEYS[2], '1', 'PX', ARGV[4], 'NX') then
+  return 0
+end
+local limit = tonumber(redis.call('get', KEYS[1]) or ARGV[3])
+limit = math.max(tonumber(ARGV[2]), limit * tonumber(ARGV[1]))
+redis.call('set', KEYS[1], tostring(limit))
+return 1
+"""
+
+
+class RedisSlots:
+    """
+    Slots counted in Redis, so every worker that uses the same name shares one limit. In-flight calls are kept in a
+    sorted set scored by when they expire.
+    """
+
+    def __init__(self, redis_client, initial_limit, name='backend', clock=time.time):
+        self._redis = redis_client
+        self._initial_limit = initial_limit
+        self._clock = clock
+        prefix = '_limiter:{}:'.format(name)
+        self._slots_key = prefix + 'slots'
+        self._limit_key = prefix + 'limit'
+        self._cooldown_key = prefix + 'cooldown'
+        self._acquire = redis_client.register_script(_ACQUIRE_SCRIPT)
+        self._increase = redis_client.register_script(_INCREASE_SCRIPT)
+        self._decrease = redis_client.register_script(_DECREASE_SCRIPT)
+
+    def try_acquire(self, token, share):
+        return self._acquire(keys=[self._slots_key, self._limit_key],
+                             args=[token, self._clock(), SLOT_TTL, share, self._initial_limit]) == 1
+
+    def release(self, token):
+        self._redis.zrem(self._slots_key, token)
+
+    def increase(self, max_limit):
+        self._increase(keys=[self._limit_key], args=[max_limit, self._initial_limit])
+
+    def decrease(self, factor, min_limit, cooldown):
+        return self._decrease(keys=[self._limit_key, self._cooldown_key],
+                              args=[factor, min_limit, self._initial_limit, int(cooldown * 1000)]) == 1
+
+    def limit(self):
+        limit = self._redis.get(self._limit_key)
+        return self._initial_limit if limit is None else float(limit)
+
+    def in_flight(self):
+        return self._redis.zcount(self._slots_key, self._clock(), '+inf')
+
+
+class CallLatencies:
+    """
+    The latencies of recent calls, by kind, so a call can be compared with how long ones like it usually take.
+    """
+
+    def __init__(self, size=LATENCY_WINDOW, max_kinds=MAX_KINDS):
+        self._size = size
+        self._max_kinds = max_kinds
+        self._lock = threading.Lock()
+        self._latencies = OrderedDict()  # kind -> deque of seconds
+
+    def add(self, kind, seconds):
+        with self._lock:
+            if kind not in self._latencies:
+                self._latencies[kind] = deque(maxlen=self._size)
+                if len(self._latencies) > self._max_kinds:
+                    self._latencies.popitem(last=False)
+            self._latencies.move_to_end(kind)
+            self._latencies[kind].append(seconds)
+
+    def percentile(self, kind, pct):
+        """
+        :return: the given percentile of recent calls of this kind, or None if there haven't been enough yet
+        """
+        with self._lock:
+            latencies = self._latencies.get(kind)
+            if (latencies is None) or (len(latencies) < MIN_LATENCY_SAMPLES):
+                return None
+            ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class AdaptiveLimiter:
+    """
+    Wraps calls to a back-end so only as many run at once as the (adapting) limit allows.
+    """
+
+    def __init__(self, slots, min_limit=DEFAULT_MIN_LIMIT, max_limit=DEFAULT_MAX_LIMIT,
+                 slow_factor=DEFAULT_SLOW_FACTOR, decrease_factor=DEFAULT_DECREASE_FACTOR,
+                 cooldown=DEFAULT_COOLDOWN, max_waiting=DEFAULT_MAX_WAITING, max_wait=DEFAULT_MAX_WAIT,
+                 clock=time.monotonic):
+        self._slots = slots
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._slow_factor = slow_factor
+        self._latencies = CallLatencies()
+        self._decrease_factor = decrease_factor
+        self._cooldown = cooldown
+        self._max_waiting = max_waiting
+        self._max_wait = max_wait
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._waiting = {p: 0 for p in PRIORITIES}
+        self._counts = {p: {'calls': 0, 'throttled': 0, 'rejected': 0, 'wait_seconds': 0.0} for p in PRIORITIES}
+        self._decreases = 0
+
+    def _can_try(self, priority):
+        # bulk callers let any interactive ones waiting in this process go first
+        return (priority == INTERACTIVE) or (self._waiting[INTERACTIVE] == 0)
+
+    def _try_acquire(self, token, priority, share):
+        # the slots may be in Redis, so this round trip happens outside the condition's lock
+        with self._condition:
+            if not self._can_try(priority):
+                return False
+        return self._slots.try_acquire(token, share)
+
+    def acquire(self, priority=None):
+        """
+        Wait for a slot.
+        :return: a token to pass to `release` when the call is done
+        """
+        priority = priority or current_priority()
+        share = 1 if priority == INTERACTIVE else BULK_SHARE
+        token = uuid.uuid4().hex
+        if self._try_acquire(token, priority, share):
+            with self._condition:
+                self._counts[priority]['calls'] += 1
+            return token
+        with self._condition:
+            if self._waiting[priority] >= self._max_waiting:
+                self._counts[priority]['rejected'] += 1
+                raise BackendBusy("Too many requests are waiting on the back-end right now; try again in a minute")
+            self._counts[priority]['throttled'] += 1
+            self._waiting[priority] += 1
+        start = self._clock()
+        try:
+            while not self._try_acquire(token, priority, share):
+                if self._clock() - start > self._max_wait:
+                    with self._condition:
+                        self._counts[priority]['rejected'] += 1
+                    raise BackendBusy("The back-end is too busy right now; try again in a minute")
+                deadline.check()  # no point waiting any longer if the request is out of time
+                # released slots wake us up; the timeout is for ones released by other processes (or while we were
+                # trying)
+                with self._condition:
+                    self._condition.wait(POLL_SECONDS)
+        finally:
+            with self._condition:
+                self._waiting[priority] -= 1
+                self._counts[priority]['wait_seconds'] += self._clock() - start
+                self._condition.notify_all()
+        with self._condition:
+            self._counts[priority]['calls'] += 1
+        return token
+
+    def _is_slow(self, kind, seconds):
+        usual = self._latencies.percentile(kind, SLOW_PERCENTILE)
+        return (usual is not None) and (seconds > usual * self._slow_factor)
+
+    def release(self, token, seconds, failed, neutral=False, kind=None):
+        """
+        Give the slot back, and adapt the limit to how the call went.
+        :param neutral: the call didn't tell us anything about the back-end (ie. our caller's deadline cut it short), so
+        leave the limit as it is
+        :param kind: what sort of call it was (ie. the API endpoint), to tell if it was slower than usual
+        """
+        self._slots.release(token)
+        if neutral:
+            pass
+        elif failed or self._is_slow(kind, seconds):
+            if self._slots.decrease(self._decrease_factor, self._min_limit, self._cooldown):
+                self._decreases += 1
+                logger.info("Backend limit cut to %.1f after a %s call (%.1fs)", self._slots.limit(),
+                            'failed' if failed else 'slow', seconds)
+        else:
+            self._slots.increase(self._max_limit)
+        if not (neutral or failed):
+            self._latencies.add(kind, seconds)
+        with self._condition:
+            self._condition.notify_all()
+
+    def call(self, fn, *args, is_failure=None, kind=None, **kwargs):
+        """
+        Call fn in a slot.
+        :param is_failure: a function of the result that says if it failed (ie. an HTTP 503); exceptions always do
+        :param kind: what sort of call it is (ie. the API endpoint); calls are only compared with others of their kind
+        to tell if they were slow
+        """
+        token = self.acquire()
+        start = self._clock()
+        failed = True
+        neutral = False
+        try:
+            result = fn(*args, **kwargs)
+            failed = (is_failure is not None) and is_failure(result)
+            return result
+        except Exception:
+            # a call that only failed because the request ran out of time isn't the back-end's fault, and counting it
+            # would let anyone cut the limit by sending tiny deadlines
+            neutral = deadline.expired()
+            raise
+        finally:
+            self.release(token, self._clock() - start, failed, neutral, kind)
+
+    def stats(self):
+        with self._condition:
+            priorities = {p: dict(self._counts[p], waiting=self._waiting[p]) for p in PRIORITIES}
+        return {
+            'limit': self._slots.limit(),
+            'in_flight': self._slots.in_flight(),
+            'decreases': self._decreases,
+            'priorities': priorities,
+        }
+
+    def as_text(self):
+        """
+        :return: the metrics in the Prometheus text exposition format, so they can be scraped
+        """
+        stats = self.stats()
+        lines = []
+
+        def add_metric(name, metric_type, description, values):
+            full_name = '{}_{}'.format(METRIC_PREFIX, name)
+            lines.append('# HELP {} {}'.format(full_name, description))
+            lines.append('# TYPE {} {}'.format(full_name, metric_type))
+            for labels, value in values:
+                lines.append('{}{} {}'.format(full_name, labels, value))
+        add_metric('limit', 'gauge', "How many back-end calls can be in flight at once", [('', stats['limit'])])
+        add_metric('in_flight', 'gauge', "Back-end calls in flight", [('', stats['in_flight'])])
+        add_metric('decreases_total', 'counter', "Times this process cut the limit", [('', stats['decreases'])])
+        for name, metric_type, description in [
+                ('waiting', 'gauge', "Calls waiting for a slot (queue depth)"),
+                ('calls', 'counter', "Calls that got a slot"),
+                ('throttled', 'counter', "Calls that had to wait for a slot"),
+                ('rejected', 'counter', "Calls turned away because too many were waiting"),
+                ('wait_seconds', 'counter', "Time spent waiting for a slot")]:
+            add_metric(name if metric_type == 'gauge' else name + '_total', metric_type, description,
+                       [('{{priority="{}"}}'.format(p), stats['priorities'][p][name]) for p in PRIORITIES])
+        return "\n".join(lines) + "\n"
+
+
+def backend_limiter(redis_url=None, initial_limit=DEFAULT_INITIAL_LIMIT, **kwargs):
+    """
+    :param redis_url: share the limit through this Redis (otherwise each process has its own)
+    """
+    if redis_url is None:
+        return AdaptiveLimiter(LocalSlots(initial_limit), **kwargs)
+    return AdaptiveLimiter(RedisSlots(redis.StrictRedis.from_url(redis_url), initial_limit), **kwargs)
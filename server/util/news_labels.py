@@ -2,6 +2,8 @@ import requests
 import logging
 
 from server import config
+from server.util.resilience import ServiceUnavailable
+from server.util.transport import session_for
 
 logger = logging.getLogger(__name__)
 
@@ -11,8 +13,10 @@ def predict(story_text):
         return {}
     url = "{}/predict.json".format(config.get('NYT_THEME_LABELLER_URL'))
     try:
-        r = requests.post(url, json={'text': story_text})
+        r = session_for('nyt_labeller').post(url, json={'text': story_text})
         return r.json()
+    except ServiceUnavailable as e:
+        logger.warning(e.message)
     except requests.exceptions.RequestException as e:
         logger.exception(e)
     return {}
@@ -0,0 +1,325 @@
+"""
+Timeouts, hedged requests and circuit breakers for the services we call out to (Media Cloud, word embeddings, CLIFF,
+CoreNLP, the NYT labeller, Pushshift), so one that hangs or falls over can't tie up our workers with it.
+
+Every service has a timeout. Calls to the ones marked `hedge` (quick, read-only lookups) run in a small thread pool: if
+the first try is slower than HEDGE_PERCENTILE of recent calls, a duplicate is sent and whichever answers first wins. If
+neither answers before the timeout the call fails with a 504. Other services are called inline; pass
+`timeout=service.timeout` on to `requests` so they give up too.
+
+Calls don't wait past the request's deadline (see `server.util.deadline`) either: they aren't made once it has passed,
+and a call cut short by it raises `DeadlineExceeded` without counting against the service.
+
+Each service also has a circuit breaker. After FAILURE_THRESHOLD failures in a row it opens, and calls fail right away
+(with a 503) instead of waiting on a service we know is down. After RESET_SECONDS one trial call is let through; if it
+works the breaker closes again. Callers that can do without a service (ie. word counts without their embeddings)
+should catch `ServiceUnavailable` and carry on.
+"""
+# pylint: disable=too-many-instance-attributes
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from mediacloud.error import MCException
+
+from server.util import deadline
+from server.util.deadline import DeadlineExceeded
+from server.util.limiter import current_priority, bulk_priority, BULK
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATES = [CLOSED, HALF_OPEN, OPEN]
+
+FAILURE_THRESHOLD = 5  # failures in a row
+RESET_SECONDS = 30
+HEDGE_PERCENTILE = 95
+MIN_HEDGE_DELAY = 0.05  # seconds
+LATENCY_WINDOW = 200  # recent calls to work the percentile out from
+MIN_LATENCY_SAMPLES = 20  # don't hedge until we know what normal looks like
+HEDGE_WORKERS = 50
+METRIC_PREFIX = 'webtools_backend_service'
+
+# name: (timeout seconds, hedge). Override timeouts with the SERVICE_TIMEOUTS config setting.
+SERVICES = {
+    # calls vary from milliseconds to minutes (word counts on big queries), and the limiter keeps load off it, so no
+    # hedging
+    'media_cloud': (300, False),
+    'word_embeddings': (10, True),
+    'cliff': (10, True),
+    'corenlp': (60, False),
+    'nyt_labeller': (30, False),
+    'pushshift': (30, True),
+    'youtube': (30, False),
+    'remote_files': (60, False),
+}
+
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS)
+
+
+class ServiceUnavailable(MCException):
+    """
+    A service's breaker is open (503), or it didn't answer in time (504).
+    """
+
+    cacheable = False  # the service may well be back in a moment, so never negative-cache it
+
+    def __init__(self, message, status_code=503):
+        super().__init__(message, status_code)
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS, clock=time.monotonic):
+        self._failure_threshold = failure_threshold
+        self._reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self):
+        with self._lock:
+            if (self._state == OPEN) and (self._clock() - self._opened_at >= self._reset_seconds):
+                self._state = HALF_OPEN
+            if (self._state == CLOSED) or ((self._state == HALF_OPEN) and not self._trial_in_flight):
+                self._trial_in_flight = self._state == HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if (self._state == HALF_OPEN) or (self._failures >= self._failure_threshold):
+                if self._state != OPEN:
+                    self.trips += 1
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+    def release(self):
+        # the call didn't tell us anything either way (ie. our request ran out of time), so let another one try
+        with self._lock:
+            self._trial_in_flight = False
+
+    def state(self):
+        with self._lock:
+            if (self._state == OPEN) and (self._clock() - self._opened_at >= self._reset_seconds):
+                return HALF_OPEN
+            return self._state
+
+
+class LatencyWindow:
+    """
+    The latencies of the most recent successful calls.
+    """
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=size)
+
+    def add(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            if len(self._latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _run(priority, fn, args, kwargs):
+    # so bulk work stays bulk in the hedging threads (which is what the limiter looks at)
+    if priority == BULK:
+        with bulk_priority():
+            return fn(*args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+class Service:
+
+    def __init__(self, name, timeout, hedge=False, breaker=None, clock=time.monotonic):
+        self.name = name
+        self.timeout = timeout
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.latencies = LatencyWindow()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counts = {'calls': 0, 'failures': 0, 'timeouts': 0, 'hedges': 0, 'hedge_wins': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def call(self, fn, *args, is_failure=None, **kwargs):
+        """
+        Call fn (which talks to this service) through the breaker, with a timeout and (if the service is hedged)
+        hedging.
+        :param is_failure: a function of the result that says if it failed (ie. an HTTP 503); exceptions always do
+        """
+        timeout = deadline.cap(self.timeout)
+        if not self.breaker.allow():
+            raise ServiceUnavailable("{} isn't responding right now; try again in a minute".format(self.name))
+        self._count('calls')
+        start = self._clock()
+        try:
+            if self.hedge:
+                result = self._hedged(fn, args, kwargs, timeout)
+            else:
+                result = fn(*args, **kwargs)
+        except requests.exceptions.Timeout as e:
+            if deadline.expired():
+                self.breaker.release()
+                raise DeadlineExceeded() from e  # the request ran out of time, not the service's fault
+            self._count('timeouts')
+            self._count('failures')
+            self.breaker.record_failure()
+            raise ServiceUnavailable("{} didn't answer within {}s".format(self.name, self.timeout), 504) from e
+        except DeadlineExceeded:
+            self.breaker.release()
+            raise
+        except Exception:
+            self._count('failures')
+            self.breaker.record_failure()
+            raise
+        if (is_failure is not None) and is_failure(result):
+            self._count('failures')
+            self.breaker.record_failure()
+        else:
+            self.latencies.add(self._clock() - start)
+            self.breaker.record_success()
+        return result
+
+    def _hedged(self, fn, args, kwargs, timeout):
+        priority = current_priority()
+        give_up_at = self._clock() + timeout
+        first = _hedge_pool.submit(_run, priority, fn, args, kwargs)
+        pending = {first}
+        hedge_delay = self.latencies.percentile(HEDGE_PERCENTILE)
+        if hedge_delay is not None:
+            done, pending = wait(pending, timeout=min(max(hedge_delay, MIN_HEDGE_DELAY), timeout))
+            if not done:
+                self._count('hedges')
+                pending.add(_hedge_pool.submit(_run, priority, fn, args, kwargs))
+            else:
+                pending = done
+        error = None
+        while len(pending) > 0:
+            remaining = give_up_at - self._clock()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not first:
+                        self._count('hedge_wins')
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        if len(pending) == 0:
+            raise error
+        for other in pending:
+            other.cancel()
+        raise requests.exceptions.Timeout()  # counted and turned into a ServiceUnavailable by `call`
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        p95 = self.latencies.percentile(95)
+        return dict(counts, state=self.breaker.state(), trips=self.breaker.trips, rejected=self.breaker.rejected,
+                    timeout=self.timeout, hedge=self.hedge, latency_p95=p95)
+
+
+class ServiceRegistry:
+
+    def __init__(self, definitions=None):
+        self._definitions = dict(definitions or SERVICES)
+        self._services = {}
+        self._lock = threading.Lock()
+
+    def set_timeouts(self, timeouts):
+        """
+        :param timeouts: a dict of service name -> timeout in seconds
+        """
+        with self._lock:
+            for name, timeout in timeouts.items():
+                if name not in self._definitions:
+                    raise ValueError("Unknown service '{}' (known ones are {})".format(
+                        name, ", ".join(sorted(self._definitions.keys()))))
+                self._definitions[name] = (timeout, self._definitions[name][1])
+                if name in self._services:
+                    self._services[name].timeout = timeout
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._services:
+                timeout, hedge = self._definitions[name]
+                self._services[name] = Service(name, timeout, hedge)
+            return self._services[name]
+
+    def stats(self):
+        return {name: self.get(name).stats() for name in sorted(self._definitions.keys())}
+
+    def as_text(self):
+        """
+        :return: the metrics in the Prometheus text exposition format, so they can be scraped
+        """
+        stats = self.stats()
+        lines = []
+
+        def add_metric(name, metric_type, description, value_fn):
+            full_name = '{}_{}'.format(METRIC_PREFIX, name)
+            lines.append('# HELP {} {}'.format(full_name, description))
+            lines.append('# TYPE {} {}'.format(full_name, metric_type))
+            for service in sorted(stats.keys()):
+                for labels, value in value_fn(service, stats[service]):
+                    lines.append('{}{{{}}} {}'.format(full_name, labels, value))
+        add_metric('breaker_state', 'gauge', "1 for the state each service's circuit breaker is in",
+                   lambda name, s: [('service="{}",state="{}"'.format(name, state), int(s['state'] == state))
+                                    for state in STATES])
+        for name, description, key in [('calls_total', "Calls made", 'calls'),
+                                       ('failures_total', "Calls that failed", 'failures'),
+                                       ('timeouts_total', "Calls that timed out", 'timeouts'),
+                                       ('hedges_total', "Duplicate requests sent for slow calls", 'hedges'),
+                                       ('hedge_wins_total', "Duplicate requests that answered first", 'hedge_wins'),
+                                       ('breaker_trips_total', "Times the circuit breaker opened", 'trips'),
+                                       ('breaker_rejected_total', "Calls failed fast by an open breaker",
+                                        'rejected')]:
+            add_metric(name, 'counter', description,
+                       lambda service, s, k=key: [('service="{}"'.format(service), s[k])])
+        return "\n".join(lines) + "\n"
+
+
+services = ServiceRegistry()
+
+
+def parse_timeouts(setting):
+    """
+    :param setting: ie. "word_embeddings:5, cliff:3" (not "=", which the config file parser splits lines on)
+    :return: a dict of service name -> timeout in seconds
+    """
+    timeouts = {}
+    for part in [p.strip() for p in setting.split(',') if len(p.strip()) > 0]:
+        name, _, seconds = part.partition(':')
+        timeouts[name.strip()] = float(seconds)
+    return timeouts
@@ -9,6 +9,8 @@ import codecs
 from server import base_dir, mc, TOOL_API_KEY
 from server.auth import user_mediacloud_client
 from server.cache import cache
+from server.cache.policy import immutable_when
+from server.cache.dependencies import collection_dependency
 from server.util.stringutil import snake_to_camel
 from server.util.config import get_default_config
 
@@ -346,7 +348,17 @@ def tag_set_with_tags(mc_api_key, tag_sets_id, only_public_tags=False, use_file_
     return tag_set
 
 
-@cache.cache_on_arguments()
+def _full_tag_page(tag_list, _mc_api_key, _tag_sets_id, _last_tags_id, rows, _public_only):
+    # new tags are added at the end of a tag set, so only the last page (the partial one) can change
+    return len(tag_list) == rows
+
+
+def _tag_page_dependencies(tag_list, *_args):
+    # so renaming a collection refreshes the pages that list it
+    return [collection_dependency(t['tags_id']) for t in tag_list]
+
+
+@cache.cache_on_arguments(ttl=immutable_when(_full_tag_page), depends_on=_tag_page_dependencies)
 def _cached_tag_page(mc_api_key, tag_sets_id, last_tags_id, rows, public_only):
     # user agnositic here because the list of tags in a collection only changes for users based on public_only
     local_mc = user_mediacloud_client(mc_api_key)
@@ -363,15 +375,33 @@ def cached_tag_set_file(file_path):
 
 
 def media_with_tag(tags_id, cached=False):
+    if cached:
+        return cached_media_with_tag(tags_id)
+    return _media_with_tag(tags_id)
+
+
+def _media_with_tag_dependencies(_media_list, tags_id):
+    # just the collection (not a tag per source, which would be thousands for the big ones); editing a source
+    # invalidates every collection it is in instead (see sources/apicache.invalidate_source)
+    return [collection_dependency(tags_id)]
+
+
+@cache.cache_on_arguments(depends_on=_media_with_tag_dependencies)
+def cached_media_with_tag(tags_id):
+    """
+    The whole list as one cache entry - some of the collections have TONS of sources, but the cache splits big values
+    into chunks for us. Ok to be a cross-user cache here
+    """
+    return _media_with_tag(tags_id)
+
+
+def _media_with_tag(tags_id):
     more_media = True
     all_media = []
     max_media_id = 0
     while more_media:
         logger.debug("last_media_id %s", str(max_media_id))
-        if cached:
-            media = cached_media_with_tag_page(tags_id, max_media_id)
-        else:
-            media = _media_with_tag_page(tags_id, max_media_id)
+        media = _media_with_tag_page(tags_id, max_media_id)
         all_media = all_media + media
         if len(media) > 0:
             max_media_id = media[len(media) - 1]['media_id']
@@ -379,11 +409,14 @@ def media_with_tag(tags_id, cached=False):
     return sorted(all_media, key=lambda t: t['name'].lower())
 
 
-@cache.cache_on_arguments()
+def _media_with_tag_page_dependencies(_media_list, tags_id, _max_media_id):
+    return [collection_dependency(tags_id)]
+
+
+@cache.cache_on_arguments(depends_on=_media_with_tag_page_dependencies)
 def cached_media_with_tag_page(tags_id, max_media_id):
     """
-    We have to do this on the page, not the full list because memcache has a 1MB cache upper limit,
-    and some of the collections have TONS of sources
+    Just one page of sources (ie. to see if there are any); use cached_media_with_tag for the whole list.
     Ok to be a cross-user cache here
     """
     return _media_with_tag_page(tags_id, max_media_id)
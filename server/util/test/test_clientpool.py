@@ -0,0 +1,82 @@
+import threading
+import unittest
+
+import mediacloud.api
+
+from server.util.clientpool import ClientPool, PooledSession, _call_kind
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class ClientPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self._clock = FakeClock()
+        self._pool = ClientPool(api_url='http://mc.example.com/api/v2/', max_clients=2, idle_seconds=60,
+                                clock=self._clock)
+
+    def testReuse(self):
+        client = self._pool.get(mediacloud.api.MediaCloud, 'key-1')
+        assert client.V2_API_URL == 'http://mc.example.com/api/v2/'
+        assert self._pool.get(mediacloud.api.MediaCloud, 'key-1') is client
+        assert self._pool.get(mediacloud.api.MediaCloud, 'key-2') is not client
+        admin_client = self._pool.get(mediacloud.api.AdminMediaCloud, 'key-1')
+        assert isinstance(admin_client, mediacloud.api.AdminMediaCloud)
+
+    def testBounded(self):
+        first = self._pool.get(mediacloud.api.MediaCloud, 'key-1')
+        self._pool.get(mediacloud.api.MediaCloud, 'key-2')
+        self._pool.get(mediacloud.api.MediaCloud, 'key-1')   # so key-2 is the least recently used
+        self._pool.get(mediacloud.api.MediaCloud, 'key-3')
+        assert len(self._pool) == 2
+        assert self._pool.get(mediacloud.api.MediaCloud, 'key-1') is first
+
+    def testIdleEviction(self):
+        first = self._pool.get(mediacloud.api.MediaCloud, 'key-1')
+        self._clock.now = 30
+        self._pool.get(mediacloud.api.MediaCloud, 'key-2')
+        self._clock.now = 61
+        self._pool.get(mediacloud.api.MediaCloud, 'key-2')
+        assert len(self._pool) == 1
+        assert self._pool.get(mediacloud.api.MediaCloud, 'key-1') is not first
+
+    def testThreads(self):
+        clients = []
+
+        def get_client():
+            clients.append(self._pool.get(mediacloud.api.MediaCloud, 'key-1'))
+        threads = [threading.Thread(target=get_client) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(set([id(c) for c in clients])) == 1
+
+
+class PooledSessionTest(unittest.TestCase):
+
+    def testSessionReused(self):
+        clock = FakeClock()
+        pooled = PooledSession(connections_per_host=5, idle_seconds=60, clock=clock)
+        session = pooled.session()
+        assert pooled.session() is session
+        assert session.get_adapter('https://api.mediacloud.org')._pool_maxsize == 5
+        clock.now = 61
+        assert pooled.session() is not session   # idle too long
+
+    def testCallKind(self):
+        assert _call_kind('GET', 'https://api.mediacloud.org/api/v2/topics/123/stories/count?q=obama') == \
+            'GET /api/v2/topics/<id>/stories/count'
+        assert _call_kind('GET', 'https://api.mediacloud.org/api/v2/stories_public/single/456') == \
+            'GET /api/v2/stories_public/single/<id>'
+
+
+if __name__ == "__main__":
+    unittest.main()
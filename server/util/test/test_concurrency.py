@@ -0,0 +1,62 @@
+import concurrent.futures
+import threading
+import time
+import unittest
+
+from server.util.concurrency import gather, Call
+
+
+def _slow_double(value, seconds=0.2):
+    time.sleep(seconds)
+    return value * 2
+
+
+def _fail(message):
+    raise ValueError(message)
+
+
+class GatherTest(unittest.TestCase):
+
+    def testResultsInOrder(self):
+        start = time.monotonic()
+        results = gather([Call(_slow_double, i, seconds=0.3 - i * 0.1) for i in range(3)])
+        assert results == [0, 2, 4]
+        assert time.monotonic() - start < 0.5   # about as long as the slowest, not the sum
+
+    def testEmpty(self):
+        assert gather([]) == []
+
+    def testErrors(self):
+        self.assertRaises(ValueError, gather, [Call(_slow_double, 1), Call(_fail, "bad")])
+        assert gather([Call(_slow_double, 1), Call(_fail, "bad").or_default(None)]) == [2, None]
+        # only the errors you list are defaulted
+        self.assertRaises(ValueError, gather, [Call(_fail, "bad").or_default(None, KeyError)])
+
+    def testTimeouts(self):
+        start = time.monotonic()
+        self.assertRaises(concurrent.futures.TimeoutError, gather, [Call(_slow_double, 1, seconds=1).within(0.1)])
+        results = gather([Call(_slow_double, 1, seconds=1).within(0.1).or_default(0, concurrent.futures.TimeoutError),
+                          Call(_slow_double, 2, seconds=0)])
+        assert results == [0, 4]
+        assert time.monotonic() - start < 0.8
+
+    def testConcurrencyCap(self):
+        running = []
+        most_running = []
+        lock = threading.Lock()
+
+        def track(value):
+            with lock:
+                running.append(value)
+                most_running.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(value)
+            return value
+        # the timeouts only start when each call does, so waiting in line doesn't count against them
+        assert gather([Call(track, i).within(0.5) for i in range(8)], max_workers=2) == list(range(8))
+        assert max(most_running) == 2
+
+
+if __name__ == "__main__":
+    unittest.main()
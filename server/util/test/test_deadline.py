@@ -0,0 +1,154 @@
+import time
+import unittest
+
+import requests
+from flask import Flask, jsonify
+
+from server.util import deadline
+from server.util.concurrency import gather, Call
+from server.util.deadline import DeadlineExceeded, within, time_budget, or_partial
+from server.util.resilience import Service, CLOSED
+
+
+def _slow_double(value, seconds=0.2):
+    time.sleep(seconds)
+    return value * 2
+
+
+def _out_of_time():
+    raise DeadlineExceeded()
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def testNoDeadline(self):
+        assert deadline.remaining() is None
+        assert deadline.cap(5) == 5
+        assert deadline.cap(None) is None
+        deadline.check()
+
+    def testWithin(self):
+        with within(10):
+            assert 9 < deadline.remaining() <= 10
+            assert deadline.cap(30) <= 10
+            assert deadline.cap(1) == 1
+            with within(60):
+                assert deadline.remaining() <= 10  # can't extend the one we're already in
+        assert deadline.remaining() is None
+
+    def testExpired(self):
+        with within(0):
+            assert deadline.expired()
+            self.assertRaises(DeadlineExceeded, deadline.check)
+            self.assertRaises(DeadlineExceeded, deadline.cap, 5)
+
+    def testOrPartial(self):
+        ran = []
+
+        @or_partial(default='skipped')
+        def work():
+            ran.append(True)
+            return 'done'
+        assert work() == 'done'
+        with within(0):
+            assert work() == 'skipped'
+        assert len(ran) == 1
+
+
+class GatherDeadlineTest(unittest.TestCase):
+
+    def testStopsWaiting(self):
+        start = time.monotonic()
+        with within(0.2):
+            self.assertRaises(DeadlineExceeded, gather, [Call(_slow_double, 1, seconds=1)])
+            assert time.monotonic() - start < 0.5
+
+    def testPartial(self):
+        with within(0.3):
+            results = gather([Call(_slow_double, 1, seconds=1).or_default(None, DeadlineExceeded),
+                              Call(_slow_double, 2, seconds=0)])
+        assert results == [None, 4]
+
+    def testNotStarted(self):
+        ran = []
+        with within(0):
+            results = gather([Call(ran.append, 1).or_default('skipped')])
+        assert results == ['skipped']
+        assert len(ran) == 0
+
+
+class ServiceDeadlineTest(unittest.TestCase):
+
+    def testTimeoutIsNotTheServicesFault(self):
+        service = Service('test', timeout=10)
+
+        def timeout():
+            time.sleep(0.05)
+            raise requests.exceptions.ReadTimeout()
+        with within(0.01):
+            time.sleep(0.02)
+            self.assertRaises(DeadlineExceeded, service.call, lambda: 'ok')
+        with within(0.03):
+            self.assertRaises(DeadlineExceeded, service.call, timeout)
+        for _ in range(10):  # ie. the deadline ran out inside the call
+            self.assertRaises(DeadlineExceeded, service.call, _out_of_time)
+        assert service.breaker.state() == CLOSED
+        assert service.stats()['failures'] == 0
+
+    def testHedgedCallsStopAtDeadline(self):
+        service = Service('test', timeout=10, hedge=True)
+        start = time.monotonic()
+        with within(0.2):
+            self.assertRaises(DeadlineExceeded, service.call, time.sleep, 2)
+        assert time.monotonic() - start < 0.5
+
+
+class RequestDeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.before_request(deadline.start_request)
+        app.after_request(deadline.add_partial_header)
+
+        @app.route('/budget')
+        def budget():
+            return jsonify({'remaining': deadline.remaining()})
+
+        @app.route('/budget.csv')
+        def budget_csv():
+            return jsonify({'remaining': deadline.remaining()})
+
+        @app.route('/short')
+        @time_budget(5)
+        def short():
+            return jsonify({'remaining': deadline.remaining()})
+
+        @app.route('/partial')
+        def partial():
+            results = gather([Call(_slow_double, 1, seconds=1).or_default(None, DeadlineExceeded)])
+            return jsonify({'results': results, 'partial': deadline.is_partial()})
+        self._client = app.test_client()
+
+    def _remaining(self, path, headers=None):
+        return self._client.get(path, headers=headers or {}).get_json()['remaining']
+
+    def testEndpointBudgets(self):
+        assert deadline.DEFAULT_SECONDS - 1 < self._remaining('/budget') <= deadline.DEFAULT_SECONDS
+        assert deadline.DEFAULT_SECONDS < self._remaining('/budget.csv') <= deadline.DOWNLOAD_SECONDS
+        assert self._remaining('/short') <= 5
+
+    def testHeader(self):
+        assert self._remaining('/budget', {deadline.HEADER: '3'}) <= 3
+        # clients can ask for less time, but not more
+        assert self._remaining('/short', {deadline.HEADER: '30'}) <= 5
+        assert self._remaining('/short', {deadline.HEADER: 'soon'}) <= 5
+
+    def testPartialResults(self):
+        response = self._client.get('/partial', headers={deadline.HEADER: '0.2'})
+        assert response.get_json() == {'results': [None], 'partial': True}
+        assert response.headers[deadline.PARTIAL_HEADER] == 'true'
+        assert deadline.PARTIAL_HEADER not in self._client.get('/budget').headers
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+import threading
+import time
+import unittest
+
+import redis
+import requests
+
+from server import config
+from server.util import deadline
+from server.util.limiter import AdaptiveLimiter, LocalSlots, RedisSlots, BackendBusy, bulk, bulk_priority, \
+    current_priority, INTERACTIVE, BULK, MIN_LATENCY_SAMPLES
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def _work(seconds=0):
+    time.sleep(seconds)
+    return seconds
+
+
+class SlotsThatCheckTheLock(LocalSlots):
+    """
+    Slots that, like Redis ones, might take a while - check others can still use the limiter in the meantime.
+    """
+
+    def __init__(self, initial_limit):
+        super().__init__(initial_limit)
+        self.limiter = None
+        self.blocked = []
+
+    def try_acquire(self, token, share):
+        other = threading.Thread(target=self.limiter.stats)
+        other.start()
+        other.join(0.5)
+        self.blocked.append(other.is_alive())
+        other.join()
+        return super().try_acquire(token, share)
+
+
+class LocalSlotsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._clock = FakeClock()
+        self._slots = LocalSlots(10, clock=self._clock)
+
+    def testAdditiveIncrease(self):
+        for _ in range(10):
+            self._slots.increase(100)
+        assert 10.9 < self._slots.limit() < 11   # about one more per "round" of calls
+        for _ in range(1000):
+            self._slots.increase(12)
+        assert self._slots.limit() == 12
+
+    def testMultiplicativeDecrease(self):
+        assert self._slots.decrease(0.5, 2, cooldown=1)
+        assert self._slots.limit() == 5
+        assert not self._slots.decrease(0.5, 2, cooldown=1)  # too soon
+        self._clock.now = 2
+        assert self._slots.decrease(0.5, 2, cooldown=1)
+        self._clock.now = 4
+        self._slots.decrease(0.5, 2, cooldown=1)
+        assert self._slots.limit() == 2
+
+    def testShare(self):
+        assert all(self._slots.try_acquire(str(i), 0.75) for i in range(7))
+        assert not self._slots.try_acquire('bulk', 0.75)
+        assert self._slots.try_acquire('interactive', 1)
+        self._slots.release('0')
+        assert not self._slots.try_acquire('bulk', 0.75)   # counting the interactive call, bulk ones can't have it
+        self._slots.release('1')
+        assert self._slots.try_acquire('bulk', 0.75)
+
+
+class RedisSlotsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._redis = redis.StrictRedis.from_url(config.get('CACHE_REDIS_URL'))
+        self._redis.delete('_limiter:test:slots', '_limiter:test:limit', '_limiter:test:cooldown')
+        self._clock = FakeClock()
+        self._clock.now = 1000
+        self._slots = RedisSlots(self._redis, 4, name='test', clock=self._clock)
+
+    def testSharedLimit(self):
+        other_worker = RedisSlots(self._redis, 4, name='test', clock=self._clock)
+        assert self._slots.try_acquire('a', 1)
+        assert self._slots.try_acquire('b', 1)
+        assert other_worker.try_acquire('c', 1)
+        assert not other_worker.try_acquire('d', 0.75)
+        assert other_worker.try_acquire('d', 1)
+        assert not self._slots.try_acquire('e', 1)
+        assert other_worker.in_flight() == 4
+        self._slots.release('a')
+        assert self._slots.try_acquire('e', 1)
+
+    def testAdapts(self):
+        other_worker = RedisSlots(self._redis, 4, name='test', clock=self._clock)
+        self._slots.increase(100)
+        assert other_worker.limit() == 4.25
+        assert other_worker.decrease(0.5, 2, cooldown=60)
+        assert not self._slots.decrease(0.5, 2, cooldown=60)  # the cooldown is shared too
+        assert self._slots.limit() == 2.125
+
+    def testCrashedWorkersSlotsExpire(self):
+        for token in ['a', 'b', 'c', 'd']:
+            self._slots.try_acquire(token, 1)
+        assert not self._slots.try_acquire('e', 1)
+        self._clock.now += 3600
+        assert self._slots.try_acquire('e', 1)
+        assert self._slots.in_flight() == 1
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+
+    def testAdaptsToCalls(self):
+        limiter = AdaptiveLimiter(LocalSlots(10), cooldown=0)
+        limiter.call(_work)
+        assert limiter.stats()['limit'] == 10.1
+        limiter.call(_work, is_failure=lambda result: True)
+        assert limiter.stats()['limit'] == 10.1 * 0.7
+        self.assertRaises(ValueError, limiter.call, int, 'not a number')
+        assert limiter.stats()['decreases'] == 2
+        assert limiter.stats()['in_flight'] == 0
+
+    def _called(self, limiter, kind, seconds):
+        limiter.release(limiter.acquire(), seconds, False, kind=kind)
+        return limiter.stats()['decreases']
+
+    def testSlowForItsKind(self):
+        limiter = AdaptiveLimiter(LocalSlots(10), cooldown=0)
+        assert self._called(limiter, 'GET /api/v2/topics/<id>/wc/list', 600) == 0   # no idea what's usual yet
+        for _ in range(MIN_LATENCY_SAMPLES):
+            self._called(limiter, 'GET /api/v2/stories/count', 1)
+            self._called(limiter, 'GET /api/v2/topics/<id>/wc/list', 120)
+        # big word counts normally take minutes, so that isn't a sign of overload
+        assert self._called(limiter, 'GET /api/v2/topics/<id>/wc/list', 180) == 0
+        assert self._called(limiter, 'GET /api/v2/stories/count', 10) == 1
+        assert self._called(limiter, 'GET /api/v2/topics/<id>/wc/list', 600) == 2
+
+    def testSlotsCheckedOutsideLock(self):
+        slots = SlotsThatCheckTheLock(1)
+        limiter = AdaptiveLimiter(slots, min_limit=1, max_limit=1)
+        slots.limiter = limiter
+        token = limiter.acquire()
+        waiter = threading.Thread(target=limiter.call, args=(_work,))
+        waiter.start()
+        time.sleep(0.1)
+        limiter.release(token, 0, False)
+        waiter.join()
+        assert len(slots.blocked) >= 2
+        assert not any(slots.blocked)
+
+    def testDeadlineTimeoutsAreNeutral(self):
+        def timeout():
+            raise requests.exceptions.ReadTimeout()
+        limiter = AdaptiveLimiter(LocalSlots(10), cooldown=0)
+        with deadline.within(0):
+            self.assertRaises(requests.exceptions.ReadTimeout, limiter.call, timeout)
+        assert limiter.stats()['limit'] == 10   # our own deadline, not the back-end's fault
+        assert limiter.stats()['in_flight'] == 0
+        self.assertRaises(requests.exceptions.ReadTimeout, limiter.call, timeout)
+        assert limiter.stats()['limit'] == 7
+
+    def testCapsConcurrency(self):
+        limiter = AdaptiveLimiter(LocalSlots(2), min_limit=2, max_limit=2)
+        threads = [threading.Thread(target=limiter.call, args=(_work, 0.1)) for _ in range(6)]
+        start = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert time.monotonic() - start >= 0.3   # three rounds of two
+        stats = limiter.stats()['priorities'][INTERACTIVE]
+        assert (stats['calls'] == 6) and (stats['throttled'] >= 4) and (stats['waiting'] == 0)
+
+    def testInteractiveFirst(self):
+        limiter = AdaptiveLimiter(LocalSlots(1), min_limit=1, max_limit=1)
+        order = []
+        token = limiter.acquire(INTERACTIVE)
+
+        def wait_then_record(priority):
+            limiter.release(limiter.acquire(priority), 0, False)
+            order.append(priority)
+        bulk_thread = threading.Thread(target=wait_then_record, args=(BULK,))
+        bulk_thread.start()
+        time.sleep(0.1)
+        interactive_thread = threading.Thread(target=wait_then_record, args=(INTERACTIVE,))
+        interactive_thread.start()
+        time.sleep(0.1)
+        limiter.release(token, 0, False)
+        bulk_thread.join()
+        interactive_thread.join()
+        assert order == [INTERACTIVE, BULK]   # even though bulk was waiting first
+
+    def testBackpressure(self):
+        limiter = AdaptiveLimiter(LocalSlots(1), min_limit=1, max_limit=1, max_waiting=0)
+        token = limiter.acquire()
+        self.assertRaises(BackendBusy, limiter.acquire)
+        limiter = AdaptiveLimiter(LocalSlots(1), min_limit=1, max_limit=1, max_wait=0.1)
+        token = limiter.acquire()
+        with self.assertRaises(BackendBusy) as context:
+            limiter.acquire()
+        assert context.exception.status_code == 503
+        limiter.release(token, 0, False)
+        assert limiter.stats()['priorities'][INTERACTIVE]['rejected'] == 1
+
+    def testMetrics(self):
+        limiter = AdaptiveLimiter(LocalSlots(10))
+        limiter.call(_work)
+        text = limiter.as_text()
+        assert 'webtools_backend_limiter_limit 10.1\n' in text
+        assert 'webtools_backend_limiter_calls_total{priority="interactive"} 1\n' in text
+        assert 'webtools_backend_limiter_waiting{priority="bulk"} 0\n' in text
+
+
+class PriorityTest(unittest.TestCase):
+
+    def testBulkFunctions(self):
+        @bulk
+        def background_job():
+            return current_priority()
+        assert background_job() == BULK
+        assert current_priority() == INTERACTIVE
+        with bulk_priority():
+            assert current_priority() == BULK
+        assert current_priority() == INTERACTIVE
+
+    def testBulkGenerators(self):
+        @bulk
+        def csv_rows():
+            for _ in range(2):
+                yield current_priority()
+        rows = csv_rows()
+        assert next(rows) == BULK
+        assert current_priority() == INTERACTIVE   # not while the response is being written out
+        assert list(rows) == [BULK]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import threading
+import time
+import unittest
+
+import requests
+
+from server.util.limiter import bulk_priority, current_priority, BULK
+from server.util.resilience import CircuitBreaker, Service, ServiceRegistry, ServiceUnavailable, parse_timeouts, \
+    CLOSED, OPEN, HALF_OPEN, MIN_LATENCY_SAMPLES
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def _fail():
+    raise requests.exceptions.ConnectionError("nobody home")
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._clock = FakeClock()
+        self._service = Service('test', timeout=1, breaker=CircuitBreaker(failure_threshold=3, reset_seconds=30,
+                                                                          clock=self._clock))
+
+    def _trip(self):
+        for _ in range(3):
+            self.assertRaises(requests.exceptions.ConnectionError, self._service.call, _fail)
+
+    def testOpensAfterFailures(self):
+        self.assertRaises(requests.exceptions.ConnectionError, self._service.call, _fail)
+        assert self._service.call(lambda: 'ok') == 'ok'  # only failures in a row count
+        self._trip()
+        assert self._service.breaker.state() == OPEN
+        with self.assertRaises(ServiceUnavailable) as context:
+            self._service.call(lambda: 'ok')
+        assert context.exception.status_code == 503
+        stats = self._service.stats()
+        assert (stats['trips'] == 1) and (stats['rejected'] == 1) and (stats['failures'] == 4)
+
+    def testResultFailures(self):
+        for _ in range(3):
+            self._service.call(lambda: 503, is_failure=lambda status: status >= 500)
+        assert self._service.breaker.state() == OPEN
+
+    def testHalfOpen(self):
+        self._trip()
+        self._clock.now = 31
+        assert self._service.breaker.state() == HALF_OPEN
+        # one trial call at a time
+        assert self._service.breaker.allow()
+        assert not self._service.breaker.allow()
+        self._service.breaker.record_failure()
+        assert self._service.breaker.state() == OPEN
+        assert self._service.breaker.trips == 2
+        self._clock.now = 62
+        assert self._service.call(lambda: 'ok') == 'ok'
+        assert self._service.breaker.state() == CLOSED
+
+    def testTimeouts(self):
+        def timeout():
+            raise requests.exceptions.ReadTimeout()
+        with self.assertRaises(ServiceUnavailable) as context:
+            self._service.call(timeout)
+        assert context.exception.status_code == 504
+        assert self._service.stats()['timeouts'] == 1
+
+
+class HedgingTest(unittest.TestCase):
+
+    def setUp(self):
+        self._service = Service('test', timeout=1, hedge=True)
+        for _ in range(MIN_LATENCY_SAMPLES):
+            self._service.latencies.add(0.05)
+
+    def testHedgeWins(self):
+        calls = []
+        lock = threading.Lock()
+
+        def slow_first_time():
+            with lock:
+                calls.append(current_priority())
+                first = len(calls) == 1
+            time.sleep(0.5 if first else 0)
+            return 'first' if first else 'hedge'
+        start = time.monotonic()
+        with bulk_priority():
+            assert self._service.call(slow_first_time) == 'hedge'
+        assert time.monotonic() - start < 0.4
+        assert calls == [BULK, BULK]
+        stats = self._service.stats()
+        assert (stats['hedges'] == 1) and (stats['hedge_wins'] == 1)
+
+    def testNoHedgeWhenFast(self):
+        assert self._service.call(lambda: 'ok') == 'ok'
+        assert self._service.stats()['hedges'] == 0
+
+    def testTimeout(self):
+        start = time.monotonic()
+        with self.assertRaises(ServiceUnavailable) as context:
+            self._service.call(time.sleep, 3)
+        assert context.exception.status_code == 504
+        assert time.monotonic() - start < 1.5
+        assert self._service.stats()['timeouts'] == 1
+
+    def testErrors(self):
+        self.assertRaises(requests.exceptions.ConnectionError, self._service.call, _fail)
+
+
+class ServiceRegistryTest(unittest.TestCase):
+
+    def testTimeouts(self):
+        registry = ServiceRegistry({'cliff': (10, True), 'corenlp': (60, False)})
+        registry.set_timeouts(parse_timeouts("cliff: 3, corenlp:30"))
+        assert registry.get('cliff').timeout == 3
+        assert registry.get('cliff').hedge
+        assert registry.get('cliff') is registry.get('cliff')
+        self.assertRaises(ValueError, registry.set_timeouts, {'nope': 1})
+
+    def testMetrics(self):
+        registry = ServiceRegistry({'cliff': (10, False)})
+        registry.get('cliff').call(lambda: 'ok')
+        text = registry.as_text()
+        assert 'webtools_backend_service_breaker_state{service="cliff",state="closed"} 1\n' in text
+        assert 'webtools_backend_service_breaker_state{service="cliff",state="open"} 0\n' in text
+        assert 'webtools_backend_service_calls_total{service="cliff"} 1\n' in text
+        assert 'webtools_backend_service_breaker_trips_total{service="cliff"} 0\n' in text
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+
+import requests
+
+from server.util.resilience import Service
+from server.util.transport import ServiceSession, LatencyHistograms
+
+
+class FakeResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    # answers with each of these in turn (raising any exceptions), and remembers what it was asked
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return FakeResponse(answer)
+
+
+class FakePool:
+
+    def __init__(self, session):
+        self._session = session
+
+    def session(self):
+        return self._session
+
+
+class ServiceSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self._sleeps = []
+        self._histograms = LatencyHistograms()
+        self._fake = None
+
+    def _session(self, answers, retry_posts=False):
+        del self._sleeps[:]
+        service_session = ServiceSession('test', Service('test', timeout=7), retry_posts=retry_posts,
+                                         histograms=self._histograms, sleep=self._sleeps.append)
+        self._fake = FakeSession(answers)
+        service_session._pooled = FakePool(self._fake)
+        return service_session
+
+    def testDefaultTimeout(self):
+        session = self._session([200, 200])
+        session.get('http://example.com/')
+        assert self._fake.calls[0][2]['timeout'] == 7
+        session.get('http://example.com/', timeout=2)
+        assert self._fake.calls[1][2]['timeout'] == 2
+
+    def testRetries(self):
+        session = self._session([requests.exceptions.ConnectionError(), 503, 200])
+        assert session.get('http://example.com/').status_code == 200
+        assert len(self._fake.calls) == 3
+        assert len(self._sleeps) == 2
+        assert (0 <= self._sleeps[0] <= 0.1) and (0 <= self._sleeps[1] <= 0.2)
+        assert self._histograms.stats()['test']['count'] == 3
+
+    def testGivesUp(self):
+        session = self._session([503, 503, 503])
+        assert session.get('http://example.com/').status_code == 503
+        session = self._session([requests.exceptions.ConnectionError()] * 3)
+        self.assertRaises(requests.exceptions.ConnectionError, session.get, 'http://example.com/')
+        assert len(self._fake.calls) == 3
+
+    def testNoRetries(self):
+        session = self._session([404])
+        assert session.get('http://example.com/').status_code == 404
+        # posts aren't repeated unless the service says they're safe to
+        session = self._session([503])
+        assert session.post('http://example.com/', data='x').status_code == 503
+        session = self._session([503, 200], retry_posts=True)
+        assert session.post('http://example.com/', data='x').status_code == 200
+
+
+class LatencyHistogramsTest(unittest.TestCase):
+
+    def testText(self):
+        histograms = LatencyHistograms(buckets=[0.1, 1])
+        histograms.observe('cliff', 0.05)
+        histograms.observe('cliff', 0.5)
+        histograms.observe('cliff', 5)
+        text = histograms.as_text()
+        assert '# TYPE webtools_backend_http_request_seconds histogram\n' in text
+        assert 'webtools_backend_http_request_seconds_bucket{service="cliff",le="0.1"} 1\n' in text
+        assert 'webtools_backend_http_request_seconds_bucket{service="cliff",le="1"} 2\n' in text
+        assert 'webtools_backend_http_request_seconds_bucket{service="cliff",le="+Inf"} 3\n' in text
+        assert 'webtools_backend_http_request_seconds_count{service="cliff"} 3\n' in text
+        assert 'webtools_backend_http_request_seconds_sum{service="cliff"} 5.55\n' in text
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+One outbound HTTP transport for the services we call besides Media Cloud (word embeddings, CoreNLP, the NYT labeller,
+Pushshift, YouTube, remote files). Calling `requests.get` and friends directly opens a new connection every time;
+here each service gets its own pooled keep-alive session (see `server.util.clientpool.PooledSession`), so the word
+count pages that ask the embeddings server for positions on every load reuse one connection instead of doing a new
+handshake each time. Sessions ask for gzipped responses (requests does that by default, and the shared session keeps
+it), and every call:
+
+* goes through the service's timeout and circuit breaker (and hedging, if it has it) from `server.util.resilience`
+* is retried a couple of times, after a jittered exponential backoff, if the connection fails or the service says it
+  is overloaded (502, 503, 504 or 429) - only GETs, unless the service's POSTs are lookups that are safe to repeat
+* has how long each attempt took recorded in a per-service latency histogram, for `/api/admin/backend/metrics`
+* never waits past the request's deadline (see `server.util.deadline`), and isn't retried once that has passed
+
+Use it like `requests`: `transport.session_for('word_embeddings').post(url, data=data)`.
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from server.util import deadline
+from server.util.clientpool import PooledSession
+from server.util.resilience import services
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRIES = 2
+BACKOFF_SECONDS = 0.1  # doubled for each retry, with full jitter
+RETRY_STATUSES = [429, 502, 503, 504]
+CONNECTIONS_PER_HOST = 10
+IDLE_SECONDS = 60
+RETRY_POSTS = ['word_embeddings', 'corenlp', 'nyt_labeller']  # their POSTs just look things up
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]  # seconds
+METRIC_PREFIX = 'webtools_backend_http'
+
+
+class LatencyHistograms:
+    """
+    Per-service histograms of how long HTTP requests took, with Prometheus-style cumulative buckets.
+    """
+
+    def __init__(self, buckets=None):
+        self._buckets = buckets or LATENCY_BUCKETS
+        self._lock = threading.Lock()
+        self._histograms = {}  # name -> {'buckets': [count for each bucket, then +Inf], 'count': n, 'sum': seconds}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                name, {'buckets': [0] * (len(self._buckets) + 1), 'count': 0, 'sum': 0.0})
+            for i, upper in enumerate(self._buckets + [float('inf')]):
+                if seconds <= upper:
+                    histogram['buckets'][i] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+
+    def stats(self):
+        with self._lock:
+            return {name: {'buckets': dict(zip([str(b) for b in self._buckets] + ['+Inf'], h['buckets'])),
+                           'count': h['count'], 'sum': h['sum']}
+                    for name, h in self._histograms.items()}
+
+    def as_text(self):
+        """
+        :return: the histograms in the Prometheus text exposition format, so they can be scraped
+        """
+        full_name = '{}_request_seconds'.format(METRIC_PREFIX)
+        lines = ['# HELP {} How long outbound HTTP requests took'.format(full_name),
+                 '# TYPE {} histogram'.format(full_name)]
+        stats = self.stats()
+        for name in sorted(stats.keys()):
+            for upper, count in stats[name]['buckets'].items():
+                lines.append('{}_bucket{{service="{}",le="{}"}} {}'.format(full_name, name, upper, count))
+            lines.append('{}_count{{service="{}"}} {}'.format(full_name, name, stats[name]['count']))
+            lines.append('{}_sum{{service="{}"}} {}'.format(full_name, name, stats[name]['sum']))
+        return "\n".join(lines) + "\n"
+
+
+latencies = LatencyHistograms()
+
+
+def _overloaded(response):
+    return (response.status_code >= 500) or (response.status_code == 429)
+
+
+class ServiceSession:
+    """
+    Sends a service's requests through its own pooled session, with its timeout, circuit breaker and retries.
+    """
+
+    def __init__(self, name, service, retries=DEFAULT_RETRIES, retry_posts=False, histograms=None,
+                 connections_per_host=CONNECTIONS_PER_HOST, sleep=time.sleep):
+        self.name = name
+        self._service = service
+        self._retries = retries
+        self._retry_posts = retry_posts
+        self._histograms = histograms or latencies
+        self._pooled = PooledSession(connections_per_host, IDLE_SECONDS)
+        self._sleep = sleep
+
+    def _can_retry(self, method):
+        return (method in ['GET', 'HEAD']) or ((method == 'POST') and self._retry_posts)
+
+    def _backoff(self, attempt):
+        self._sleep(random.uniform(0, BACKOFF_SECONDS * (2 ** attempt)))
+
+    def _send(self, method, url, timeout=None, **kwargs):
+        attempts = (self._retries + 1) if self._can_retry(method) else 1
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            start = time.perf_counter()
+            try:
+                response = self._pooled.session().request(method, url, timeout=deadline.cap(timeout), **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._histograms.observe(self.name, time.perf_counter() - start)
+                if last_attempt or deadline.expired():
+                    raise
+                logger.info("Retrying %s %s after a connection failure", method, self.name)
+                self._backoff(attempt)
+                continue
+            self._histograms.observe(self.name, time.perf_counter() - start)
+            if last_attempt or deadline.expired() or (response.status_code not in RETRY_STATUSES):
+                return response
+            logger.info("Retrying %s %s after a %d", method, self.name, response.status_code)
+            self._backoff(attempt)
+        return None  # not reached; the last attempt always returns or raises
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self._service.timeout)
+        # the hedging threads don't have the request, so pass its deadline along
+        return self._service.call(self._send_by, deadline.current(), method, url, is_failure=_overloaded, **kwargs)
+
+    def _send_by(self, request_deadline, method, url, **kwargs):
+        with deadline.use(request_deadline):
+            return self._send(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request('POST', url, data=data, **kwargs)
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def session_for(name):
+    """
+    :param name: one of the services in `server.util.resilience.SERVICES`
+    """
+    with _sessions_lock:
+        if name not in _sessions:
+            _sessions[name] = ServiceSession(name, services.get(name), retry_posts=name in RETRY_POSTS)
+        return _sessions[name]
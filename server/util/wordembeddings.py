@@ -1,9 +1,10 @@
-import requests
 import json
 
 from server import config
+from server.util.transport import session_for
 
-# Helpers for accessing data from the Media Cloud Word Embeddings server
+# Helpers for accessing data from the Media Cloud Word Embeddings server. These raise a ServiceUnavailable if it is down
+# or slow; callers that can do without the embeddings should catch that and leave them out.
 
 
 def google_news_2d(words):
@@ -25,7 +26,8 @@ def topic_similar_words(topics_id, snapshots_id, words):
 
 
 def _query_for_json(endpoint, data):
-    response = requests.post("{}{}".format(config.get('WORD_EMBEDDINGS_SERVER_URL'), endpoint), data=data)
+    response = session_for('word_embeddings').post("{}{}".format(config.get('WORD_EMBEDDINGS_SERVER_URL'), endpoint),
+                                                   data=data)
     try:
         response_json = response.json()
         if 'results' in response_json:
@@ -15,20 +15,12 @@ logger = logging.getLogger(__name__)
 @api_error_handler
 @flask_login.login_required
 def api_admin_top_stats(the_type, the_action):
-    raw_results = analytics_db.top(the_type, the_action)
-    results = []
-    for row in raw_results:
-        if the_action in row:
-            if the_type == analytics_db.TYPE_MEDIA:
-                results.append({
-                    'item': apicache.media(row['id']),
-                    'type': analytics_db.TYPE_MEDIA,
-                    'count': row[the_action]
-                })
-            elif the_type == analytics_db.TYPE_COLLECTION:
-                results.append({
-                    'item': apicache.collection(row['id']),
-                    'type': analytics_db.TYPE_COLLECTION,
-                    'count': row[the_action]
-                })
+    rows = [row for row in analytics_db.top(the_type, the_action) if the_action in row]
+    if the_type == analytics_db.TYPE_MEDIA:
+        items = apicache.media_many([row['id'] for row in rows])
+    elif the_type == analytics_db.TYPE_COLLECTION:
+        items = apicache.collections_many([row['id'] for row in rows])
+    else:
+        return jsonify({'list': []})
+    results = [{'item': item, 'type': the_type, 'count': row[the_action]} for row, item in zip(rows, items)]
     return jsonify({'list': results})
@@ -0,0 +1,37 @@
+import logging
+from flask import jsonify, Response
+import flask_login
+
+from server import app, backend_limiter
+from server.auth import user_has_auth_role, ROLE_ADMIN_READ_ONLY
+from server.util.request import api_error_handler, json_error_response
+from server.util.resilience import services
+from server.util.transport import latencies
+
+logger = logging.getLogger(__name__)
+
+
+@app.route('/api/admin/backend/stats', methods=['GET'])
+@api_error_handler
+@flask_login.login_required
+def api_admin_backend_stats():
+    # the current limit on calls to Media Cloud and how many are waiting for a slot at each priority, plus the timeouts,
+    # hedging and circuit breaker state of every service we call out to, and how long their requests have taken
+    if not user_has_auth_role(ROLE_ADMIN_READ_ONLY):
+        return json_error_response("You don't have permission to see backend stats", 403)
+    return jsonify({
+        'limiter': backend_limiter.stats(),
+        'services': services.stats(),
+        'latencies': latencies.stats(),
+    })
+
+
+@app.route('/api/admin/backend/metrics', methods=['GET'])
+@api_error_handler
+@flask_login.login_required
+def api_admin_backend_metrics():
+    # the same stats, in a format Prometheus can scrape
+    if not user_has_auth_role(ROLE_ADMIN_READ_ONLY):
+        return json_error_response("You don't have permission to see backend metrics", 403)
+    return Response(backend_limiter.as_text() + services.as_text() + latencies.as_text(),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,30 @@
+import logging
+from flask import jsonify, Response
+import flask_login
+
+from server import app
+from server.auth import user_has_auth_role, ROLE_ADMIN_READ_ONLY
+from server.cache import cache_stats, metrics
+from server.util.request import api_error_handler, json_error_response
+
+logger = logging.getLogger(__name__)
+
+
+@app.route('/api/admin/cache/stats', methods=['GET'])
+@api_error_handler
+@flask_login.login_required
+def api_admin_cache_stats():
+    # per-namespace hit rates, fill latency, value sizes and lock waits for this worker process
+    if not user_has_auth_role(ROLE_ADMIN_READ_ONLY):
+        return json_error_response("You don't have permission to see cache stats", 403)
+    return jsonify(cache_stats())
+
+
+@app.route('/api/admin/cache/metrics', methods=['GET'])
+@api_error_handler
+@flask_login.login_required
+def api_admin_cache_metrics():
+    # the same metrics, in a format Prometheus can scrape
+    if not user_has_auth_role(ROLE_ADMIN_READ_ONLY):
+        return json_error_response("You don't have permission to see cache metrics", 403)
+    return Response(metrics.as_text(), mimetype='text/plain; version=0.0.4; charset=utf-8')
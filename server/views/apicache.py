@@ -4,24 +4,46 @@ to the user (ie. it is a cross-user cache). This is because we don't have visibi
 like stories, sources, etc.
 """
 
+import logging
+
 from server import TOOL_API_KEY
-from server.cache import cache
+from server.cache import cache, STALE_AFTER, NEGATIVE_TTL
+from server.cache.dependencies import media_dependency, collection_dependency
+from server.cache.loader import request_loader, chunked
 import server.util.wordembeddings as wordembeddings
 from server.auth import user_mediacloud_client, user_admin_mediacloud_client, user_is_admin
 from server.util.tags import is_bad_theme, TagSetDiscoverer
+from server.util.concurrency import gather, Call
+from server.util.resilience import ServiceUnavailable
+
+logger = logging.getLogger(__name__)
+
+# how long to hold small, hot, rarely-changing results in each worker's in-process cache (in front of Redis)
+LOCAL_CACHE_SECONDS = 60 * 5
+
+STORY_BATCH_SIZE = 100  # stories to ask for in each storyList call when looking them up by id
 
 
 def media(media_id):
     return _cached_media(None, media_id)
 
 
+def media_many(media_ids):
+    # one cache round trip for all of them; only the misses go to the back-end
+    return cache.get_or_create_many(_cached_media, [(None, media_id) for media_id in media_ids])
+
+
 def get_media_with_key(mc_api_key, media_id):
     # in Response contexts we can't automatically fetch the user_key from the session, so we have to support
     # a way to pass it in intentionally
     return _cached_media(mc_api_key, media_id)
 
 
-@cache.cache_on_arguments()
+def _media_dependencies(_media, _mc_api_key, media_id):
+    return [media_dependency(media_id)]
+
+
+@cache.cache_on_arguments(local_expiration_time=LOCAL_CACHE_SECONDS, depends_on=_media_dependencies)
 def _cached_media(mc_api_key, media_id):
     # api_key passed in just to make this a user-level cache
     user_mc = user_mediacloud_client(mc_api_key)
@@ -37,7 +59,20 @@ def tag(tags_id):
     return _cached_tag(tags_id)
 
 
-@cache.cache_on_arguments()
+def tags_many(tags_ids):
+    # one cache round trip for all of them; only the misses go to the back-end
+    return cache.get_or_create_many(_cached_tag, [(tags_id,) for tags_id in tags_ids])
+
+
+def collections_many(tags_ids):
+    return tags_many(tags_ids)
+
+
+def _tag_dependencies(_tag, tags_id):
+    return [collection_dependency(tags_id)]
+
+
+@cache.cache_on_arguments(local_expiration_time=LOCAL_CACHE_SECONDS, depends_on=_tag_dependencies)
 def _cached_tag(tags_id):
     user_mc = user_mediacloud_client()
     return user_mc.tag(tags_id)
@@ -48,7 +83,7 @@ def story_count(q, fq, **kwargs):
     return _cached_story_count(q, fq, http_method='POST', **kwargs)
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(expiration_time=STALE_AFTER, negative_ttl=NEGATIVE_TTL)
 def _cached_story_count(q, fq, **kwargs):
     # api_key passed in to make this a user-level cache
     user_mc = user_mediacloud_client()
@@ -60,15 +95,58 @@ def word_count(q, fq, **kwargs):
     return _cached_word_count(q, fq, http_method='POST', **kwargs)
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(expiration_time=STALE_AFTER)
 def _cached_word_count(q, fq, **kwargs):
     # api_key passed in just to make this a user-level cache
     user_mc = user_mediacloud_client()
     return user_mc.wordCount(solr_query=q, solr_filter=fq,  **kwargs)
 
 
-def story(stories_id, **kwargs):
-    return _cached_story(None, stories_id, **kwargs)
+def story(stories_id, text=False):
+    found = stories_many([stories_id], text=text)[0]
+    if found is None:
+        # not in the search index (yet?), so ask for it directly
+        return _cached_story(None, stories_id, text=True) if text else _cached_story(None, stories_id)
+    return found
+
+
+def stories_many(stories_ids, api_key=None, text=False):
+    """
+    Stories by id, in the same order (None for any the search doesn't find). Every story looked up by id while
+    answering a request is batched together (see server.cache.loader), the cache is read for all of them at once,
+    and the misses are fetched with one storyList call per STORY_BATCH_SIZE of them. Each story is cached on its own.
+    :param api_key: the key to fetch them with, for Response contexts where we can't read it out of the session
+    """
+    def load_many(ids):
+        return cache.get_or_create_many(_cached_story_by_id, [(stories_id, text) for stories_id in ids],
+                                        create_many=lambda args_list: _story_list_by_ids(api_key, args_list))
+    loader = request_loader('stories|text={}|key={}'.format(text, api_key), load_many)
+    return loader.load_many([int(stories_id) for stories_id in stories_ids])
+
+
+def _story_client(api_key, text):
+    # full text is only available to admins (or with the tool key)
+    if text or (api_key == TOOL_API_KEY) or ((api_key is None) and user_is_admin()):
+        return user_admin_mediacloud_client(api_key)
+    return user_mediacloud_client(api_key)
+
+
+def _story_list_by_ids(api_key, args_list):
+    text = args_list[0][1]
+    user_mc = _story_client(api_key, text)
+    ids = [stories_id for stories_id, _text in args_list]
+    stories_by_id = {}
+    for chunk in chunked(ids, STORY_BATCH_SIZE):
+        q = "stories_id:({})".format(" ".join([str(stories_id) for stories_id in chunk]))
+        stories = user_mc.storyList(q, rows=len(chunk), text=True) if text else user_mc.storyList(q, rows=len(chunk))
+        stories_by_id.update({s['stories_id']: s for s in stories})
+    return [stories_by_id.get(stories_id) for stories_id in ids]
+
+
+@cache.cache_on_arguments(expiration_time=STALE_AFTER)
+def _cached_story_by_id(stories_id, text):
+    # the per-story cache entries that stories_many fills in batches (calling this directly works too, just unbatched)
+    return stories_many([stories_id], text=text)[0]
 
 
 def story_raw_1st_download(api_key, stories_id):
@@ -83,7 +161,12 @@ def _cached_story(api_key, stories_id, **kwargs):
 
 
 def word2vec_google_2d(words):
-    return _cached_word2vec_google_2d(words)
+    # the embeddings are a nice-to-have, so if their server is down just leave them out (and don't cache that)
+    try:
+        return _cached_word2vec_google_2d(words)
+    except ServiceUnavailable as e:
+        logger.warning(e.message)
+        return []
 
 
 @cache.cache_on_arguments()
@@ -98,7 +181,7 @@ def tag_set(tag_sets_id):
     return _cached_tag_set(tag_sets_id)
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(local_expiration_time=LOCAL_CACHE_SECONDS)
 def _cached_tag_set(tag_sets_id):
     user_mc = user_mediacloud_client()
     return user_mc.tagSet(tag_sets_id)
@@ -115,7 +198,7 @@ def top_tags(q, fq, tag_sets_id, sample_size=None):
     return tags
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(expiration_time=STALE_AFTER)
 def _cached_top_tags(q, fq, tag_sets_id, sample_size=None):
     # post it so long queries work
     user_mc = user_mediacloud_client()
@@ -135,9 +218,10 @@ def _cached_story_list(api_key, q, fq, **kwargs):
 
 
 def tag_set_coverage(total_q, subset_q, fq):
+    totals, counts = gather([Call(story_count, total_q, fq), Call(story_count, subset_q, fq)])
     coverage = {
-        'totals': story_count(total_q, fq)['count'],
-        'counts': story_count(subset_q, fq)['count'],
+        'totals': totals['count'],
+        'counts': counts['count'],
     }
     coverage['coverage_percentage'] = 0 if coverage['totals'] == 0 else float(coverage['counts'])/float(coverage['totals'])
     return coverage
@@ -157,7 +241,7 @@ def stats():
     return cached_stats()
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(local_expiration_time=LOCAL_CACHE_SECONDS)
 def cached_stats():
     user_mc = user_mediacloud_client()
     return user_mc.stats()
@@ -3,6 +3,7 @@ from server.cache import cache
 from server.auth import user_admin_mediacloud_client
 from server.views.explorer import dates_as_filter_query
 from server.util.api_helper import combined_split_and_normalized_counts, add_missing_dates_to_split_story_counts
+from server.util.concurrency import gather, Call
 from server.util.tags import processed_for_entities_query_clause, processed_for_themes_query_clause, \
     TagSetDiscoverer
 import server.views.apicache as base_apicache
@@ -39,24 +40,25 @@ def _cached_sentence_list(mc_api_key, q, fq, rows, include_stories=True):
     # need to get an admin client with the tool key so they have sentence read permissions
     tool_mc = user_admin_mediacloud_client(mc_api_key)
     sentences = tool_mc.sentenceList(q, fq, sort=mc.SORT_RANDOM)[:rows]
-    stories_id_list = [str(s['stories_id']) for s in sentences]
-    if (len(stories_id_list) > 0) and include_stories:
-        # this is the fastest way to get a list of stories by id
-        stories = base_apicache.story_list(mc_api_key, "stories_id:({})".format(" ".join(stories_id_list)), None)
-        stories_by_id = {s['stories_id']: s for s in stories}  # build a quick lookup table by stories_id
-        for s in sentences:
-            s['story'] = stories_by_id[s['stories_id']]
+    if (len(sentences) > 0) and include_stories:
+        stories = base_apicache.stories_many([s['stories_id'] for s in sentences], api_key=mc_api_key)
+        for s, story in zip(sentences, stories):
+            s['story'] = story
     return sentences
 
 
 def top_tags_with_coverage(q, fq, tag_sets_id, limit=TAG_SAMPLE_SIZE):
-    tag_counts = base_apicache.top_tags(q, fq, tag_sets_id, sample_size=TAG_COUNT_SAMPLE_SIZE)
     if int(tag_sets_id) in [TagSetDiscoverer().cliff_places_set, TagSetDiscoverer().cliff_orgs_set, TagSetDiscoverer().cliff_people_set]:
-        coverage = base_apicache.tag_set_coverage(q, '({}) AND {}'.format(q, processed_for_entities_query_clause()), fq)
+        processed_clause = processed_for_entities_query_clause()
     elif int(tag_sets_id) == TagSetDiscoverer().nyt_themes_set:
-        coverage = base_apicache.tag_set_coverage(q, '({}) AND {}'.format(q, processed_for_themes_query_clause()), fq)
+        processed_clause = processed_for_themes_query_clause()
     else:
         raise RuntimeError("Unknown tag_sets_id for computing coverage: {}".format(tag_sets_id))
+    # the tag counts and the coverage counts don't depend on each other
+    tag_counts, coverage = gather([
+        Call(base_apicache.top_tags, q, fq, tag_sets_id, sample_size=TAG_COUNT_SAMPLE_SIZE),
+        Call(base_apicache.tag_set_coverage, q, '({}) AND {}'.format(q, processed_clause), fq),
+    ])
     for t in tag_counts:  # add in pct of what's been run through CLIFF to total results
         try:
             t['pct'] = float(t['count']) / coverage['counts']
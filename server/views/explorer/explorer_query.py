@@ -18,8 +18,7 @@ logger = logging.getLogger(__name__)
 def api_explorer_sources_by_ids():
     source_list = []
     source_id_array = request.args['sources[]'].split(',')
-    for media_id in source_id_array:
-        info = base_apicache.media(media_id)
+    for media_id, info in zip(source_id_array, base_apicache.media_many(source_id_array)):
         info['id'] = int(media_id)
         source_list.append(info)
     return jsonify({"results": source_list})
@@ -42,8 +41,7 @@ def api_explorer_collections_by_ids():
     else:
         collection_ids = request.args['collections[]'].split(',')
         collection_list = []
-        for tags_id in collection_ids:
-            info = base_apicache.collection(tags_id)
+        for tags_id, info in zip(collection_ids, base_apicache.collections_many(collection_ids)):
             info['id'] = int(tags_id)
             collection_list.append(info)
     return jsonify({"results": collection_list})
@@ -68,8 +66,7 @@ def api_explorer_searches_by_ids():
             metadata_tag['id'] = int(key_tag_set)
             tag_set_tag_obj['tags'][metadata_tag['name']] = []
             search_tags = []
-            for t in tags:
-                tag_info = base_apicache.tag(t)
+            for tag_info in base_apicache.tags_many(tags):
                 tag_info['value'] = True  # test before
                 search_tags.append(tag_info)
             tag_set_tag_obj['tags'][metadata_tag['name']] = search_tags
@@ -10,6 +10,7 @@ import server.util.csv as csv
 import server.util.tags as tag_util
 from server.auth import user_mediacloud_key
 from server.platforms.reddit_pushshift import RedditPushshiftProvider,  NEWS_SUBREDDITS
+from server.util.limiter import bulk
 from server.util.request import api_error_handler
 from server.views.explorer import only_queries_reddit, parse_query_dates, \
     parse_query_with_keywords, file_name_for_download
@@ -34,8 +35,10 @@ def api_explorer_story_sample():
         solr_q, solr_fq = parse_query_with_keywords(request.form)
         results = base_cache.story_list(None, solr_q, solr_fq, rows=SAMPLE_STORY_COUNT,
                                         sort=MediaCloud.SORT_RANDOM)
-        for story in results:  # add in media info so we can show it to user if they click into the drill-down
-            story["media"] = base_cache.media(story["media_id"])
+        # add in media info so we can show it to user if they click into the drill-down
+        media = base_cache.media_many([story["media_id"] for story in results])
+        for story, story_media in zip(results, media):
+            story["media"] = story_media
     return jsonify({"results": results})
 
 
@@ -80,6 +83,7 @@ def _stream_story_list_csv(filename, q, fq, stories_per_page=500, sort=MediaClou
 
 
 # generator you can use to handle a long list of stories row by row (one row per story)
+@bulk
 def _story_list_by_page_as_csv_row(api_key, q, fq, stories_per_page, sort, page_limit, props):
     yield ','.join(props) + '\n'  # first send the column names
     for page in _story_list_by_page(api_key, q, fq, stories_per_page, sort, page_limit):
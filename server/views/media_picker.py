@@ -51,7 +51,7 @@ def api_mediapicker_source_search():
         # group the tags by tags_sets_id to support boolean searches
         # the format for this metadata is a list of tags_id. the following finds the right metadata tag set for the tags
         tags_id_list = tags_ids.split(',')
-        tags = [base_api_cache.tag(tid) for tid in tags_id_list]  # ok to use cache here (metadata tags don't change)
+        tags = base_api_cache.tags_many(tags_id_list)  # ok to use cache here (metadata tags don't change)
         tags_by_set = defaultdict(list)
         for tag in tags:
             tags_by_set[tag['tag_sets_id']].append(tag['tags_id'])
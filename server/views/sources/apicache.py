@@ -4,7 +4,9 @@ import operator
 import server.util.tags as tags
 from server import mc
 from server.auth import user_mediacloud_client
-from server.cache import cache
+from server.cache import cache, STALE_AFTER
+from server.cache.policy import ONE_HOUR
+from server.cache.dependencies import collection_dependency, media_dependency
 from server.util.api_helper import add_missing_dates_to_split_story_counts
 from server.views.stories import QUERY_LAST_MONTH
 
@@ -25,7 +27,11 @@ def featured_collections():
     return _cached_featured_collection_list()
 
 
-@cache.cache_on_arguments()
+def _featured_collection_dependencies(collections):
+    return [collection_dependency(c['tags_id']) for c in collections]
+
+
+@cache.cache_on_arguments(depends_on=_featured_collection_dependencies)
 def _cached_featured_collection_list():
     return [mc.tag(tags_id) for tags_id in tags.TagDiscoverer().featured_collection_tags]
 
@@ -34,11 +40,26 @@ def collection_source_representation(mc_api_key, collection_id, sample_size, fq)
     return _cached_collection_source_representation(mc_api_key, collection_id, sample_size, fq)
 
 
-def invalidate_collection_source_representation_cache(mc_api_key, collection_id):
-    _cached_collection_source_representation.invalidate(mc_api_key, collection_id)
+def invalidate_collection(collection_id, changed_media_ids=None):
+    # clear out everything that shows the collection, or the sources that were added to or removed from it
+    dependencies = [collection_dependency(collection_id)]
+    dependencies += [media_dependency(media_id) for media_id in (changed_media_ids or [])]
+    cache.invalidate_dependencies(*dependencies)
 
 
-@cache.cache_on_arguments()
+def invalidate_source(media_id, collection_ids=None):
+    # clear out everything that shows the source, and the collections it is in (or was just added to or removed from),
+    # since their source lists show its details too
+    dependencies = [media_dependency(media_id)]
+    dependencies += [collection_dependency(tags_id) for tags_id in (collection_ids or [])]
+    cache.invalidate_dependencies(*dependencies)
+
+
+def _collection_dependencies(_representation, _mc_api_key, collection_id, *_args):
+    return [collection_dependency(collection_id)]
+
+
+@cache.cache_on_arguments(expiration_time=STALE_AFTER, depends_on=_collection_dependencies)
 def _cached_collection_source_representation(mc_api_key, collection_id, sample_size=1000, fq=''):
     # have to respect the api here here because only some folks can see private collections
     user_mc = user_mediacloud_client(mc_api_key)
@@ -64,7 +85,7 @@ def timeperiod_story_count(query, time_period):
     return _cached_timeperiod_story_count(query, time_period)
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(ttl=ONE_HOUR)  # the time period is relative to now, so this goes out of date quickly
 def _cached_timeperiod_story_count(q='*', time_period=QUERY_LAST_MONTH):
     # sources are open to everyone, so no need for user-specific cache
     # Helper to fetch split story counts over a timeframe for an arbitrary query
@@ -99,7 +120,7 @@ def split_story_count(q='*', last_n_days=None):
     return results
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(expiration_time=STALE_AFTER)
 def _cached_split_story_counts(q='*', fq=''):
     # sources are open to everyone, so no need for user-specific cache
     # Helper to fetch split story counts over a timeframe for an arbitrary query
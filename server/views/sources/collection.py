@@ -10,6 +10,8 @@ from server import app, mc, user_db, analytics_db, executor
 from server.auth import user_mediacloud_key, user_admin_mediacloud_client, user_mediacloud_client, user_name,\
     user_has_auth_role, ROLE_MEDIA_EDIT
 from server.util.request import arguments_required, form_fields_required, api_error_handler
+from server.util.limiter import bulk
+from server.util.deadline import or_partial, is_partial
 from server.util.tags import TagSetDiscoverer, media_with_tag
 from server.util.stringutil import as_tag_name
 from server.views.sources import SOURCE_LIST_CSV_EDIT_PROPS, SOURCE_FEED_LIST_CSV_PROPS
@@ -204,6 +206,7 @@ def api_collection_sources_feed_status_csv(collection_id, source_type):
 
 
 @executor.job
+@bulk
 def _media_list_edit_job(media):
     user_mc = user_admin_mediacloud_client()
     # latest scrape job
@@ -230,7 +233,7 @@ def _media_list_edit_job(media):
 def collection_source_story_split_historical_counts(collection_id):
     # need to turn the generator into objects before returning to json
     results = [r for r in _collection_source_story_split_historical_counts(collection_id)]
-    return jsonify({'counts': results})
+    return jsonify({'counts': results, 'partial': is_partial()})
 
 
 @app.route('/api/collections/<collection_id>/sources/story-split/historical-counts.csv')
@@ -256,6 +259,8 @@ def collection_source_story_split_historical_counts_csv(collection_id):
 
 
 @executor.job
+@bulk
+@or_partial()
 def _source_story_split_count_job(info):
     source = info['media']
     q = "media_id:{}".format(source['media_id'])
@@ -275,8 +280,8 @@ def _collection_source_story_split_historical_counts(collection_id):
     jobs = [{'media': m} for m in media_list]
     # fetch in parallel to make things faster
     #return [_source_story_split_count_job(j) for j in jobs]
-    # make sure to execute the generator so what is returned is real data
-    return [d for d in _source_story_split_count_job.map(jobs)]
+    # make sure to execute the generator so what is returned is real data (leaving out sources we ran out of time for)
+    return [d for d in _source_story_split_count_job.map(jobs) if d is not None]
 
 
 def _tag_set_info(tag_sets_id):
@@ -6,10 +6,11 @@ from mediacloud.tags import MediaTag, TAG_ACTION_ADD, TAG_ACTION_REMOVE
 import csv as pycsv
 
 from server import app, config, TOOL_API_KEY, executor
-from server.auth import user_admin_mediacloud_client, user_mediacloud_key, user_name
+from server.auth import user_admin_mediacloud_client, user_name
 from server.util.config import ConfigException
 from server.util.csv import SOURCE_LIST_CSV_METADATA_PROPS
 from server.util.file import save_file_to_upload_folder
+from server.util.limiter import bulk
 from server.util.mail import send_html_email
 from server.util.request import csv_required, form_fields_required, api_error_handler
 from server.util.tags import TagSetDiscoverer, tags_in_tag_set, media_with_tag
@@ -55,7 +56,7 @@ def collection_update(collection_id):
     tags = tags_to_add + tags_to_remove
     if len(tags) > 0:
         user_mc.tagMedia(tags)
-        apicache.invalidate_collection_source_representation_cache(user_mediacloud_key(), collection_id)
+    apicache.invalidate_collection(collection_id, source_ids_to_add + source_ids_to_remove)
     return jsonify(updated_collection['tag'])
 
 
@@ -80,7 +81,7 @@ def remove_sources_from_collection(collection_id):
     if len(current_media) > 0:
         results = user_mc.tagMedia(current_media)
 
-    apicache.invalidate_collection_source_representation_cache(user_mediacloud_key(), collection_id)
+    apicache.invalidate_collection(collection_id, source_ids_to_remove)
     return jsonify(results)
 
 
@@ -185,6 +186,7 @@ def _update_source_worker2(source_info):
 
 
 @executor.job
+@bulk
 def _update_source_job(source_info):
     # worker function to help update sources in parallel
     user_mc = user_admin_mediacloud_client()
@@ -199,6 +201,7 @@ def _update_source_job(source_info):
 
 
 @executor.job
+@bulk
 def _create_media_job(media_list):
     user_mc = user_admin_mediacloud_client()
     return user_mc.mediaCreate(media_list)
@@ -310,6 +313,7 @@ def _email_batch_source_update_results(audit_feedback):
 
 # worker for process pool to send tags requests in parallel
 @executor.job
+@bulk
 def _tag_media_job(tags):
     user_mc = user_admin_mediacloud_client()
     user_mc.tagMedia(tags=tags, clear_others=True)  # make sure to clear any other values set in this metadata tag set
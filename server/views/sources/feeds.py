@@ -6,6 +6,7 @@ from server import app
 import server.util.csv as csv
 from server.auth import user_admin_mediacloud_client
 from server.util.request import api_error_handler
+import server.views.sources.apicache as apicache
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +47,7 @@ def feed_create(media_id):
     active = request.form['active'] if 'active' in request.form else None  # this is optional
 
     result = user_mc.feedCreate(media_id, name, url, feed_type, active)
+    apicache.invalidate_source(media_id)  # the source info includes feed counts
     return jsonify(result)
 
 
@@ -9,6 +9,7 @@ from server import app, user_db, analytics_db
 from server.cache import cache
 from server.auth import user_mediacloud_key, user_admin_mediacloud_client, user_name, user_has_auth_role, ROLE_MEDIA_EDIT
 from server.util.request import arguments_required, form_fields_required, api_error_handler
+from server.util.concurrency import gather, Call
 from server.util.tags import TagSetDiscoverer, is_metadata_tag_set
 import server.views.sources.apicache as apicache
 from server.views.favorites import add_user_favorite_flag_to_sources, add_user_favorite_flag_to_collections
@@ -52,24 +53,27 @@ def source_set_favorited(media_id):
 def source_stats(media_id):
     username = user_name()
     results = {}
-    # story count
     media_query = "(media_id:{})".format(media_id)
-    source_specific_story_count = apicache.source_story_count(media_query)
-    results['story_count'] = source_specific_story_count
+    # these are all independent, so make the calls at the same time
+    story_count, media_health, info, geo_pct, nyt_pct = gather([
+        Call(apicache.source_story_count, media_query),
+        Call(_cached_media_source_health, username, media_id),
+        Call(_media_source_details, media_id),
+        Call(apicache.tag_coverage_pct, media_query, TagSetDiscoverer().cliff_versions_set),  # geography tags
+        Call(apicache.tag_coverage_pct, media_query, TagSetDiscoverer().nyt_themes_versions_set),  # nyt themes
+    ])
+    # story count
+    results['story_count'] = story_count
     # health
-    media_health = _cached_media_source_health(username, media_id)
     results['num_stories_90'] = media_health['num_stories_90'] if 'num_stories_90' in media_health else None
     results['start_date'] = media_health['start_date'] if 'start_date' in media_health else None
-    info = _media_source_details(media_id)
     user_can_see_private_collections = user_has_auth_role(ROLE_MEDIA_EDIT)
     visible_collections = [c for c in info['media_source_tags']
                            if ((c['tag_sets_id'] in TagSetDiscoverer().collection_sets()) and
                                ((c['show_on_media'] == 1) or user_can_see_private_collections))]
     results['collection_count'] = len(visible_collections)
-    # geography tags
-    results['geoPct'] = apicache.tag_coverage_pct(media_query, TagSetDiscoverer().cliff_versions_set)
-    # nyt theme
-    results['nytPct'] = apicache.tag_coverage_pct(media_query, TagSetDiscoverer().nyt_themes_versions_set)
+    results['geoPct'] = geo_pct
+    results['nytPct'] = nyt_pct
     return jsonify(results)
 
 
@@ -218,12 +222,12 @@ def source_update(media_id):
         'is_monitored': monitored, 'public_notes': public_notes})
     # now we need to update the collections separately, because they are tags on the media source
     source = user_mc.media(media_id)
-    existing_tag_ids = [t['tags_id'] for t in source['media_source_tags']
-                        if t['tag_sets_id'] in TagSetDiscoverer().collection_sets()]
+    existing_collection_ids = [t['tags_id'] for t in source['media_source_tags']
+                               if t['tag_sets_id'] in TagSetDiscoverer().collection_sets()]
     tag_ids_to_add = tag_ids_from_collections_param()
-    tag_ids_to_remove = list(set(existing_tag_ids) - set(tag_ids_to_add))
+    tag_ids_to_remove = list(set(existing_collection_ids) - set(tag_ids_to_add))
     tags_to_add = [MediaTag(media_id, tags_id=cid, action=TAG_ACTION_ADD)
-                   for cid in tag_ids_to_add if cid not in existing_tag_ids]
+                   for cid in tag_ids_to_add if cid not in existing_collection_ids]
     tags_to_remove = [MediaTag(media_id, tags_id=cid, action=TAG_ACTION_REMOVE) for cid in tag_ids_to_remove]
     tags = tags_to_add + tags_to_remove
     if len(tags) > 0:   # don't make extraneous calls
@@ -245,6 +249,8 @@ def source_update(media_id):
             # need to add it and clear out the other
             tag = MediaTag(media_id, tags_id=metadata_tag_id, action=TAG_ACTION_ADD)
             user_mc.tagMedia([tag], clear_others=True)
+    # every collection it is in (before or after) lists its name and url, not just the ones it was added to or removed from
+    apicache.invalidate_source(media_id, list(set(existing_collection_ids) | set(tag_ids_to_add)))
     # result the success of the media update call - would be better to catch errors in any of these calls...
     return jsonify(result)
 
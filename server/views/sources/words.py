@@ -17,13 +17,9 @@ def stream_wordcount_csv(user_mc_key, filename, q, fq):
 
 
 def word_count(user_mc_key, q, fq, num_words=WORD_COUNT_UI_NUM_WORDS, sample_size=WORD_COUNT_SAMPLE_SIZE):
-    return _cached_word_count(user_mc_key, q, fq, num_words, sample_size)
-
-
-@cache.cache_on_arguments()
-def _cached_word_count(user_mc_key, q, fq, num_words, sample_size=WORD_COUNT_SAMPLE_SIZE):
-    api_client = mc if user_mc_key is None else user_admin_mediacloud_client()
-    word_data = api_client.wordCount(q, fq, num_words=num_words, sample_size=sample_size)
+    word_data = _cached_word_count(user_mc_key, q, fq, num_words, sample_size)
+    # the embeddings are added outside the cache (they're cached on their own), so if their server is down we don't
+    # cache the counts without them
     words = [w['term'] for w in word_data]
     word2vec_data = base_apicache.word2vec_google_2d(words)
     try:
@@ -34,3 +30,9 @@ def _cached_word_count(user_mc_key, q, fq, num_words, sample_size=WORD_COUNT_SAM
         logger.warning("Didn't get valid data back from word2vec call")
         logger.exception(e)
     return word_data
+
+
+@cache.cache_on_arguments()
+def _cached_word_count(user_mc_key, q, fq, num_words, sample_size=WORD_COUNT_SAMPLE_SIZE):
+    api_client = mc if user_mc_key is None else user_admin_mediacloud_client()
+    return api_client.wordCount(q, fq, num_words=num_words, sample_size=sample_size)
@@ -0,0 +1,73 @@
+import unittest
+from unittest import mock
+
+from mediacloud.error import MCException
+
+from server import TOOL_API_KEY
+from server.cache.access import ADMIN_ACCESS, PUBLIC_ACCESS, topic_readers_access
+import server.views.topics.apicache as apicache
+
+PUBLIC_TOPIC = 1
+PRIVATE_TOPIC = 2
+MISSING_TOPIC = 3
+
+# what each user's key gets back when it asks about each topic (see _cached_topic_access)
+PERMISSIONS = {
+    'reader-key': {PUBLIC_TOPIC: None, PRIVATE_TOPIC: 'read'},
+    'writer-key': {PUBLIC_TOPIC: None, PRIVATE_TOPIC: 'write'},
+    'outsider-key': {PUBLIC_TOPIC: None, PRIVATE_TOPIC: 'none'},
+}
+
+
+def _fake_topic_access(user_mc_key, topics_id):
+    if topics_id == MISSING_TOPIC:
+        raise MCException("Topic not found", 404)
+    return {'is_public': topics_id == PUBLIC_TOPIC, 'user_permission': PERMISSIONS[user_mc_key][topics_id]}
+
+
+class TopicAccessClassTest(unittest.TestCase):
+    """
+    The real access classifier behind `shared_by=topic_access_class`, with the calls it makes to the back-end mocked.
+    """
+
+    def setUp(self):
+        patchers = [
+            mock.patch.object(apicache, '_cached_topic_access', side_effect=_fake_topic_access),
+            mock.patch.object(apicache, 'mc_key_has_auth_role',
+                              side_effect=lambda user_mc_key, role: user_mc_key == 'admin-key'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def testToolKey(self):
+        assert apicache.topic_access_class(TOOL_API_KEY, PRIVATE_TOPIC) == TOOL_API_KEY
+
+    def testAdmin(self):
+        assert apicache.topic_access_class('admin-key', PRIVATE_TOPIC) == ADMIN_ACCESS
+
+    def testPublic(self):
+        for user_mc_key in PERMISSIONS:
+            assert apicache.topic_access_class(user_mc_key, PUBLIC_TOPIC) == PUBLIC_ACCESS
+
+    def testReaders(self):
+        assert apicache.topic_access_class('reader-key', PRIVATE_TOPIC) == topic_readers_access(PRIVATE_TOPIC)
+        assert apicache.topic_access_class('writer-key', PRIVATE_TOPIC) == topic_readers_access(PRIVATE_TOPIC)
+
+    def testNoReadPermission(self):
+        assert apicache.topic_access_class('outsider-key', PRIVATE_TOPIC) == 'outsider-key'
+
+    def testErrorsFallBackToOwnKey(self):
+        assert apicache.topic_access_class('reader-key', MISSING_TOPIC) == 'reader-key'
+
+    def testCantReadOutsideClass(self):
+        # nobody who can't read the topic shares a class (and so cached results) with anyone else
+        classes = {user_mc_key: apicache.topic_access_class(user_mc_key, PRIVATE_TOPIC)
+                   for user_mc_key in list(PERMISSIONS.keys()) + ['admin-key', TOOL_API_KEY]}
+        assert classes['outsider-key'] not in [c for key, c in classes.items() if key != 'outsider-key']
+        assert classes['reader-key'] != classes['admin-key']
+        assert len(set(classes.values())) == 4  # readers, outsider, admins, tool
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,11 +5,17 @@ import mediacloud.error
 
 from server import mc, TOOL_API_KEY
 from server.views import WORD_COUNT_SAMPLE_SIZE, WORD_COUNT_UI_NUM_WORDS
-from server.cache import cache
+from server.cache import cache, STALE_AFTER, NEGATIVE_TTL
+from server.cache.policy import immutable_when
+from server.cache.memo import request_memoized
+from server.cache.dependencies import topic_snapshot_dependency, topic_permissions_dependency
+from server.cache.access import ADMIN_ACCESS, PUBLIC_ACCESS, topic_readers_access
 from server.util.tags import TagDiscoverer
 import server.util.wordembeddings as wordembeddings
-from server.auth import user_mediacloud_client, user_admin_mediacloud_client, user_mediacloud_key
+from server.auth import user_mediacloud_client, user_admin_mediacloud_client, user_mediacloud_key, \
+    mc_key_has_auth_role, ROLE_ADMIN
 from server.util.request import filters_from_args
+from server.util.resilience import ServiceUnavailable
 from server.util.api_helper import add_missing_dates_to_split_story_counts
 from server.views.topics import stories_args_from_request
 from server.views.topics.foci.focalsets import is_url_sharing_focal_set
@@ -26,6 +32,106 @@ TOPIC_STORY_LIST_API_PARAMS = [
     'stories_id',
 ]
 
+SNAPSHOT_STATE_QUEUED = 'queued'
+SNAPSHOT_STATE_RUNNING = 'running'
+SNAPSHOT_STATE_COMPLETED = 'completed'
+
+# how long to cache metadata (ie. timespans) about a snapshot that isn't done yet, or about "the latest one"
+UNFINISHED_SNAPSHOT_TTL = 60
+
+TOPIC_READ_PERMISSIONS = ['read', 'write', 'admin']
+# how long to remember who can read a topic; changes made through our permissions page invalidate it right away
+TOPIC_ACCESS_TTL = 300
+
+
+def _snapshot_is_generating(local_mc, topics_id, snapshots_id):
+    job_states = local_mc.topicSnapshotGenerateStatus(topics_id)['job_states']
+    return len([j for j in job_states if (str(j.get('snapshots_id')) == str(snapshots_id)) and
+                (j['state'] in [SNAPSHOT_STATE_QUEUED, SNAPSHOT_STATE_RUNNING])]) > 0
+
+
+def _snapshot_is_complete(topics_id, snapshots_id):
+    if snapshots_id is None:
+        return False  # means "the latest one", which changes as new versions are generated
+    return _snapshot_state_is_complete(topics_id, snapshots_id)
+
+
+@request_memoized
+def _snapshot_state_is_complete(topics_id, snapshots_id):
+    # every fill of a function cached with _from_complete_snapshot asks this, so only ask the back-end once per request
+    return _cached_snapshot_state_is_complete(topics_id, snapshots_id)
+
+
+def _snapshot_state_dependencies(_results, topics_id, snapshots_id):
+    return [topic_snapshot_dependency(topics_id, snapshots_id)]
+
+
+@cache.cache_on_arguments(ttl=UNFINISHED_SNAPSHOT_TTL, depends_on=_snapshot_state_dependencies)
+def _cached_snapshot_state_is_complete(topics_id, snapshots_id):
+    # this just decides how long to cache things for, so ask with the tool key and share it with everyone
+    snapshots = mc.topicSnapshotList(topics_id)
+    matching = [s for s in snapshots if str(s['snapshots_id']) == str(snapshots_id)]
+    if not ((len(matching) > 0) and (matching[0]['state'] == SNAPSHOT_STATE_COMPLETED) and matching[0]['searchable']):
+        return False
+    # and it isn't being generated again
+    return not _snapshot_is_generating(mc, topics_id, snapshots_id)
+
+
+def _from_complete_snapshot(_results, _user_mc_key, topics_id, snapshots_id=None, **_kwargs):
+    # TTL policy helper - results from a finished snapshot never change, so cache them for good
+    return _snapshot_is_complete(topics_id, snapshots_id)
+
+
+def _snapshot_dependencies(_results, _user_mc_key, topics_id, *args, **kwargs):
+    snapshots_id = args[0] if len(args) > 0 else kwargs.get('snapshots_id')
+    return [topic_snapshot_dependency(topics_id, snapshots_id)]
+
+
+def invalidate_topic_snapshot(topics_id, snapshots_id=None):
+    # (re)generating a snapshot changes it, and maybe which one is the latest
+    dependencies = [topic_snapshot_dependency(topics_id)]
+    if snapshots_id is not None:
+        dependencies.append(topic_snapshot_dependency(topics_id, snapshots_id))
+    cache.invalidate_dependencies(*dependencies)
+
+
+def topic_access_class(user_mc_key, topics_id, *_args, **_kwargs):
+    """
+    For `shared_by` - cached topic results can be shared by everyone who can read the topic (see server.cache.access).
+    """
+    return _topic_access_class(user_mc_key, topics_id)
+
+
+@request_memoized
+def _topic_access_class(user_mc_key, topics_id):
+    if user_mc_key == TOOL_API_KEY:
+        return user_mc_key
+    if mc_key_has_auth_role(user_mc_key, ROLE_ADMIN):
+        return ADMIN_ACCESS
+    try:
+        access = _cached_topic_access(user_mc_key, topics_id)
+    except mediacloud.error.MCException:
+        return user_mc_key  # they can't see the topic, so whatever they get back stays theirs
+    if access['is_public']:
+        return PUBLIC_ACCESS
+    if access['user_permission'] in TOPIC_READ_PERMISSIONS:
+        return topic_readers_access(topics_id)
+    return user_mc_key
+
+
+def _topic_permissions_dependencies(_results, _user_mc_key, topics_id):
+    return [topic_permissions_dependency(topics_id)]
+
+
+@cache.cache_on_arguments(ttl=TOPIC_ACCESS_TTL, depends_on=_topic_permissions_dependencies)
+def _cached_topic_access(user_mc_key, topics_id):
+    topic = user_mediacloud_client(user_mc_key).topic(topics_id)
+    return {'is_public': bool(topic.get('is_public')), 'user_permission': topic.get('user_permission')}
+
+
+def invalidate_topic_permissions(topics_id):
+    cache.invalidate_dependencies(topic_permissions_dependency(topics_id))
+
 
 def topic_media_list_page(user_mc_key, topics_id, **kwargs):
     return _cached_topic_media(user_mc_key, topics_id, **kwargs)
@@ -49,11 +155,11 @@ def topic_media_list(user_mc_key, topics_id, **kwargs):
     return _cached_topic_media(user_mc_key, topics_id, **merged_args)
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(shared_by=topic_access_class)
 def _cached_topic_media(user_mc_key, topics_id, **kwargs):
     """
     Internal helper - don't call this; call topic_media_list instead. This needs user_mc_key in the
-    function signature to make sure the caching is keyed correctly.
+    function signature to make sure the caching is keyed correctly (by the user's access class).
     """
     if user_mc_key == TOOL_API_KEY:
         local_mc = mc
@@ -75,38 +181,25 @@ def topic_story_count(user_mc_key, topics_id, **kwargs):
     }
     merged_args.update(kwargs)    # passed in args override anything pulled form the request.args
     # logger.info("!!!!!"+str(merged_args['timespans_id']))
-    return _cached_topic_story_count(user_mc_key, topics_id, **merged_args)
-
-
-@cache.cache_on_arguments()
-def _cached_topic_story_count(user_mc_key, topics_id, **kwargs):
-    """
-    Internal helper - don't call this; call topic_story_count instead. This needs user_mc_key in the
-    function signature to make sure the caching is keyed correctly.
-    """
-    if user_mc_key == TOOL_API_KEY:
-        local_mc = mc
-    else:
-        local_mc = user_mediacloud_client()
     try:
-        results = local_mc.topicStoryCount(topics_id, **kwargs)
+        return _cached_topic_story_count(user_mc_key, topics_id, **merged_args)
     except mediacloud.error.MCException:
         # when there is no timespan (ie. an ungenerated version you are adding subtopics to)
         return {'count': 0}
-    return results
-
-
-def story_list(user_mc_key, q, rows):
-    return _cached_story_list(user_mc_key, q, rows)
 
 
-@cache.cache_on_arguments()
-def _cached_story_list(user_mc_key, q, rows):
+@cache.cache_on_arguments(expiration_time=STALE_AFTER, ttl=immutable_when(_from_complete_snapshot),
+                          depends_on=_snapshot_dependencies, negative_ttl=NEGATIVE_TTL, shared_by=topic_access_class)
+def _cached_topic_story_count(user_mc_key, topics_id, **kwargs):
+    """
+    Internal helper - don't call this; call topic_story_count instead. This needs user_mc_key in the
+    function signature to make sure the caching is keyed correctly (by the user's access class).
+    """
     if user_mc_key == TOOL_API_KEY:
         local_mc = mc
     else:
         local_mc = user_mediacloud_client(user_mc_key)
-    return local_mc.storyList(q, rows=rows)
+    return local_mc.topicStoryCount(topics_id, **kwargs)
 
 
 def topic_story_list(user_mc_key, topics_id, **kwargs):
@@ -206,8 +299,11 @@ def topic_word_counts(user_mc_key, topics_id, **kwargs):
 
 def _word2vec_topic_2d_results(topics_id, snapshots_id, words):
     # can't cache this because the first time it is called we usually don't have results
-    word2vec_results = wordembeddings.topic_2d(topics_id, snapshots_id, words)
-    return word2vec_results
+    try:
+        return wordembeddings.topic_2d(topics_id, snapshots_id, words)
+    except ServiceUnavailable as e:
+        logger.warning(e.message)
+        return []
 
 
 def topic_similar_words(topics_id, word):
@@ -220,20 +316,24 @@ def topic_similar_words(topics_id, word):
 
 
 def _word2vec_topic_similar_words(topics_id, snapshots_id, words):
-    word2vec_results = wordembeddings.topic_similar_words(topics_id, snapshots_id, words)
-    return word2vec_results
+    try:
+        return wordembeddings.topic_similar_words(topics_id, snapshots_id, words)
+    except ServiceUnavailable as e:
+        logger.warning(e.message)
+        return []
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(expiration_time=STALE_AFTER, ttl=immutable_when(_from_complete_snapshot),
+                          depends_on=_snapshot_dependencies, shared_by=topic_access_class)
 def cached_topic_word_counts(user_mc_key, topics_id, **kwargs):
     """
     Internal helper - don't call this; call topic_word_counts instead. This needs user_mc_key in the
-    function signature to make sure the caching is keyed correctly.
+    function signature to make sure the caching is keyed correctly (by the user's access class).
     """
     if user_mc_key == TOOL_API_KEY:
         local_mc = mc
     else:
-        local_mc = user_mediacloud_client()
+        local_mc = user_mediacloud_client(user_mc_key)
     return local_mc.topicWordCount(topics_id, **kwargs)
 
 
@@ -263,7 +363,8 @@ def topic_split_story_counts(user_mc_key, topics_id, **kwargs):
     return results
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(expiration_time=STALE_AFTER, ttl=immutable_when(_from_complete_snapshot),
+                          depends_on=_snapshot_dependencies)
 def _cached_topic_split_story_counts(user_mc_key, topics_id, **kwargs):
     """
     Internal helper - don't call this; call topic_split_story_counts instead. This needs user_mc_key in the
@@ -290,11 +391,10 @@ def topic_foci_list(user_mc_key, topics_id, focal_sets_id):
     return response
 
 
+@request_memoized
 def topic_focal_sets_list(user_mc_key, topics_id, snapshots_id):
-    # This needs user_mc_key in the function signature to make sure the caching is keyed correctly.
-    user_mc = user_mediacloud_client(user_mc_key)
     try:
-        response = user_mc.topicFocalSetList(topics_id, snapshots_id=snapshots_id)
+        response = _cached_topic_focal_sets_list(user_mc_key, topics_id, snapshots_id)
     except mediacloud.error.MCException:
         # if a topic failed while trying to generate the snapshot, it can have no overall timespans which
         # makes this throw an error; better to fail by returning no focalsets
@@ -302,7 +402,16 @@ def topic_focal_sets_list(user_mc_key, topics_id, snapshots_id):
     return response
 
 
-@cache.cache_on_arguments()
+@cache.cache_on_arguments(ttl=immutable_when(_from_complete_snapshot, ttl=UNFINISHED_SNAPSHOT_TTL),
+                          depends_on=_snapshot_dependencies)
+def _cached_topic_focal_sets_list(user_mc_key, topics_id, snapshots_id):
+    # This needs user_mc_key in the function signature to make sure the caching is keyed correctly. The focal sets
+    # change while a snapshot is generating, so they are only cached for good once it is done.
+    user_mc = user_mediacloud_client(user_mc_key)
+    return user_mc.topicFocalSetList(topics_id, snapshots_id=snapshots_id)
+
+
+@cache.cache_on_arguments(depends_on=_snapshot_dependencies)
 def topic_focal_set(user_mc_key, topics_id, snapshots_id, focal_sets_id):
     all_focal_sets = topic_focal_sets_list(user_mc_key, topics_id, snapshots_id)
     for fs in all_focal_sets:
@@ -310,10 +419,19 @@ def topic_focal_set(user_mc_key, topics_id, snapshots_id, focal_sets_id):
             return fs
     raise ValueError("Unknown subtopic set id of {}".format(focal_sets_id))
 
-#snapshots aka versions can be initially empty, or paused then resumed, generating new timespans. Hence, don't cache
+
+@request_memoized
 def topic_timespan_list(topics_id, snapshots_id=None, foci_id=None):
-    # this includes the user_mc_key as a first param so the cache works right
-    user_mc = user_mediacloud_client()
+    # called lots of times in one request (ie. once per focus in matching_timespans_in_foci), so only ask once
+    return _cached_topic_timespan_list(user_mediacloud_key(), topics_id, snapshots_id=snapshots_id, foci_id=foci_id)
+
+
+@cache.cache_on_arguments(ttl=immutable_when(_from_complete_snapshot, ttl=UNFINISHED_SNAPSHOT_TTL),
+                          depends_on=_snapshot_dependencies)
+def _cached_topic_timespan_list(user_mc_key, topics_id, snapshots_id=None, foci_id=None):
+    # the timespans change while a snapshot is generating, so they are only cached for good once it is done
+    # this includes the user_mc_key as a first param so the caching is keyed correctly
+    user_mc = user_mediacloud_client(user_mc_key)
     timespans = user_mc.topicTimespanList(topics_id, snapshots_id=snapshots_id, foci_id=foci_id)
     return timespans
 
@@ -470,7 +588,8 @@ def _cached_topic_media_map_list(user_mc_key, topics_id, timespans_id):
 
 
 def topic_media_map(topics_id, timespan_maps_id, file_format):
-    return _cached_topic_media_map(user_mediacloud_key(), topics_id, timespan_maps_id, file_format)
+    # maps can be huge, so this returns an iterator over the bytes that streams them out of the cache
+    return cache.stream(_cached_topic_media_map, user_mediacloud_key(), topics_id, timespan_maps_id, file_format)
 
 
 @cache.cache_on_arguments()
@@ -1,12 +1,17 @@
 import logging
-from flask import jsonify, request
+from flask import jsonify, request, Response
 
 from server import app
 import server.views.topics.apicache as apicache
-from server.util.request import arguments_required, filters_from_args, api_error_handler
+from server.util.request import arguments_required, argument_is_valid, filters_from_args, api_error_handler
 
 logger = logging.getLogger(__name__)
 
+MAP_FILE_MIMETYPES = {
+    'gexf': 'application/xml',
+    'svg': 'image/svg+xml',
+}
+
 
 @app.route('/api/topics/<topics_id>/map-files/list', methods=['GET'])
 @arguments_required('timespanId')
@@ -17,6 +22,19 @@ def map_files_list(topics_id):
     return jsonify(results)
 
 
+@app.route('/api/topics/<topics_id>/map-files/<timespan_maps_id>', methods=['GET'])
+@arguments_required('format')
+@argument_is_valid('format', list(MAP_FILE_MIMETYPES.keys()))
+@api_error_handler
+def map_file_download(topics_id, timespan_maps_id):
+    file_format = request.args['format']
+    headers = {
+        "Content-Disposition": "attachment;filename=map-{}-{}.{}".format(topics_id, timespan_maps_id, file_format)
+    }
+    return Response(apicache.topic_media_map(topics_id, timespan_maps_id, file_format),
+                    mimetype=MAP_FILE_MIMETYPES[file_format], headers=headers)
+
+
 @app.route('/api/topics/<topics_id>/timespan-files/list', methods=['GET'])
 @arguments_required('timespanId')
 @api_error_handler
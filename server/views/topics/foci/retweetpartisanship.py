@@ -6,6 +6,7 @@ import mediacloud.error
 from server import app, TOOL_API_KEY
 from server.util.request import api_error_handler, argument_is_valid, arguments_required, json_error_response, \
     form_fields_required
+from server.util.concurrency import gather, Call
 from server.views.topics.apicache import topic_story_count
 from server.auth import user_mediacloud_key, user_mediacloud_client
 from server.util.tags import tags_in_tag_set, TagSetDiscoverer, \
@@ -30,22 +31,18 @@ def retweet_partisanship_story_counts(topics_id):
     tag_story_counts = []
     year = request.args['year']
     partisanship_tags = _cached_partisanship_tags(year)
-    # grab the total stories
-    try:
-        total_stories = topic_story_count(user_mediacloud_key(), topics_id)['count']
-    except mediacloud.error.MCException:
-        total_stories = 0
-    # make a count for each tag
-    for tag in partisanship_tags:
+    # grab the total stories, and make a count for each tag, all at the same time
+    calls = [Call(topic_story_count, user_mediacloud_key(), topics_id)]
+    calls += [Call(topic_story_count, user_mediacloud_key(), topics_id, q=tag['query']) for tag in partisanship_tags]
+    counts = gather([c.or_default({'count': 0}, mediacloud.error.MCException) for c in calls])
+    total_stories = counts[0]['count']
+    for tag, tag_count in zip(partisanship_tags, counts[1:]):
+        tagged_story_count = tag_count['count']
         try:
-            tagged_story_count = topic_story_count(user_mediacloud_key(), topics_id, q=tag['query'])['count']
             pct = float(tagged_story_count)/float(total_stories)
         except ZeroDivisionError:
             tagged_story_count = 0
             pct = 0
-        except mediacloud.error.MCException:
-            tagged_story_count = 0
-            pct = 0
         tag_story_counts.append({
             'label': tag['label'],
             'tags_id': tag['tags_id'],
@@ -72,18 +69,17 @@ def retweet_partisanship_story_counts(topics_id):
 def retweet_partisanship_coverage(topics_id):
     year = request.args['year']
     partisanship_tags = _cached_partisanship_tags(year)
-    # grab the total stories
-    try:
-        total_stories = topic_story_count(user_mediacloud_key(), topics_id)['count']
-    except mediacloud.error.MCException:
-        total_stories = 0
     # count the stories in any media in tagged as partisan
     tags_ids = " ".join([str(t['tags_id']) for t in partisanship_tags])
     tags_ids_query_clause = "tags_id_media:({})".format(tags_ids)
-    try:
-        tagged_story_count = topic_story_count(user_mediacloud_key(), topics_id, q=tags_ids_query_clause)['count']
-    except mediacloud.error.MCException:
-        tagged_story_count = 0
+    # and grab the total stories at the same time
+    calls = [
+        Call(topic_story_count, user_mediacloud_key(), topics_id),
+        Call(topic_story_count, user_mediacloud_key(), topics_id, q=tags_ids_query_clause),
+    ]
+    total, tagged = gather([c.or_default({'count': 0}, mediacloud.error.MCException) for c in calls])
+    total_stories = total['count']
+    tagged_story_count = tagged['count']
     return jsonify({'counts': {'count': tagged_story_count, 'total': total_stories}})
 
 
@@ -5,6 +5,7 @@ import flask_login
 from server import app
 from server.auth import user_mediacloud_key, user_admin_mediacloud_client
 from server.util import csv
+from server.util.limiter import bulk
 from server.views.topics import TOPIC_MEDIA_CSV_PROPS
 import server.views.topics.apicache as apicache
 from server.util.request import filters_from_args, api_error_handler
@@ -78,6 +79,7 @@ def stream_media_list_csv(user_mc_key, topic, filename, **kwargs):
                     mimetype='text/csv; charset=utf-8', headers=headers)
 
 
+@bulk
 def _stream_media_by_page(user_mc_key, topics_id, props, metadata_fields, **kwargs):
     yield ','.join(props) + '\n'  # first send the column names
     more_media = True
@@ -7,6 +7,7 @@ from mediacloud.error import MCException
 from server import app
 from server.util.request import json_error_response, api_error_handler
 from server.auth import user_admin_mediacloud_client
+from server.views.topics.apicache import invalidate_topic_permissions
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +25,14 @@ def topic_permissions_list(topics_id):
 @flask_login.login_required
 @api_error_handler
 def topic_update_permission(topics_id):
+    try:
+        return _update_permissions(topics_id)
+    finally:
+        # cached results are shared by the people who can read the topic, so that has to be worked out again
+        invalidate_topic_permissions(topics_id)
+
+
+def _update_permissions(topics_id):
     user_mc = user_admin_mediacloud_client()
     new_permissions = json.loads(request.form["permissions"])
     current_permissions = user_mc.topicPermissionsList(topics_id)['permissions']
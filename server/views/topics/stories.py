@@ -12,7 +12,10 @@ import server.views.apicache as base_apicache
 from server import app, cliff
 from server.auth import user_mediacloud_key, user_mediacloud_client
 from server.cache import cache
+from server.util.limiter import bulk
+from server.util.resilience import services
 from server.util.request import api_error_handler
+from server.util.concurrency import gather, Call
 from server.views.topics import stories_args_from_request, concatenate_query_for_solr, _parse_collection_ids, _parse_media_ids
 
 logger = logging.getLogger(__name__)
@@ -20,7 +23,7 @@ logger = logging.getLogger(__name__)
 
 @cache.cache_on_arguments()
 def _cached_geoname(geonames_id):
-    return cliff.geonames_lookup(geonames_id)
+    return services.get('cliff').call(cliff.geonames_lookup, geonames_id)
 
 
 @app.route('/api/topics/<topics_id>/stories/counts', methods=['GET'])
@@ -109,6 +112,7 @@ def stream_story_list_csv(user_key, filename, topic, **kwargs):
 
 
 # generator you can use to handle a long list of stories row by row (one row per story)
+@bulk
 def _topic_story_list_by_page_as_csv_row(user_key, topics_id, props, **kwargs):
     yield ','.join(props) + '\n'  # first send the column names
     include_all_url_shares = kwargs['include_all_url_shares'] if 'include_all_url_shares' in kwargs else False
@@ -169,12 +173,13 @@ def _topic_story_page_with_media(user_key, topics_id, link_id, **kwargs):
                 media_lookup = {j['media_id']: j for j in job_results}
 
         if include_story_tags:
-            story_ids = [str(s['stories_id']) for s in story_page['stories']]
-            stories_with_tags = apicache.story_list(user_key, 'stories_id:(' + " ".join(story_ids) + ")", args['limit'])
+            # the regular (non-topic) story info has the tags, in the same order as the page
+            stories_with_tags = base_apicache.stories_many([s['stories_id'] for s in story_page['stories']],
+                                                           api_key=user_key)
 
         # update story info for each story in the page, put it into the [stories] field, send updated page with
         # stories back
-        for s in story_page['stories']:
+        for i, s in enumerate(story_page['stories']):
 
             # add in media metadata to the story (from page-level cache built earlier)
             if include_media_metadata:
@@ -183,23 +188,21 @@ def _topic_story_page_with_media(user_key, topics_id, link_id, **kwargs):
                 for k, v in media['metadata'].items():
                     s['media_{}'.format(k)] = v['label'] if v is not None else None
 
-            # build lookup for id => story for all stories in stories with tags (non topic results)
-            if include_story_tags:
-                for st in stories_with_tags:
-                    if s['stories_id'] == st['stories_id']:
-                        s.update(st)
-                        foci_names = [f['name'] for f in s['foci']]
-                        s['subtopics'] = ", ".join(foci_names)
-                        s['themes'] = ''
-                        story_tag_ids = [t['tags_id'] for t in s['story_tags']]
-                        has_themes = False
-                        for t in tag_util.TagDiscoverer().nyt_themes_version_tags:
-                            if t in story_tag_ids:
-                                has_themes = True
-                        if has_themes:
-                            story_tag_ids = [t['tag'] for t in s['story_tags']
-                                             if t['tag_sets_id'] == tag_util.TagSetDiscoverer().nyt_themes_set]
-                            s['themes'] = ", ".join(story_tag_ids)
+            # add in the tags from the regular story info (if the story is in the regular index)
+            if include_story_tags and (stories_with_tags[i] is not None):
+                s.update(stories_with_tags[i])
+                foci_names = [f['name'] for f in s['foci']]
+                s['subtopics'] = ", ".join(foci_names)
+                s['themes'] = ''
+                story_tag_ids = [t['tags_id'] for t in s['story_tags']]
+                has_themes = False
+                for t in tag_util.TagDiscoverer().nyt_themes_version_tags:
+                    if t in story_tag_ids:
+                        has_themes = True
+                if has_themes:
+                    story_tag_ids = [t['tag'] for t in s['story_tags']
+                                     if t['tag_sets_id'] == tag_util.TagSetDiscoverer().nyt_themes_set]
+                    s['themes'] = ", ".join(story_tag_ids)
     return story_page
 
 
@@ -209,28 +212,32 @@ def _topic_story_page_with_media(user_key, topics_id, link_id, **kwargs):
 def story_counts_by_snapshot(topics_id):
     user_mc = user_mediacloud_client(user_mediacloud_key())
     snapshots = user_mc.topicSnapshotList(topics_id)
-    counts = {}
-    for s in snapshots:
-        # get the count of stories in the overally timespan for this snapshot
-        timespans = apicache.topic_timespan_list(topics_id, snapshots_id=s['snapshots_id'], foci_id=None)
-        try:
-            total = timespans[0]['story_count']
-        except mediacloud.error.MCException:
-            total = 0
-        except IndexError:  # this doesn't have any snapshots (ie. it failed to generate correctly)
-            total = 0
-        # search by tag to find out how many stories were spidered
-        spidered = 0
-        try:
-            spidered = apicache.topic_story_count(user_mediacloud_key(), topics_id,
-                                                  snapshots_id=s['snapshots_id'], foci_id=None,
-                                                  timespans_id=timespans[0]['timespans_id'],
-                                                  q="* AND tags_id_stories:{}".format(
-                                                      tag_util.TagDiscoverer().is_spidered_story_tag))['count']
-        except mediacloud.error.MCException:
-            spidered = 0
-        except IndexError:  # this doesn't have any snapshots (ie. it failed to generate correctly)
-            total = 0
-        seeded = total - spidered
-        counts[s['snapshots_id']] = {'total': total, 'spidered': spidered, 'seeded': seeded}
+    # each snapshot's counts are independent of the others, so work them all out at the same time
+    snapshot_counts = gather([Call(_snapshot_story_counts, topics_id, s['snapshots_id']) for s in snapshots])
+    counts = {s['snapshots_id']: c for s, c in zip(snapshots, snapshot_counts)}
     return jsonify(counts)
+
+
+def _snapshot_story_counts(topics_id, snapshots_id):
+    # get the count of stories in the overally timespan for this snapshot
+    timespans = apicache.topic_timespan_list(topics_id, snapshots_id=snapshots_id, foci_id=None)
+    try:
+        total = timespans[0]['story_count']
+    except mediacloud.error.MCException:
+        total = 0
+    except IndexError:  # this doesn't have any snapshots (ie. it failed to generate correctly)
+        total = 0
+    # search by tag to find out how many stories were spidered
+    spidered = 0
+    try:
+        spidered = apicache.topic_story_count(user_mediacloud_key(), topics_id,
+                                              snapshots_id=snapshots_id, foci_id=None,
+                                              timespans_id=timespans[0]['timespans_id'],
+                                              q="* AND tags_id_stories:{}".format(
+                                                  tag_util.TagDiscoverer().is_spidered_story_tag))['count']
+    except mediacloud.error.MCException:
+        spidered = 0
+    except IndexError:  # this doesn't have any snapshots (ie. it failed to generate correctly)
+        total = 0
+    seeded = total - spidered
+    return {'total': total, 'spidered': spidered, 'seeded': seeded}
@@ -8,6 +8,7 @@ from server.auth import user_mediacloud_client
 from server.util.request import api_error_handler, form_fields_required
 from server.util.stringutil import ids_from_comma_separated_str
 from server.views.topics.topic import topic_summary
+import server.views.topics.apicache as apicache
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +62,7 @@ def topic_snapshot_create(topics_id):
     user_mc = user_mediacloud_client()
     # make a new snapshot
     user_mc.topicCreateSnapshot(topics_id, note=_next_snapshot_number(topics_id))
+    apicache.invalidate_topic_snapshot(topics_id)
     return topic_summary(topics_id)
 
 
@@ -88,4 +90,5 @@ def topic_snapshot_spider(topics_id):
         user_mc.topicSpider(topics_id, snapshots_id=snapshots_id)
     else:
         user_mc.topicGenerateSnapshot(topics_id, snapshots_id=snapshots_id)
+    apicache.invalidate_topic_snapshot(topics_id, snapshots_id)
     return topic_summary(topics_id)
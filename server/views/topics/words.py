@@ -5,6 +5,7 @@ import flask_login
 from server import app, TOOL_API_KEY, executor
 import server.util.csv as csv
 from server.util.request import api_error_handler, arguments_required, filters_from_args, json_error_response
+from server.util.deadline import or_partial, is_partial
 from server.auth import user_mediacloud_key
 import server.views.topics.apicache as apicache
 
@@ -106,6 +107,7 @@ def topic_similar_words(topics_id, word):
 
 # Helper function for pooling word2vec timespans process
 @executor.job
+@or_partial()
 def _grab_timespan_embeddings(job):
     ts_word_counts = apicache.cached_topic_word_counts(job['api_key'], job['topics_id'], num_words=250,
                                                        timespans_id=int(job['timespan']['timespans_id']),
@@ -118,15 +120,16 @@ def _grab_timespan_embeddings(job):
 
     # Replace specific timespan embeddings with overall so coordinates are consistent
     for word in ts_word_counts:
-        word['w2v_x'] = job['overall_embeddings'][word['term']][0]
-        word['w2v_y'] = job['overall_embeddings'][word['term']][1]
+        if word['term'] in job['overall_embeddings']:
+            word['w2v_x'] = job['overall_embeddings'][word['term']][0]
+            word['w2v_y'] = job['overall_embeddings'][word['term']][1]
 
     return {'timespan': job['timespan'], 'words': ts_word_counts}
 
 
 def _get_all_timespan_embeddings(jobs):
-    # need to get the generator to actually run and return real data
-    results = [item for item in _grab_timespan_embeddings.map(jobs)]
+    # need to get the generator to actually run and return real data (leaving out the timespans we ran out of time for)
+    results = [item for item in _grab_timespan_embeddings.map(jobs) if item is not None]
     return results
 
 
@@ -139,7 +142,9 @@ def topic_w2v_timespan_embeddings(topics_id):
     overall_word_counts = apicache.topic_word_counts(user_mediacloud_key(), topics_id, num_words=50,
                                                      snapshots_id=snapshots_id, timespans_id=None, foci_id=foci_id, q=q)
     overall_words = [x['term'] for x in overall_word_counts]
-    overall_embeddings = {x['term']: (x['google_w2v_x'], x['google_w2v_y']) for x in overall_word_counts}
+    # (words come back without embeddings if the embeddings server is down)
+    overall_embeddings = {x['term']: (x['google_w2v_x'], x['google_w2v_y']) for x in overall_word_counts
+                          if 'google_w2v_x' in x}
 
     # Retrieve top words for each timespan
     timespans = apicache.topic_timespan_list(topics_id, snapshots_id, foci_id)
@@ -156,4 +161,4 @@ def topic_w2v_timespan_embeddings(topics_id):
         'timespan': t,
     } for t in timespans]
     embeddings_by_timespan = _get_all_timespan_embeddings(jobs)
-    return jsonify({'list': embeddings_by_timespan})
+    return jsonify({'list': embeddings_by_timespan, 'partial': is_partial()})